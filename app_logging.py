@@ -0,0 +1,243 @@
+"""日志：调用方只把记录放进内存队列，由后台线程写文件
+
+- 根日志器上只有一个 QueueHandler：调用线程（Tk 主线程、请求线程）只合并消息文本并入队，
+  不做任何 I/O；队列满时直接丢弃并计数，绝不等待；
+- 后台线程把记录写到 config.json 同目录的 logs/app.log（JSON Lines，按大小轮转）、
+  控制台（打包的窗口程序没有控制台时跳过），并保留最近若干条在内存环形缓冲区中，
+  供设置窗口中的日志查看器浏览。
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+
+from diagnostics import metrics, register_summary
+
+LOG_FORMAT = '%(asctime)s %(levelname)-7s [%(threadName)s] %(name)s: %(message)s'
+LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+
+# LogRecord 的标准属性，其余属性（extra=...）作为结构化字段写入日志文件
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class JSONFormatter(logging.Formatter):
+    """每条记录一行 JSON：时间、级别、线程、日志器、消息、异常以及 extra 字段"""
+
+    def format(self, record):
+        entry = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)) + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'thread': record.threadName,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and key not in entry:
+                entry[key] = value if isinstance(value, (str, int, float, bool, type(None))) else repr(value)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class RingBufferHandler(logging.Handler):
+    """在内存中保留最近 capacity 条记录"""
+
+    def __init__(self, capacity=2000):
+        super().__init__()
+        self.buffer = deque(maxlen=capacity)
+        self.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    def emit(self, record):
+        self.buffer.append(record)
+
+    def records(self, level=logging.NOTSET, contains=''):
+        """最近的记录（旧的在前），可按最低级别和关键字过滤"""
+        self.acquire()
+        try:
+            records = list(self.buffer)
+        finally:
+            self.release()
+        contains = contains.lower()
+        return [r for r in records
+                if r.levelno >= level and (not contains or contains in r.getMessage().lower()
+                                           or contains in r.name.lower())]
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """入队时只合并消息参数、格式化异常；队列满时丢弃"""
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.incr('log.dropped')
+
+
+class _LogListener(logging.handlers.QueueListener):
+    """后台写入线程；队列中的可调用对象在写入线程中执行（用于按顺序增减输出）"""
+
+    def start(self):
+        self._thread = threading.Thread(target=self._monitor, name='log-writer', daemon=True)
+        self._thread.start()
+
+    def handle(self, record):
+        if callable(record):
+            record()
+            return
+        super().handle(record)
+
+
+class _LogSystem:
+    def __init__(self):
+        self.queue = None
+        self.listener = None
+        self.ring = None
+        self.file_handler = None
+        self.log_dir = None
+        self._lock = threading.Lock()
+
+    def setup(self, level='INFO', ring_size=2000, queue_size=10000, console=True):
+        """替换根日志器的处理器（可重复调用，只在第一次生效）"""
+        with self._lock:
+            if self.listener is not None:
+                return
+            self.queue = queue.Queue(queue_size)
+            self.ring = RingBufferHandler(ring_size)
+            handlers = [self.ring]
+            # 打包的窗口程序 sys.stderr 为 None
+            if console and sys.stderr is not None:
+                stream = logging.StreamHandler()
+                stream.setFormatter(logging.Formatter(LOG_FORMAT))
+                handlers.append(stream)
+            self.listener = _LogListener(self.queue, *handlers, respect_handler_level=True)
+            root = logging.getLogger()
+            for handler in list(root.handlers):
+                root.removeHandler(handler)
+            root.addHandler(_NonBlockingQueueHandler(self.queue))
+            root.setLevel(getattr(logging, str(level).upper(), logging.INFO))
+            self.listener.start()
+            atexit.register(self.shutdown)
+            _install_excepthooks()
+
+    def enable_file(self, directory, max_bytes=1024 * 1024, backup_count=3, level=None):
+        """开始写日志文件 directory/app.log；之前已在缓冲区中的记录会先补写进去"""
+        self.setup()
+        if level:
+            logging.getLogger().setLevel(getattr(logging, str(level).upper(), logging.INFO))
+        if self.file_handler is not None:
+            return
+        try:
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+            handler = logging.handlers.RotatingFileHandler(
+                os.path.join(directory, 'app.log'), maxBytes=max_bytes, backupCount=backup_count,
+                encoding='utf-8', delay=True)
+        except OSError as e:
+            logging.getLogger(__name__).warning(f"无法创建日志文件: {str(e)}")
+            return
+        handler.setFormatter(JSONFormatter())
+        self.file_handler = handler
+        self.log_dir = directory
+
+        def attach():
+            for record in self.ring.records():
+                handler.handle(record)
+            self.listener.handlers = self.listener.handlers + (handler,)
+
+        self._put_control(attach)
+
+    def _put_control(self, action):
+        try:
+            self.queue.put(action, timeout=1)
+        except queue.Full:
+            action()
+
+    def shutdown(self):
+        """写完队列中剩余的记录并关闭文件（退出前调用）"""
+        with self._lock:
+            listener, self.listener = self.listener, None
+        if listener is None:
+            return
+        try:
+            listener.stop()
+        except Exception:
+            pass
+        if self.file_handler is not None:
+            self.file_handler.close()
+
+
+_system = _LogSystem()
+
+
+def setup_logging(level='INFO', ring_size=2000, console=True):
+    """安装队列日志（程序启动时调用一次）"""
+    _system.setup(level, ring_size, console=console)
+
+
+def enable_file_log(directory, max_bytes=1024 * 1024, backup_count=3, level=None):
+    """开启按大小轮转的日志文件"""
+    _system.enable_file(directory, max_bytes, backup_count, level)
+
+
+def recent_records(level=logging.NOTSET, contains=''):
+    """环形缓冲区中的最近记录"""
+    if _system.ring is None:
+        return []
+    return _system.ring.records(level, contains)
+
+
+def format_record(record):
+    return _system.ring.format(record) if _system.ring else logging.Formatter(LOG_FORMAT).format(record)
+
+
+def log_directory():
+    return _system.log_dir
+
+
+def shutdown():
+    _system.shutdown()
+
+
+def _install_excepthooks():
+    """未捕获的异常写入日志（窗口程序中否则不会留下任何痕迹）"""
+    logger = logging.getLogger('uncaught')
+    previous = sys.excepthook
+
+    def excepthook(exc_type, exc, tb):
+        if not issubclass(exc_type, KeyboardInterrupt):
+            logger.critical("未捕获的异常", exc_info=(exc_type, exc, tb))
+        previous(exc_type, exc, tb)
+
+    def thread_excepthook(args):
+        if args.exc_type is not SystemExit:
+            thread = args.thread.name if args.thread else '?'
+            logger.error(f"线程 {thread} 中未捕获的异常",
+                         exc_info=(args.exc_type, args.exc_value, args.exc_traceback))
+
+    sys.excepthook = excepthook
+    threading.excepthook = thread_excepthook
+
+
+@register_summary
+def _logging_summary(m):
+    dropped = m.counter('log.dropped')
+    if not dropped:
+        return []
+    return [f"日志: 队列已满丢弃 {dropped} 条"]
@@ -0,0 +1,162 @@
+"""异步网络引擎：在单个后台线程中运行 asyncio 事件循环
+
+所有 OCR / token / GPT 请求都以协程形式在这个循环中执行，共享 httpx 连接池；
+界面和后台任务通过 submit() 返回的 concurrent.futures.Future 获取结果，
+并发的几十个请求只占用这一个线程。
+"""
+import asyncio
+import logging
+import ssl
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import httpx
+
+from diagnostics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class NetworkError(Exception):
+    """网络请求失败"""
+
+
+class NetworkTimeout(NetworkError):
+    """请求超时"""
+
+
+class NetworkConnectionError(NetworkError):
+    """无法建立连接"""
+
+
+class NetworkSSLError(NetworkConnectionError):
+    """SSL 握手或证书验证失败"""
+
+
+def _is_ssl_error(error):
+    while error is not None:
+        if isinstance(error, ssl.SSLError):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+@contextmanager
+def network_errors():
+    """把 httpx 异常转换为 NetworkError 系列异常"""
+    try:
+        yield
+    except httpx.TimeoutException as e:
+        raise NetworkTimeout(str(e) or "请求超时") from e
+    except httpx.ConnectError as e:
+        if _is_ssl_error(e):
+            raise NetworkSSLError(str(e)) from e
+        raise NetworkConnectionError(str(e)) from e
+    except httpx.HTTPError as e:
+        raise NetworkError(str(e)) from e
+
+
+_http2_available = None
+
+
+def http2_available():
+    """是否安装了 HTTP/2 支持（h2 包，pip install httpx[http2]）"""
+    global _http2_available
+    if _http2_available is None:
+        try:
+            import h2  # noqa: F401
+            _http2_available = True
+        except ImportError:
+            _http2_available = False
+            logger.warning("未安装 h2，HTTP/2 不可用，使用 HTTP/1.1（pip install httpx[http2]）")
+    return _http2_available
+
+
+class AsyncEngine:
+    """后台事件循环 + 共享的异步 HTTP 客户端
+
+    按是否校验证书、是否启用 HTTP/2 区分 httpx.AsyncClient（百度接口关闭了证书校验），
+    每个客户端内部维护连接池，空闲 keep-alive 连接数不超过 max_idle。
+    HTTP/2 客户端通过 TLS ALPN 协商协议，服务器不支持 h2 时自动使用 HTTP/1.1；
+    同一主机的并发请求和流式响应共用一个多路复用连接。
+    CPU 密集的工作（图片编码、裁剪）通过 to_thread() 放到小线程池中，避免阻塞事件循环。
+    """
+
+    def __init__(self, max_idle=8, max_connections=32, keepalive_expiry=90, cpu_workers=4):
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max(1, int(max_idle)),
+                                   keepalive_expiry=keepalive_expiry)
+        self.loop = None
+        self._thread = None
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._cpu_pool = ThreadPoolExecutor(max_workers=cpu_workers, thread_name_prefix='cpu')
+
+    def start(self):
+        """启动事件循环线程"""
+        ready = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            ready.set()
+            self.loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name='async-engine', daemon=True)
+        self._thread.start()
+        ready.wait()
+
+    def stop(self):
+        """关闭客户端并停止事件循环"""
+        if self.loop is None or not self.loop.is_running():
+            return
+
+        async def close_clients():
+            for client in list(self._clients.values()):
+                await client.aclose()
+
+        try:
+            asyncio.run_coroutine_threadsafe(close_clients(), self.loop).result(timeout=2)
+        except Exception:
+            pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._cpu_pool.shutdown(wait=False)
+
+    def client(self, verify=True, http2=False):
+        """获取共享的 AsyncClient；http2=True 但没有安装 h2 时返回 HTTP/1.1 客户端"""
+        if http2 and not http2_available():
+            http2 = False
+        key = (verify, http2)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = httpx.AsyncClient(verify=verify, limits=self.limits, timeout=30, http2=http2)
+                self._clients[key] = client
+            return client
+
+    def submit(self, coro):
+        """在事件循环中执行协程，返回 concurrent.futures.Future（可从任意线程调用）"""
+        with self._lock:
+            self._inflight += 1
+            metrics.set_gauge('engine.inflight', self._inflight)
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+        def finished(_):
+            with self._lock:
+                self._inflight -= 1
+                metrics.set_gauge('engine.inflight', self._inflight)
+
+        future.add_done_callback(finished)
+        return future
+
+    def run(self, coro, timeout=None):
+        """阻塞等待协程结果，供后台线程调用（不能在事件循环线程中调用）"""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("不能在事件循环线程中同步等待")
+        return self.submit(coro).result(timeout)
+
+    async def to_thread(self, fn, *args):
+        """在 CPU 线程池中执行同步函数"""
+        return await self.loop.run_in_executor(self._cpu_pool, fn, *args)
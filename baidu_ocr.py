@@ -0,0 +1,333 @@
+import asyncio
+import base64
+import io
+import logging
+import time
+
+from async_engine import NetworkTimeout, network_errors
+from diagnostics import metrics, register_summary
+from image_regions import ImageTiler, RegionPacker
+
+logger = logging.getLogger(__name__)
+
+TOKEN_URL = "https://aip.baidubce.com/oauth/2.0/token"
+DEFAULT_OCR_URL = "https://aip.baidubce.com/rest/2.0/ocr/v1/general_basic"
+# 返回文字位置信息的通用识别接口，用于拼接识别后按位置拆分结果
+LOCATION_OCR_URL = "https://aip.baidubce.com/rest/2.0/ocr/v1/general"
+
+# 百度返回的 QPS 超限错误码
+QPS_LIMIT_ERROR_CODES = (18,)
+# 重试也无法恢复的错误码：配额用尽（17 / 19）、应用未开通接口（6）、access_token 无效或过期（110 / 111）
+PERSISTENT_ERROR_CODES = (17, 19, 6, 110, 111)
+
+
+class OCRError(Exception):
+    """OCR 识别失败"""
+
+    def __init__(self, message, error_code=None):
+        super().__init__(message)
+        self.error_code = error_code
+
+    @property
+    def persistent(self):
+        """重试也不会成功的错误（没有错误码的是密钥未配置或获取 token 失败）"""
+        return self.error_code is None or self.error_code in PERSISTENT_ERROR_CODES
+
+
+class RateLimiter:
+    """令牌桶限流器，用于控制并发 OCR 请求的 QPS（只在事件循环线程中使用）"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = max(float(rate), 0.1)
+        self.capacity = float(burst if burst is not None else max(1, int(self.rate)))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+
+    async def acquire(self):
+        """获取一个令牌，必要时等待"""
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class EncodedImage:
+    """以流的方式生成 "image=<URL 编码的 base64 PNG>" 表单请求体
+
+    只保存一份 PNG 数据；base64 和 URL 编码在发送时按块进行，
+    内存中不会同时出现整张图片的 base64 字符串和表单字符串。
+    可重复（异步）迭代，便于失败重试；上传中途中断（迭代器未走完）后仍可正常 close()。
+    """
+
+    # 3 的倍数，保证每块的 base64 结果不含中间填充
+    CHUNK_SIZE = 48 * 1024
+
+    def __init__(self, image):
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG')
+        # 没有导出的缓冲区时 getvalue() 直接转交内部数据，不复制；
+        # 之后按块切片 bytes，暂停在中途的迭代器不会占住缓冲区（BytesIO 被导出时无法关闭）
+        self._png = buffer.getvalue()
+        buffer.close()
+        self.png_size = len(self._png)
+        # 先计算一遍编码后的长度，以便发送 Content-Length 而不是分块传输
+        self.content_length = len(b'image=') + sum(len(chunk) for chunk in self._encoded_chunks())
+
+    def _encoded_chunks(self):
+        png = self._png
+        for offset in range(0, self.png_size, self.CHUNK_SIZE):
+            chunk = base64.b64encode(png[offset:offset + self.CHUNK_SIZE])
+            yield chunk.replace(b'+', b'%2B').replace(b'/', b'%2F').replace(b'=', b'%3D')
+
+    async def __aiter__(self):
+        yield b'image='
+        for chunk in self._encoded_chunks():
+            yield chunk
+
+    def close(self):
+        self._png = None
+
+
+class BaiduOCRClient:
+    """百度 OCR 客户端
+
+    请求以协程形式在 AsyncEngine 的事件循环中执行，共享连接池并统一限流；
+    同步方法（recognize 等）供后台线程调用，内部等待对应的协程完成。
+    """
+
+    def __init__(self, engine, api_key='', secret_key='', ocr_url=DEFAULT_OCR_URL, qps=10, stitch=True,
+                 max_inflight=8):
+        self.engine = engine
+        self.api_key = api_key
+        self.secret_key = secret_key
+        self.ocr_url = ocr_url
+        self.access_token = None
+        self.rate_limiter = RateLimiter(qps)
+        self.stitch = stitch
+        self.packer = RegionPacker()
+        self.tiler = ImageTiler()
+        # 同时处于编码/上传阶段的图片数上限，限制峰值内存
+        self.max_inflight = max_inflight
+        self._inflight = None
+        self.usage = None  # UsageStore，记录每次请求的上传字节数和耗时
+        self.selector = None  # OCRSelector，为每次识别自适应选择接口；为 None 时固定使用 ocr_url
+
+    @property
+    def http(self):
+        return self.engine.client(verify=False)  # 禁用 SSL 验证
+
+    def configure(self, api_key, secret_key):
+        """更新密钥，旧的 token 随之失效"""
+        if (api_key, secret_key) != (self.api_key, self.secret_key):
+            self.access_token = None
+        self.api_key = api_key
+        self.secret_key = secret_key
+
+    async def afetch_access_token(self):
+        """获取 access token，失败时抛出 OCRError 或 NetworkError"""
+        params = {
+            'grant_type': 'client_credentials',
+            'client_id': self.api_key,
+            'client_secret': self.secret_key
+        }
+        with network_errors():
+            response = await self.http.get(TOKEN_URL, params=params, timeout=10)
+        if response.status_code != 200:
+            raise OCRError(f"获取 access_token 失败: {response.text}")
+        self.access_token = response.json().get("access_token")
+        return self.access_token
+
+    def fetch_access_token(self):
+        return self.engine.run(self.afetch_access_token())
+
+    @staticmethod
+    def _encode_body(image, release):
+        """编码为流式请求体；release 为 True 时随后释放原图"""
+        try:
+            return EncodedImage(image)
+        finally:
+            if release:
+                image.close()
+
+    async def arecognize(self, image, max_retries=2, url=None, release=False):
+        """识别单张图片，返回百度的 words_result 列表
+
+        超出接口尺寸限制的图片会自动分块识别。
+        release 为 True 表示调用方不再使用 image，编码完成后立即释放其像素数据。
+        """
+        if not self.access_token:
+            raise OCRError("请先配置并保存正确的百度 OCR API 密钥")
+        if self.tiler.needs_tiling(image):
+            try:
+                return await self.arecognize_tiled(image, max_retries)
+            finally:
+                if release:
+                    image.close()
+        return await self._apost_image(image, max_retries, url, release=release)
+
+    def recognize(self, image, max_retries=2, url=None, release=False):
+        return self.engine.run(self.arecognize(image, max_retries, url, release))
+
+    async def _apost_image(self, image, max_retries=2, url=None, crop_box=None, release=False, location=False):
+        """发送一次 OCR 请求
+
+        指定 crop_box 时在获得上传名额后才裁剪，避免大量分块同时驻留内存；
+        裁剪出的分块在编码后立即释放。
+        未指定 url 且设置了 selector 时由其按图片大小选择接口，配额用尽等情况下
+        用同一份编码结果依次改用备选接口；location 为 True 时只选择返回文字位置的接口。
+        """
+        if self._inflight is None:
+            self._inflight = asyncio.Semaphore(self.max_inflight)
+        async with self._inflight:
+            if crop_box is not None:
+                image = await self.engine.to_thread(image.crop, crop_box)
+                release = True
+            width, height = image.size
+            body = await self.engine.to_thread(self._encode_body, image, release)
+            del image
+            try:
+                if url is not None or self.selector is None:
+                    return await self._apost_body(body, url or (LOCATION_OCR_URL if location else self.ocr_url),
+                                                  max_retries)
+                candidates = self.selector.candidates(width, height, location)
+                for index, endpoint in enumerate(candidates):
+                    start = time.perf_counter()
+                    last = index == len(candidates) - 1
+                    try:
+                        # 还有备选接口时 QPS 超限不在原接口上重试
+                        words = await self._apost_body(body, endpoint.url, max_retries if last else 0)
+                    except OCRError as e:
+                        self.selector.record(endpoint, time.perf_counter() - start, width * height, False,
+                                             e.error_code)
+                        if last or not self.selector.should_fallback(e.error_code):
+                            raise
+                    except NetworkTimeout:
+                        self.selector.record(endpoint, time.perf_counter() - start, width * height, False)
+                        if last:
+                            raise
+                    else:
+                        self.selector.record(endpoint, time.perf_counter() - start, width * height, True)
+                        return words
+                    metrics.incr('ocr.fallback')
+                    logger.info(f"OCR 接口 {endpoint.name} 不可用，改用 {candidates[index + 1].name}")
+            finally:
+                body.close()
+        return []
+
+    async def _apost_body(self, body, url, max_retries):
+        """向指定接口发送已编码的图片，返回 words_result；QPS 超限时退避重试"""
+        params = {"access_token": self.access_token}
+        headers = {'Content-Type': 'application/x-www-form-urlencoded',
+                   'Content-Length': str(body.content_length)}
+        for attempt in range(max_retries + 1):
+            await self.rate_limiter.acquire()
+            metrics.incr('ocr.requests')
+            start = time.perf_counter()
+            try:
+                with metrics.timer('ocr.request'), network_errors():
+                    response = await self.http.post(url, params=params, headers=headers,
+                                                    content=body, timeout=30)
+                result = response.json()
+            except Exception:
+                self._record_usage(url, body.content_length, start, False)
+                raise
+            self._record_usage(url, body.content_length, start, 'error_code' not in result)
+            if 'error_code' not in result:
+                return result.get('words_result', [])
+            # QPS 超限时退避重试，其他错误直接抛出
+            if result['error_code'] in QPS_LIMIT_ERROR_CODES and attempt < max_retries:
+                await asyncio.sleep(0.5 * (attempt + 1))
+                continue
+            raise OCRError(f"识别失败: {result.get('error_msg', '未知错误')}", result['error_code'])
+        return []
+
+    def _record_usage(self, url, bytes_sent, start, ok):
+        if self.usage is not None:
+            self.usage.record('ocr', url.rstrip('/').rsplit('/', 1)[-1], bytes_sent=bytes_sent,
+                              latency=time.perf_counter() - start, ok=ok)
+
+    def _plan_tiles(self, image):
+        tiles = self.tiler.tile_boxes(*image.size)
+        metrics.incr('ocr.tiled.images')
+        metrics.incr('ocr.tiled.tiles', len(tiles))
+        logger.info(f"图片 {image.size[0]}x{image.size[1]} 超出接口限制，分为 {len(tiles)} 块识别")
+        return tiles
+
+    async def arecognize_tiled(self, image, max_retries=2):
+        """把大图切成重叠分块并发识别，合并时去掉重叠带中的重复文字
+
+        分块在获得上传名额后才裁剪和编码，同一时刻内存中最多只有
+        max_inflight 个分块，峰值内存与整图大小无关。
+        """
+        tiles = self._plan_tiles(image)
+        words = await asyncio.gather(*[
+            self._apost_image(image, max_retries, crop_box=box, location=True) for box, _ in tiles
+        ])
+        return self.tiler.merge_words([(box, core, w) for (box, core), w in zip(tiles, words)])
+
+    async def arecognize_many(self, images):
+        """并发识别多张图片，返回与 images 一一对应的 words_result 列表
+
+        启用拼接时，小图会被拼成少量大图并调用带位置信息的接口，
+        再按文字框位置拆回各自的区域，从而减少请求次数。
+        """
+        if not self.access_token:
+            raise OCRError("请先配置并保存正确的百度 OCR API 密钥")
+        start = time.perf_counter()
+        results = [[] for _ in images]
+        jobs = []  # (协程, 完成回调)
+
+        small = [i for i, image in enumerate(images) if self.packer.can_pack(image)]
+        if self.stitch and len(small) > 1:
+            packed_images = await self.engine.to_thread(self.packer.pack, images, small)
+            for packed in packed_images:
+                def deliver(words, packed=packed):
+                    for index, region_words in packed.split_words(words).items():
+                        results[index] = region_words
+                jobs.append((self._apost_image(packed.image, 2, release=True, location=True), deliver))
+            metrics.incr('ocr.stitch.regions', len(small))
+            metrics.incr('ocr.stitch.requests_saved', len(small) - len(jobs))
+            logger.info(f"拼接识别: {len(small)} 个小区域合并为 {len(jobs)} 次请求")
+            small = set(small)
+        else:
+            small = set()
+
+        for index, image in enumerate(images):
+            if index not in small:
+                def deliver(words, index=index):
+                    results[index] = words
+                jobs.append((self.arecognize(image), deliver))
+
+        words = await asyncio.gather(*[job for job, _ in jobs])
+        for (_, deliver), result in zip(jobs, words):
+            deliver(result)
+
+        elapsed = time.perf_counter() - start
+        metrics.observe('ocr.batch', elapsed)
+        logger.info(f"批量识别完成: {len(images)} 张图片, {len(jobs)} 组请求, 耗时 {elapsed:.2f}s")
+        return results
+
+    def recognize_many(self, images):
+        return self.engine.run(self.arecognize_many(images))
+
+    @staticmethod
+    def join_words(words_result):
+        """将 words_result 拼接为文本"""
+        return ' '.join([word['words'] for word in words_result])
+
+
+@register_summary
+def _stitch_summary(m):
+    regions = m.counter('ocr.stitch.regions')
+    if not regions:
+        return []
+    saved = m.counter('ocr.stitch.requests_saved')
+    lines = [f"拼接识别: {regions} 个区域, 节省 {saved} 次请求 ({saved / regions:.0%})"]
+    request = m.timing('ocr.request')
+    if request:
+        lines.append(f"拼接节省耗时（按单次请求平均耗时估算）: {saved * request['avg']:.1f}s")
+    return lines
@@ -0,0 +1,204 @@
+"""HTTP/1.1 与 HTTP/2 对比：并发 1 / 8 / 32 个流式 GPT 请求
+
+在本机启动一个模拟 GPT 接口的服务器（同一端口同时支持 HTTP/1.1 和 h2c），
+每个请求等待 --ttfb 毫秒后以 SSE 分块返回 --chunks 段内容；
+每个新连接先等待 --handshake 毫秒，模拟真实接口的 TCP + TLS 握手往返。
+客户端使用与 AsyncEngine 相同的连接池限制，分别以 HTTP/1.1 和 HTTP/2 发送请求，
+输出吞吐、首字延迟、总延迟和服务器端新建的连接数。
+
+真实接口通过 TLS ALPN 协商 h2；本地没有证书，这里用 h2c（明文、事先约定 HTTP/2）代替，
+多路复用的行为相同。需要安装 h2：pip install h2
+
+    python benchmarks/bench_http2.py [--requests 64] [--handshake 60] [--ttfb 150]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+from async_engine import AsyncEngine  # noqa: E402
+
+H2_PREFACE = b'PRI * HTTP/2.0\r\n\r\nSM\r\n\r\n'
+
+
+def sse_chunks(count):
+    for i in range(count):
+        chunk = {'choices': [{'delta': {'content': f'第{i}段'}}]}
+        yield f'data: {json.dumps(chunk, ensure_ascii=False)}\n\n'.encode('utf-8')
+    usage = {'choices': [], 'usage': {'prompt_tokens': 20, 'completion_tokens': count}}
+    yield f'data: {json.dumps(usage)}\n\ndata: [DONE]\n\n'.encode('utf-8')
+
+
+class StandInServer:
+    """模拟的流式对话接口"""
+
+    def __init__(self, handshake, ttfb, chunks, gap):
+        self.handshake = handshake
+        self.ttfb = ttfb
+        self.chunks = chunks
+        self.gap = gap
+        self.connections = 0
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        await asyncio.sleep(self.handshake)
+        try:
+            head = await reader.readexactly(len(H2_PREFACE))
+            if head == H2_PREFACE:
+                await self._serve_h2(reader, writer, head)
+            else:
+                await self._serve_h1(reader, writer, head)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _serve_h1(self, reader, writer, head):
+        buffered = head
+        while True:
+            if b'\r\n\r\n' not in buffered:
+                buffered += await reader.readuntil(b'\r\n\r\n')
+            header_block, _, buffered = buffered.partition(b'\r\n\r\n')
+            length = 0
+            for line in header_block.split(b'\r\n')[1:]:
+                name, _, value = line.partition(b':')
+                if name.strip().lower() == b'content-length':
+                    length = int(value)
+            if len(buffered) < length:
+                buffered += await reader.readexactly(length - len(buffered))
+            buffered = buffered[length:]
+            await asyncio.sleep(self.ttfb)
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n'
+                         b'Transfer-Encoding: chunked\r\n\r\n')
+            for chunk in sse_chunks(self.chunks):
+                writer.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+                await writer.drain()
+                await asyncio.sleep(self.gap)
+            writer.write(b'0\r\n\r\n')
+            await writer.drain()
+
+    async def _serve_h2(self, reader, writer, preface):
+        import h2.config
+        import h2.connection
+        import h2.events
+
+        conn = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False))
+        conn.initiate_connection()
+        tasks = set()
+
+        async def respond(stream_id):
+            await asyncio.sleep(self.ttfb)
+            conn.send_headers(stream_id, [(':status', '200'), ('content-type', 'text/event-stream')])
+            for chunk in sse_chunks(self.chunks):
+                conn.send_data(stream_id, chunk)
+                writer.write(conn.data_to_send())
+                await writer.drain()
+                await asyncio.sleep(self.gap)
+            conn.end_stream(stream_id)
+            writer.write(conn.data_to_send())
+
+        data = preface
+        while data:
+            for event in conn.receive_data(data):
+                if isinstance(event, h2.events.DataReceived):
+                    conn.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+                elif isinstance(event, h2.events.StreamEnded):
+                    task = asyncio.ensure_future(respond(event.stream_id))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                elif isinstance(event, h2.events.ConnectionTerminated):
+                    return
+            writer.write(conn.data_to_send())
+            await writer.drain()
+            data = await reader.read(65536)
+        for task in tasks:
+            task.cancel()
+
+
+async def one_request(client, url):
+    body = json.dumps({'model': 'bench', 'stream': True,
+                       'messages': [{'role': 'user', 'content': '你好' * 50}]}).encode('utf-8')
+    start = time.perf_counter()
+    first = None
+    async with client.stream('POST', url, content=body,
+                             headers={'Content-Type': 'application/json'}) as response:
+        async for line in response.aiter_lines():
+            if line.startswith('data:') and first is None:
+                first = time.perf_counter() - start
+        version = response.http_version
+    return first, time.perf_counter() - start, version
+
+
+async def run_level(client, url, concurrency, total):
+    slots = asyncio.Semaphore(concurrency)
+
+    async def limited():
+        async with slots:
+            return await one_request(client, url)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(limited() for _ in range(total)))
+    return time.perf_counter() - start, results
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--requests', type=int, default=64, help='每个并发级别的请求总数')
+    parser.add_argument('--handshake', type=float, default=60, help='新连接的模拟握手耗时（毫秒）')
+    parser.add_argument('--ttfb', type=float, default=150, help='首个分块前的等待（毫秒）')
+    parser.add_argument('--chunks', type=int, default=20, help='每个回答的分块数')
+    parser.add_argument('--gap', type=float, default=5, help='分块间隔（毫秒）')
+    parser.add_argument('--levels', default='1,8,32', help='并发级别')
+    args = parser.parse_args()
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        sys.exit("需要安装 h2：pip install h2")
+
+    server = StandInServer(args.handshake / 1000, args.ttfb / 1000, args.chunks, args.gap / 1000)
+    port = await server.start()
+    url = f'http://127.0.0.1:{port}/v1/chat/completions'
+    limits = AsyncEngine().limits  # 与程序使用相同的连接池限制
+
+    print(f"握手 {args.handshake:.0f}ms, 首字 {args.ttfb:.0f}ms, {args.chunks} 个分块, "
+          f"每级 {args.requests} 个请求, 连接池 max_connections={limits.max_connections} "
+          f"max_keepalive={limits.max_keepalive_connections}")
+    print(f"{'协议':<10}{'并发':>6}{'请求/秒':>10}{'首字p50':>10}{'首字p95':>10}{'总p50':>10}{'总p95':>10}{'新建连接':>10}")
+    for concurrency in [int(level) for level in args.levels.split(',')]:
+        for label, options in (('HTTP/1.1', {'http2': False}), ('HTTP/2', {'http1': False, 'http2': True})):
+            async with httpx.AsyncClient(limits=limits, timeout=60, **options) as client:
+                opened = server.connections
+                elapsed, results = await run_level(client, url, concurrency, args.requests)
+                opened = server.connections - opened
+            ttft = [r[0] * 1000 for r in results]
+            total = [r[1] * 1000 for r in results]
+            assert all(r[2] == label for r in results), {r[2] for r in results}
+            print(f"{label:<10}{concurrency:>6}{args.requests / elapsed:>10.1f}"
+                  f"{statistics.median(ttft):>9.0f}ms{percentile(ttft, 0.95):>8.0f}ms"
+                  f"{statistics.median(total):>8.0f}ms{percentile(total, 0.95):>8.0f}ms{opened:>10}")
+    await server.stop()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
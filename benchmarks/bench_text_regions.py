@@ -0,0 +1,212 @@
+"""文字区域裁剪效果：上传像素、请求体大小、检测耗时和 OCR 延迟
+
+默认生成一组模拟截图（浅色 / 深色主题，大片空白、图片和分栏文字），另加几种容易漏检的情形：
+行距为零的段落、大标题、高分屏（4K）上的大字号文字。
+已知每段文字的位置，可以检查裁剪后是否仍覆盖全部文字（召回率）。
+OCR 延迟默认按模型估算：往返 --rtt 毫秒 + 请求体 / --uplink（Mbps） + 每百万像素 --per-mp 毫秒；
+加 --live 时使用 config.json 中的百度密钥对原图和裁剪结果分别实际请求（会消耗调用次数）。
+
+    python benchmarks/bench_text_regions.py [--images 截图文件夹] [--count 12] [--live]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont  # noqa: E402
+
+from baidu_ocr import EncodedImage  # noqa: E402
+from image_regions import RegionPacker  # noqa: E402
+from text_regions import TextRegionDetector  # noqa: E402
+
+WORDS = ("the quick brown fox jumps over lazy dog screen capture text region detector upload "
+         "latency pixels budget window button settings answer question model stream token").split()
+
+THEMES = [((255, 255, 255), (30, 30, 30)), ((30, 30, 30), (220, 220, 220)), ((240, 242, 245), (60, 60, 90))]
+
+
+def _font(size):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1 只有固定大小的位图字体
+        return ImageFont.load_default()
+
+
+def _photo(width, height, rng):
+    """带纹理的“图片”块"""
+    photo = Image.effect_noise((width, height), 80).convert('RGB')
+    draw = ImageDraw.Draw(photo)
+    for _ in range(12):
+        x, y = rng.randrange(width), rng.randrange(height)
+        r = rng.randrange(10, max(11, min(width, height) // 3))
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=tuple(rng.randrange(256) for _ in range(3)))
+    return photo.filter(ImageFilter.GaussianBlur(1))
+
+
+# 容易漏检的情形：(名称, 截图尺寸, 字号, 行距, 行数)
+HARD_CASES = [
+    ('tight-leading', (1600, 900), 16, 0, 8),
+    ('heading', (1600, 900), 120, 10, 1),
+    ('hidpi', (3840, 2160), 40, 14, 6),
+]
+
+
+def synthetic_screenshot(seed, screen=None, font_size=None, spacing=None, line_count=None):
+    """返回 (截图, 文字框列表)；除 seed 外的参数固定截图尺寸和文字块的字号、行距、行数"""
+    rng = random.Random(seed)
+    width, height = screen or rng.choice([(800, 600), (1200, 800), (1600, 900), (1920, 1080), (2560, 1440)])
+    background, foreground = rng.choice(THEMES)
+    image = Image.new('RGB', (width, height), background)
+    draw = ImageDraw.Draw(image)
+    boxes = []
+    # 一张图片
+    if rng.random() < 0.7:
+        pw, ph = rng.randrange(width // 5, width // 2), rng.randrange(height // 5, height // 2)
+        px, py = rng.randrange(0, width - pw), rng.randrange(0, height - ph)
+        image.paste(_photo(pw, ph, rng), (px, py))
+        occupied = [(px, py, px + pw, py + ph)]
+    else:
+        occupied = []
+    # 一到三个文字块，分布在空白处
+    for _ in range(rng.randint(1, 3)):
+        size = font_size or rng.choice([12, 14, 16, 20, 28])
+        gap = size // 2 if spacing is None else spacing
+        font = _font(size)
+        words = (3, 9) if size < 60 else (1, 3)
+        lines = [' '.join(rng.choice(WORDS) for _ in range(rng.randint(*words)))
+                 for _ in range(line_count or rng.randint(1, 6))]
+        for _ in range(20):
+            x, y = rng.randrange(0, width // 2), rng.randrange(0, max(1, height - len(lines) * (size + gap) * 2))
+            block = draw.multiline_textbbox((x, y), '\n'.join(lines), font=font, spacing=gap)
+            if block[2] < width and block[3] < height and not any(
+                    block[0] < o[2] and o[0] < block[2] and block[1] < o[3] and o[1] < block[3] for o in occupied):
+                draw.multiline_text((x, y), '\n'.join(lines), font=font, fill=foreground, spacing=gap)
+                occupied.append(block)
+                # 文字框取实际有笔画的范围（textbbox 含字形两侧的空白）
+                mask = Image.new('L', (width, height))
+                ImageDraw.Draw(mask).multiline_text((x, y), '\n'.join(lines), font=font, fill=255, spacing=gap)
+                boxes.append(mask.getbbox())
+                break
+    return image, boxes
+
+
+def covered(box, regions):
+    return any(r[0] <= box[0] and r[1] <= box[1] and box[2] <= r[2] and box[3] <= r[3] for r in regions)
+
+
+def upload_images(image, plan, packer):
+    """按裁剪方案实际要上传的图片"""
+    if plan is None:
+        return [image]
+    crops = [image.crop(box) for box in plan]
+    if len(crops) == 1:
+        return crops
+    return [packed.image for packed in packer.pack(crops)]
+
+
+def body_size(images):
+    total = 0
+    for image in images:
+        body = EncodedImage(image)
+        total += body.content_length
+        body.close()
+    return total
+
+
+def load_images(directory):
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp')):
+            with Image.open(os.path.join(directory, name)) as image:
+                yield name, image.convert('RGB'), None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--images', help='使用文件夹中的真实截图（不计算召回率）')
+    parser.add_argument('--count', type=int, default=12, help='模拟截图数量')
+    parser.add_argument('--rtt', type=float, default=60, help='估算模型：网络往返（毫秒）')
+    parser.add_argument('--uplink', type=float, default=10, help='估算模型：上行带宽（Mbps）')
+    parser.add_argument('--per-mp', type=float, default=250, help='估算模型：每百万像素的处理耗时（毫秒）')
+    parser.add_argument('--live', action='store_true', help='使用 config.json 中的百度密钥实际请求')
+    args = parser.parse_args()
+
+    if args.images:
+        samples = list(load_images(args.images))
+    else:
+        samples = [(f'synthetic-{i:02d}', *synthetic_screenshot(i)) for i in range(args.count)]
+        for name, screen, size, spacing, line_count in HARD_CASES:
+            for i in range(3):
+                samples.append((f'{name}-{i}', *synthetic_screenshot(100 + i, screen, size, spacing, line_count)))
+
+    detector = TextRegionDetector()
+    packer = RegionPacker()
+    client = None
+    if args.live:
+        from async_engine import AsyncEngine
+        from baidu_ocr import BaiduOCRClient
+        from config_manager import ConfigManager
+        baidu = ConfigManager().config['baidu_ocr']
+        engine = AsyncEngine()
+        engine.start()
+        client = BaiduOCRClient(engine, baidu['api_key'], baidu['secret_key'])
+        client.fetch_access_token()
+
+    def estimate(images, size):
+        pixels = sum(image.size[0] * image.size[1] for image in images)
+        return args.rtt + size * 8 / (args.uplink * 1000) + pixels / 1e6 * args.per_mp
+
+    def live(images):
+        start = time.perf_counter()
+        if len(images) == 1:
+            client.recognize(images[0])
+        else:
+            client.recognize_many(images)
+        return (time.perf_counter() - start) * 1000
+
+    print(f"{'截图':<16}{'尺寸':>11}{'方式':>6}{'检测ms':>8}{'像素':>8}{'请求体':>8}"
+          f"{'原图ms':>8}{'裁剪ms':>8}{'召回':>6}")
+    rows = []
+    for name, image, truth in samples:
+        start = time.perf_counter()
+        plan = detector.plan(image, packer)
+        detect_ms = (time.perf_counter() - start) * 1000
+        uploads = upload_images(image, plan, packer)
+        full_size, crop_size = body_size([image]), body_size(uploads)
+        full_px = image.size[0] * image.size[1]
+        crop_px = sum(u.size[0] * u.size[1] for u in uploads)
+        if client is not None:
+            full_ms, crop_ms = live([image]), live([image.crop(box) for box in plan] if plan else [image])
+        else:
+            full_ms, crop_ms = estimate([image], full_size), estimate(uploads, crop_size)
+        regions = plan or [(0, 0, *image.size)]
+        recall = sum(covered(box, regions) for box in truth) / len(truth) if truth else None
+        mode = '原图' if plan is None else '外接框' if len(plan) == 1 else f'拼接{len(plan)}'
+        rows.append((full_px, crop_px, full_size, crop_size, full_ms, crop_ms + detect_ms, detect_ms, recall))
+        print(f"{name[:16]:<16}{image.size[0]:>6}x{image.size[1]:<5}{mode:>6}{detect_ms:>8.1f}"
+              f"{1 - crop_px / full_px:>8.0%}{1 - crop_size / full_size:>8.0%}"
+              f"{full_ms:>8.0f}{crop_ms:>8.0f}{'-' if recall is None else f'{recall:.0%}':>6}")
+
+    full_px, crop_px, full_size, crop_size, full_ms, crop_ms, detect_ms, recalls = zip(*rows)
+    recalls = [r for r in recalls if r is not None]
+    print()
+    print(f"上传像素: {sum(full_px) / 1e6:.1f}MP -> {sum(crop_px) / 1e6:.1f}MP（减少 {1 - sum(crop_px) / sum(full_px):.0%}）")
+    print(f"请求体:   {sum(full_size) / 1e6:.1f}MB -> {sum(crop_size) / 1e6:.1f}MB"
+          f"（减少 {1 - sum(crop_size) / sum(full_size):.0%}）")
+    print(f"OCR 延迟{'（实测）' if client else '（估算）'}: 中位数 {statistics.median(full_ms):.0f}ms -> "
+          f"{statistics.median(crop_ms):.0f}ms（含检测），平均 {statistics.mean(full_ms):.0f}ms -> "
+          f"{statistics.mean(crop_ms):.0f}ms")
+    print(f"检测耗时: 中位数 {statistics.median(detect_ms):.1f}ms, 最大 {max(detect_ms):.1f}ms")
+    if recalls:
+        print(f"文字召回: {statistics.mean(recalls):.1%}（裁剪区域完整覆盖的文字块比例）")
+        missed = [name for (name, _, truth), recall in zip(samples, [row[-1] for row in rows])
+                  if recall is not None and recall < 1]
+        if missed:
+            print(f"有文字未覆盖: {', '.join(missed)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""OCR 上传的峰值内存：流式请求体（EncodedImage）与整体编码对比
+
+生成一张 4K 模拟截图（半屏图片加文字，PNG 与真实截图同一量级），用 tracemalloc 分别测量：
+- 流式：EncodedImage 编码 PNG 后，经 AsyncEngine 的 HTTP 客户端上传到本机一个只读取不保存的服务器；
+- 整体编码（旧做法）：PNG → 整张 base64 → URL 编码的表单字符串。
+流式上传期间新增内存的峰值不超过 PNG 大小的 --max-ratio 倍（默认 2）时通过，否则以非零状态退出：
+流式上传只保存一份 PNG（BytesIO 预留约 1/8 余量），另有几百 KB 与图片大小无关的编码块和连接缓冲；
+整体编码同时持有 PNG、base64 和表单字符串，峰值是 PNG 的十几倍。
+tracemalloc 只统计经 Python 分配器的内存，PIL 的像素数据不在其中，两种做法都不包含截图本身。
+另检查上传中途被服务器断开的情况：BaiduOCRClient 应抛出 NetworkError，释放请求体不应出错
+（请求体的迭代器停在中途时曾导致 close() 抛出 BufferError，掩盖了网络错误）。
+
+    python benchmarks/bench_upload_memory.py [--size 3840x2160] [--max-ratio 2]
+"""
+import argparse
+import asyncio
+import base64
+import io
+import os
+import random
+import sys
+import tracemalloc
+import urllib.parse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_engine import AsyncEngine, NetworkError  # noqa: E402
+from baidu_ocr import BaiduOCRClient, EncodedImage  # noqa: E402
+from bench_text_regions import _photo, synthetic_screenshot  # noqa: E402
+
+
+class DiscardServer:
+    """读取请求体后丢弃，返回请求体长度"""
+
+    def __init__(self):
+        self.received = 0
+
+    async def start(self):
+        server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        return server.sockets[0].getsockname()[1]
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                length = 0
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        return
+                    if line in (b'\r\n', b'\n'):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    if name.strip().lower() == 'content-length':
+                        length = int(value)
+                remaining = length
+                while remaining:
+                    remaining -= len(await reader.read(min(remaining, 64 * 1024)))
+                self.received = length
+                body = str(length).encode()
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n%s' % (len(body), body))
+                await writer.drain()
+        finally:
+            writer.close()
+
+
+class AbortServer:
+    """读完请求头和一部分请求体后直接断开连接"""
+
+    def __init__(self, read_bytes=64 * 1024):
+        self.read_bytes = read_bytes
+
+    async def start(self):
+        server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        return server.sockets[0].getsockname()[1]
+
+    async def _handle(self, reader, writer):
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+        await reader.read(self.read_bytes)
+        writer.transport.abort()
+
+
+def check_aborted_upload(engine, image):
+    """上传中途断开：返回 (是否通过, 说明)；image 不应超过接口尺寸限制（否则会分块上传到默认接口）"""
+    port = engine.run(AbortServer().start())
+    client = BaiduOCRClient(engine)
+    client.access_token = 'test'
+    try:
+        engine.run(client.arecognize(image, max_retries=0, url=f'http://127.0.0.1:{port}/ocr'))
+    except NetworkError as e:
+        return True, f"{type(e).__name__}: {e}"
+    except Exception as e:
+        return False, f"{type(e).__name__}: {e}"
+    return False, "服务器断开后请求没有失败"
+
+
+def measure(fn):
+    """执行 fn，返回 (结果, 执行期间新增内存的峰值)"""
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    result = fn()
+    return result, tracemalloc.get_traced_memory()[1] - baseline
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--size', default='3840x2160', help='截图尺寸')
+    parser.add_argument('--max-ratio', type=float, default=2.0, help='流式上传峰值内存 / PNG 大小的上限')
+    args = parser.parse_args()
+    width, height = (int(v) for v in args.size.lower().split('x'))
+
+    image, _ = synthetic_screenshot(0, (width, height), 40)
+    image.paste(_photo(width // 2, height, random.Random(0)), (width // 2, 0))
+    engine = AsyncEngine()
+    engine.start()
+    server = DiscardServer()
+    port = engine.run(server.start())
+    url = f'http://127.0.0.1:{port}/ocr'
+
+    async def upload(body):
+        response = await engine.client().post(url, content=body,
+                                              headers={'Content-Type': 'application/x-www-form-urlencoded',
+                                                       'Content-Length': str(body.content_length)})
+        return int(response.text)
+
+    def streamed():
+        body = EncodedImage(image)
+        try:
+            received = engine.run(upload(body))
+            assert received == body.content_length, (received, body.content_length)
+            return body.png_size, body.content_length
+        finally:
+            body.close()
+
+    def whole():
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG')
+        png = buffer.getvalue()
+        form = urllib.parse.urlencode({'image': base64.b64encode(png)})
+        return len(form)
+
+    engine.run(upload(EncodedImage(image.crop((0, 0, 64, 64)))))  # 预先建立连接，不计入测量
+    tracemalloc.start()
+    (png_size, content_length), streamed_peak = measure(streamed)
+    form_size, whole_peak = measure(whole)
+    tracemalloc.stop()
+
+    ratio = streamed_peak / png_size
+    print(f"截图 {width}x{height}: PNG {png_size / 1e6:.2f}MB, 请求体 {content_length / 1e6:.2f}MB")
+    print(f"流式上传峰值内存:   {streamed_peak / 1e6:.2f}MB（PNG 的 {ratio:.2f} 倍）")
+    print(f"整体编码峰值内存:   {whole_peak / 1e6:.2f}MB（PNG 的 {whole_peak / png_size:.2f} 倍，"
+          f"表单 {form_size / 1e6:.2f}MB）")
+    aborted_ok, aborted = check_aborted_upload(engine, image.crop((width // 4, 0, width // 4 + 1920, 1080)))
+    print(f"上传中途断开:       {aborted}")
+    failed = False
+    if ratio > args.max_ratio:
+        print(f"失败: 流式上传峰值内存超过 PNG 大小的 {args.max_ratio} 倍")
+        failed = True
+    if not aborted_ok:
+        print("失败: 上传中途断开时应抛出 NetworkError")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print(f"通过: 峰值内存不超过 PNG 大小的 {args.max_ratio} 倍，中途断开时抛出 NetworkError")
+
+
+if __name__ == '__main__':
+    main()
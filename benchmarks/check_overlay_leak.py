@@ -0,0 +1,96 @@
+"""截图遮罩反复显示是否累积 Tk 对象，并报告热键到遮罩显示的延迟
+
+创建一个 CaptureOverlay，重复 --rounds 次（默认 1000）：show() 显示遮罩，
+模拟按住 Shift 选择一个区域、再拖出一个选框，然后 _finish() 完成选择并隐藏。
+每轮显示后和完成后分别记录画布对象数（canvas.find_all()）和窗口子控件数（winfo_children()），
+与第一轮相同时通过，否则以非零状态退出；最后输出 capture.overlay_latency 的统计。
+需要图形环境，无显示器的机器上可用 Xvfb 运行：
+
+    xvfb-run -a python benchmarks/check_overlay_leak.py [--rounds 1000]
+"""
+import argparse
+import os
+import sys
+import time
+import tkinter as tk
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from capture_overlay import CaptureOverlay  # noqa: E402
+from diagnostics import metrics  # noqa: E402
+
+
+class FakeEvent:
+    """鼠标事件的替身，只提供 CaptureOverlay 用到的字段"""
+
+    def __init__(self, x, y, state=0):
+        self.x = x
+        self.y = y
+        self.state = state
+
+
+def drag(overlay, start, end, shift=False, release=True):
+    overlay._start_selection(FakeEvent(*start))
+    overlay._update_selection(FakeEvent(*end))
+    if release:
+        overlay._end_selection(FakeEvent(*end, state=0x1 if shift else 0))
+
+
+def counts(root, overlay):
+    return (len(overlay.canvas.find_all()), len(overlay.window.winfo_children()), len(root.winfo_children()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rounds', type=int, default=1000, help='显示 / 完成的次数')
+    args = parser.parse_args()
+
+    root = tk.Tk()
+    root.withdraw()
+    finished = []
+    overlay = CaptureOverlay(root, finished.append, debounce=0)
+    root.update()
+
+    expected = None
+    failures = []
+    started = time.perf_counter()
+    for i in range(args.rounds):
+        if not overlay.show(triggered_at=time.perf_counter()):
+            failures.append(f"第 {i + 1} 轮 show() 被忽略")
+            break
+        root.update()
+        shown = counts(root, overlay)
+        drag(overlay, (10, 10), (200, 150), shift=True)
+        drag(overlay, (300, 200), (500, 400), release=False)
+        overlay._finish()
+        root.update()
+        done = counts(root, overlay)
+        if expected is None:
+            expected = (shown, done)
+        elif (shown, done) != expected:
+            failures.append(f"第 {i + 1} 轮: 显示后 {shown}, 完成后 {done}，第一轮为 {expected}")
+            break
+    elapsed = time.perf_counter() - started
+    overlay.destroy()
+    root.destroy()
+
+    print(f"{len(finished)} 次选择，平均每轮 {elapsed / max(len(finished), 1) * 1000:.2f}ms")
+    if expected is not None:
+        print(f"画布对象 / 遮罩子控件 / 根窗口子控件: 显示后 {expected[0]}, 完成后 {expected[1]}")
+    latency = metrics.timing('capture.overlay_latency')
+    if latency:
+        print(f"capture.overlay_latency: {latency['count']} 次, 平均 {latency['avg'] * 1000:.2f}ms, "
+              f"最大 {latency['max'] * 1000:.2f}ms")
+    else:
+        print("capture.overlay_latency: 没有记录（未收到遮罩窗口的 Map 事件）")
+    if len(finished) != args.rounds:
+        failures.append(f"完成回调只调用了 {len(finished)} 次")
+    if failures:
+        for failure in failures:
+            print(f"失败: {failure}")
+        sys.exit(1)
+    print(f"通过: {args.rounds} 轮后画布对象和窗口子控件数量不变")
+
+
+if __name__ == '__main__':
+    main()
@@ -47,7 +47,7 @@ def check_dependencies():
         subprocess.run([sys.executable, "-m", "pip", "install", "pyinstaller"], check=True)
     
     # Check other dependencies
-    required_modules = ['requests', 'pyautogui', 'keyboard', 'PIL']
+    required_modules = ['requests', 'httpx', 'h2', 'pyautogui', 'keyboard', 'PIL']
     missing_modules = []
     
     for module in required_modules:
@@ -58,6 +58,12 @@ def check_dependencies():
             elif module == 'requests':
                 import requests
                 safe_print(f"✓ {module} installed")
+            elif module == 'httpx':
+                import httpx
+                safe_print(f"✓ {module} installed")
+            elif module == 'h2':
+                import h2
+                safe_print(f"✓ {module} installed")
             elif module == 'pyautogui':
                 import pyautogui
                 safe_print(f"✓ {module} installed")
@@ -140,6 +146,10 @@ def build_exe():
         '--hidden-import=keyboard',
         '--hidden-import=pyautogui', 
         '--hidden-import=requests',
+        '--hidden-import=httpx',
+        '--hidden-import=h2',           # HTTP/2 support (httpx[http2])
+        '--hidden-import=hpack',
+        '--hidden-import=hyperframe',
         '--hidden-import=urllib3',
         '--hidden-import=urllib3.util',
         '--hidden-import=urllib3.connection',
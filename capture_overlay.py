@@ -0,0 +1,174 @@
+"""截图遮罩：启动时创建一次并隐藏，每次截图时重置状态后重新显示"""
+import logging
+import time
+import tkinter as tk
+
+from diagnostics import metrics, register_summary
+from image_regions import normalize_region
+
+logger = logging.getLogger(__name__)
+
+HELP_TEXT = "拖动鼠标选择区域，按住Shift可选择多个区域（回车完成），按ESC取消"
+
+
+class CaptureOverlay:
+    """全屏半透明选区窗口
+
+    窗口和画布只创建一次，隐藏时保留，再次显示前删除上一次绘制的选框并重置选择状态，
+    因此反复截图不会累积 Tk 对象。on_finish(regions) 在用户完成选择后（窗口已隐藏）调用。
+    连续按下热键时，遮罩已显示或距上次显示不足 debounce 秒的请求会被忽略。
+    须在 Tk 主线程中使用。
+    """
+
+    def __init__(self, root, on_finish, debounce=0.3):
+        self.on_finish = on_finish
+        self.debounce = debounce
+        self.regions = []
+        self.visible = False
+        self._start = None
+        self._capturing = False
+        self._shown_at = 0.0
+        self._triggered_at = None
+        self._session_finish = None
+
+        self.window = tk.Toplevel(root)
+        self.window.withdraw()
+        self.window.title("截图")
+
+        # 设置窗口为半透明全屏
+        self.window.attributes('-alpha', 0.3)  # 30%透明度，可以看到背景
+        self.window.attributes('-fullscreen', True)
+        self.window.attributes('-topmost', True)
+        self.window.configure(bg='gray')
+        self.window.overrideredirect(True)
+
+        self.canvas = tk.Canvas(self.window, bg='gray', highlightthickness=0, cursor='crosshair')
+        self.canvas.pack(fill='both', expand=True)
+        self.canvas.create_text(
+            self.window.winfo_screenwidth() // 2, 30,
+            text=HELP_TEXT,
+            fill='red',
+            font=('Arial', 16, 'bold'),
+            tags='help'
+        )
+
+        self.canvas.bind('<Button-1>', self._start_selection)
+        self.canvas.bind('<B1-Motion>', self._update_selection)
+        self.canvas.bind('<ButtonRelease-1>', self._end_selection)
+        self.canvas.bind('<Return>', self._finish)
+        self.canvas.bind('<Escape>', self.cancel)
+        self.window.bind('<Map>', self._on_map)
+
+    def show(self, triggered_at=None, on_finish=None):
+        """重置并显示遮罩；triggered_at 为热键触发时刻（time.perf_counter()），用于统计响应延迟
+
+        on_finish 仅对本次选择生效（例如选择要监视的区域），默认使用构造时传入的回调。
+        返回是否真正显示（被去抖忽略时返回 False）。
+        """
+        now = time.perf_counter()
+        if self.visible or now - self._shown_at < self.debounce:
+            metrics.incr('capture.debounced')
+            return False
+        self._shown_at = now
+        self._triggered_at = triggered_at or now
+        self._session_finish = on_finish
+        self._reset()
+        self.visible = True
+        self.window.deiconify()
+        self.window.lift()
+        self.window.focus_force()
+        self.canvas.focus_set()
+        metrics.incr('capture.shown')
+        metrics.set_gauge('capture.canvas_items', len(self.canvas.find_all()))
+        return True
+
+    def hide(self):
+        self.visible = False
+        self._capturing = False
+        self.window.withdraw()
+
+    def cancel(self, event=None):
+        logger.info("取消截图")
+        self.regions = []
+        self.canvas.delete('rect', 'region')
+        self.hide()
+
+    def destroy(self):
+        try:
+            self.window.destroy()
+        except tk.TclError:
+            pass
+
+    def _reset(self):
+        """清除上一次截图留下的选框，恢复提示信息"""
+        self.regions = []
+        self._start = None
+        self._capturing = False
+        self.canvas.delete('rect', 'region')
+        self.canvas.itemconfigure('help', state='normal')
+
+    def _on_map(self, event):
+        if event.widget is self.window and self._triggered_at is not None:
+            metrics.observe('capture.overlay_latency', time.perf_counter() - self._triggered_at)
+            self._triggered_at = None
+
+    def _start_selection(self, event):
+        self._start = (event.x, event.y)
+        self._capturing = True
+        self.canvas.itemconfigure('help', state='hidden')  # 隐藏提示信息
+        self.canvas.delete('rect')  # 删除之前的矩形
+        logger.debug(f"开始选择: {self._start}")
+
+    def _update_selection(self, event):
+        if not (self._capturing and self._start):
+            return
+        self.canvas.delete('rect')  # 删除之前的矩形
+        left, top, right, bottom = normalize_region(*self._start, event.x, event.y)
+
+        # 绘制非常明亮的红色边框（无填充）
+        self.canvas.create_rectangle(left, top, right, bottom, outline='red', width=4, tags='rect')
+        # 添加高对比度的内边框
+        self.canvas.create_rectangle(left+1, top+1, right-1, bottom-1, outline='yellow', width=1, tags='rect')
+
+        # 显示尺寸信息（添加黑色背景使文字更清晰）
+        width = right - left
+        height = bottom - top
+        if width > 20 and height > 20:  # 只在区域足够大时显示
+            self.canvas.create_rectangle(right + 5, top - 25, right + 120, top + 5,
+                                         fill='black', outline='white', tags='rect')
+            self.canvas.create_text(right + 10, top - 10, text=f"{width} x {height}", fill='yellow',
+                                    anchor='w', font=('Arial', 12, 'bold'), tags='rect')
+
+    def _end_selection(self, event):
+        if not (self._capturing and self._start):
+            return
+        self._capturing = False
+        region = normalize_region(*self._start, event.x, event.y)
+        logger.debug(f"结束选择: {region}")
+        if region[2] - region[0] > 1 and region[3] - region[1] > 1:
+            self.regions.append(region)
+
+        # 按住 Shift 时保留已选区域，继续选择下一个
+        if event.state & 0x1:
+            self.canvas.itemconfigure('rect', tags='region')
+            logger.debug(f"已选择 {len(self.regions)} 个区域")
+            return
+        self._finish()
+
+    def _finish(self, event=None):
+        regions, self.regions = self.regions, []
+        if not regions:
+            return
+        self.hide()
+        (self._session_finish or self.on_finish)(regions)
+
+
+@register_summary
+def _overlay_summary(m):
+    latency = m.timing('capture.overlay_latency')
+    if not latency:
+        return []
+    items = m.snapshot()['gauges'].get('capture.canvas_items', (0, 0))
+    return [f"截图遮罩: 显示 {m.counter('capture.shown')} 次, 热键到显示平均 {latency['avg'] * 1000:.0f}ms"
+            f"（最大 {latency['max'] * 1000:.0f}ms）, 去抖忽略 {m.counter('capture.debounced')} 次, "
+            f"画布对象 {items[0]}（最多 {items[1]}）"]
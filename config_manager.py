@@ -4,10 +4,12 @@ import sys
 import logging
 import tempfile
 
+import app_logging
+
 class ConfigManager:
     def __init__(self):
-        # 设置日志
-        logging.basicConfig(level=logging.INFO)
+        # 设置日志（后台线程写入，调用方不阻塞）
+        app_logging.setup_logging()
         self.logger = logging.getLogger(__name__)
         
         # 获取配置文件的正确路径
@@ -17,19 +19,94 @@ class ConfigManager:
         self.default_config = {
             'baidu_ocr': {
                 'api_key': '',
-                'secret_key': ''
+                'secret_key': '',
+                'qps': 10,  # 并发识别时每秒最多请求数
+                'stitch_regions': True,  # 多区域识别时把小区域拼接为一次请求
+                'endpoint_mode': 'auto',  # auto：按区域大小和延迟预算自动选择；或固定为某个接口名称
+                'endpoints': ['general_basic', 'accurate_basic', 'general', 'accurate'],  # 允许使用的接口
+                'latency_budget': 1.5,  # 自动选择时的预估延迟上限（秒），预算内优先用高精度接口
+                'crop_to_text': True  # 截图只上传检测到的文字区域（空白和图片不上传）
             },
             'gpt': {
                 'api_url': 'https://free.v36.cm/v1/chat/completions',
                 'api_key': '',
                 'model': 'gpt-4o-mini',
-                'system_prompt': '你是一个用中文回答问题的AI助手,如果只有英文输入就返回翻译信息.'
+                'system_prompt': '你是一个用中文回答问题的AI助手,如果只有英文输入就返回翻译信息.',
+                'speculative': False,  # 识别完成后预先发起请求
+                'endpoints': [],  # 额外的兼容接口 [{name, api_url, api_key, model, weight}]，按延迟自动选择
+                'hedge_after': 0,  # 首选接口超过该秒数未返回时向备用接口发送对冲请求，0 表示关闭
+                'reuse_similar': True,  # 问题与最近问过的几乎相同时直接显示之前的回答
+                'similarity_threshold': 0.9,  # 判定为相似问题的 SimHash 相似度
+                'http2': False,  # 使用 HTTP/2 多路复用（需要 pip install httpx[http2]）
+                'compare_models': []  # 多模型对比的模型：名称或 {name, api_url, api_key, model}，为空时对比主模型和 endpoints
             },
             'window': {
                 'topmost': True  # 默认置顶
+            },
+            'network': {
+                'prewarm': True,  # 启动、截图和窗口聚焦时预热连接
+                'prewarm_interval': 45,  # 周期性刷新间隔（秒）
+                'max_idle_connections': 8,  # 每个主机保留的空闲连接上限
+                'keepalive_expiry': 90,  # 空闲连接保留时间（秒）
+                'keepalive_max_idle': 600  # 超过该时间（秒）未使用则停止刷新
+            },
+            'usage': {
+                'daily_token_quota': 0,  # 每日 token 上限，0 表示不限（超出时仅提醒）
+                'daily_ocr_quota': 0,  # 每日 OCR 调用次数上限，0 表示不限
+                'warn_ratio': 0.8,  # 用量达到配额的该比例时提醒
+                'retention_days': 30  # 请求明细保留天数（每日汇总永久保留）
+            },
+            'watch': {
+                'directories': [],  # 监视的文件夹，新放入的图片自动识别
+                'interval': 2,  # 轮询间隔（秒）
+                'settle_seconds': 2,  # 文件大小和修改时间保持不变多久后才处理（避免读到写了一半的文件）
+                'workers': 2,  # 同时处理的文件数
+                'recursive': False,  # 是否包含子文件夹
+                'extensions': ['.png', '.jpg', '.jpeg', '.bmp', '.gif', '.webp', '.tif', '.tiff'],
+                'output_dir': '',  # 结果文件目录，留空则写在图片旁边
+                'summarize': True,  # 配置了 GPT 时生成摘要
+                'summary_prompt': '请简要总结以下截图中的文字内容：'
+            },
+            'monitor': {
+                'interval': 1.0,  # 区域监视的截图间隔（秒）
+                'change_ratio': 0.005,  # 缩略图中变化像素的比例达到该值才重新识别
+                'max_settle': 3.0,  # 画面持续变化超过该秒数时不再等待稳定，直接识别
+                'max_backoff': 60.0,  # 连续识别失败时检查间隔逐次加倍，最长不超过该秒数
+                'translate': False,  # 把新出现的文字流式翻译到回答框
+                'translate_prompt': '把下面的文字翻译成中文，只输出译文：'
+            },
+            'long_input': {
+                'max_input_tokens': 6000,  # 估算超过该 token 数时分段处理，0 表示关闭
+                'chunk_tokens': 3000,  # 每段的 token 上限
+                'concurrency': 4,  # 同时请求的段数
+                'reduce': 'merge',  # merge：由模型合并各段回答；concat：按顺序拼接（适合翻译）
+                'map_prompt': '',  # 每段前附加的提示，可用 {index}/{total}，留空则直接发送原文
+                'reduce_prompt': '下面是一段长文本各部分的回答，请把它们合并为一个完整连贯的回答，去掉重复内容：'
+            },
+            'offline_queue': {
+                'enabled': True,  # 网络不可用时保存截图和问题，恢复后自动处理
+                'max_jobs': 100,  # 最多保存的任务数
+                'max_mb': 50,  # 任务文件总大小上限（MB）
+                'max_retry_delay': 300  # 重试间隔上限（秒），从 2 秒开始逐次加倍
+            },
+            'profiling': {
+                'runs': 5,  # 开启性能分析后记录的截图识别 / 提问次数
+                'hotkey': 'ctrl+alt+p'  # 开启 / 停止性能分析的热键，留空则只能从菜单开启
+            },
+            'logging': {
+                'level': 'INFO',  # DEBUG / INFO / WARNING / ERROR
+                'max_bytes': 1048576,  # 单个日志文件大小上限，超过后轮转
+                'backup_count': 3  # 保留的旧日志文件数
             }
         }
         self.config = self.load_config()
+        
+        # 日志文件写在 config.json 同目录的 logs 文件夹
+        log_config = self.config['logging']
+        app_logging.enable_file_log(os.path.join(os.path.dirname(self.config_file), 'logs'),
+                                    max_bytes=log_config.get('max_bytes', 1048576),
+                                    backup_count=log_config.get('backup_count', 3),
+                                    level=log_config.get('level', 'INFO'))
     
     def _get_config_path(self):
         """获取配置文件路径 - 优先使用exe同文件夹"""
@@ -74,7 +151,7 @@ class ConfigManager:
                     # 确保所有必需的键都存在
                     merged_config = self.default_config.copy()
                     if isinstance(loaded_config, dict):
-                        for section in ['baidu_ocr', 'gpt', 'window']:
+                        for section in ['baidu_ocr', 'gpt', 'window', 'network', 'usage', 'watch', 'monitor', 'long_input', 'offline_queue', 'profiling', 'logging']:
                             if section in loaded_config and isinstance(loaded_config[section], dict):
                                 merged_config[section].update(loaded_config[section])
                     self.logger.info("配置文件加载成功")
@@ -97,7 +174,7 @@ class ConfigManager:
                 raise ValueError("配置数据必须是字典类型")
             
             # 确保配置数据格式正确
-            for section in ['baidu_ocr', 'gpt', 'window']:
+            for section in ['baidu_ocr', 'gpt', 'window', 'network', 'usage', 'watch', 'monitor', 'long_input', 'offline_queue', 'profiling', 'logging']:
                 if section not in config or not isinstance(config[section], dict):
                     config[section] = self.default_config[section]
             
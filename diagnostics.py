@@ -0,0 +1,109 @@
+"""运行时指标：计数器与耗时统计，供诊断信息展示"""
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Metrics:
+    """线程安全的轻量指标登记表"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}  # name -> [当前值, 最大值]
+        self._timings = {}  # name -> [count, total, max, last]
+
+    def incr(self, name, value=1):
+        """累加计数器"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        """记录瞬时值（同时保留历史最大值）"""
+        with self._lock:
+            gauge = self._gauges.setdefault(name, [0, value])
+            gauge[0] = value
+            gauge[1] = max(gauge[1], value)
+
+    def observe(self, name, seconds):
+        """记录一次耗时（秒）"""
+        with self._lock:
+            stat = self._timings.setdefault(name, [0, 0.0, 0.0, 0.0])
+            stat[0] += 1
+            stat[1] += seconds
+            stat[2] = max(stat[2], seconds)
+            stat[3] = seconds
+
+    @contextmanager
+    def timer(self, name):
+        """统计代码块耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def counter(self, name):
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def timing(self, name):
+        """返回耗时统计 {count, avg, max, last}，没有记录时返回 None"""
+        with self._lock:
+            stat = self._timings.get(name)
+            if not stat:
+                return None
+            count, total, maximum, last = stat
+        return {'count': count, 'avg': total / count, 'max': maximum, 'last': last}
+
+    def snapshot(self):
+        """返回所有指标的副本"""
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = {name: tuple(value) for name, value in self._gauges.items()}
+            names = list(self._timings)
+        return {
+            'counters': counters,
+            'gauges': gauges,
+            'timings': {name: self.timing(name) for name in names}
+        }
+
+
+# 全局指标实例
+metrics = Metrics()
+
+# 各功能模块注册的汇总函数，返回若干行可读的派生指标
+_summaries = []
+
+
+def register_summary(func):
+    """注册汇总函数 func(metrics) -> [str, ...]"""
+    _summaries.append(func)
+    return func
+
+
+def format_report():
+    """生成诊断报告文本"""
+    snapshot = metrics.snapshot()
+    lines = []
+    for func in _summaries:
+        try:
+            lines.extend(func(metrics))
+        except Exception as e:
+            lines.append(f"汇总出错: {str(e)}")
+    if lines:
+        lines.append('')
+    lines.append('[计数]')
+    for name, value in sorted(snapshot['counters'].items()):
+        lines.append(f"  {name}: {value}")
+    if snapshot['gauges']:
+        lines.append('')
+        lines.append('[当前值] 当前 / 最大')
+        for name, (value, maximum) in sorted(snapshot['gauges'].items()):
+            lines.append(f"  {name}: {value} / {maximum}")
+    lines.append('')
+    lines.append('[耗时] 次数 / 平均 / 最大 / 最近 (ms)')
+    for name, stat in sorted(snapshot['timings'].items()):
+        lines.append(f"  {name}: {stat['count']} / {stat['avg'] * 1000:.0f} / "
+                     f"{stat['max'] * 1000:.0f} / {stat['last'] * 1000:.0f}")
+    return '\n'.join(lines)
@@ -0,0 +1,156 @@
+"""文档识别：逐页识别 PDF 和多页 TIFF
+
+页面按需逐页渲染/解码，同时最多 max_inflight 页在内存中等待识别，
+识别请求仍经过 OCR 客户端的限流器；识别结果按页码顺序逐页交给回调，
+因此无论文档有多少页，内存占用都只与并发页数有关。
+PDF 需要安装可选依赖 PyMuPDF（import fitz）。
+"""
+import asyncio
+import logging
+import os
+import time
+
+from PIL import Image
+
+from diagnostics import metrics, register_summary
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_EXTENSIONS = ('.pdf', '.tif', '.tiff')
+
+
+class DocumentError(Exception):
+    """无法打开或解码文档"""
+
+
+class PageSource:
+    """按顺序逐页产生 PIL 图片的迭代器，len() 为总页数"""
+
+    def __init__(self, path, dpi=200):
+        self.path = path
+        self.dpi = dpi
+        self._pdf = None
+        self._image = None
+        self._index = 0
+        extension = os.path.splitext(path)[1].lower()
+        try:
+            if extension == '.pdf':
+                try:
+                    import fitz
+                except ImportError:
+                    raise DocumentError("识别 PDF 需要安装 PyMuPDF：pip install PyMuPDF")
+                self._pdf = fitz.open(path)
+                self.total = self._pdf.page_count
+            else:
+                self._image = Image.open(path)
+                self.total = getattr(self._image, 'n_frames', 1)
+        except DocumentError:
+            raise
+        except Exception as e:
+            raise DocumentError(f"无法打开文档 {os.path.basename(path)}: {str(e)}")
+
+    def __len__(self):
+        return self.total
+
+    def next_page(self):
+        """渲染/解码下一页，没有更多页时返回 None"""
+        if self._index >= self.total:
+            return None
+        index = self._index
+        self._index += 1
+        if self._pdf is not None:
+            pixmap = self._pdf[index].get_pixmap(dpi=self.dpi)
+            page = Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+            del pixmap
+            return page
+        self._image.seek(index)
+        return self._image.convert('RGB')
+
+    def close(self):
+        if self._pdf is not None:
+            self._pdf.close()
+        if self._image is not None:
+            self._image.close()
+
+
+class DocumentOCR:
+    """流式文档识别
+
+    on_page(index, total, text) 按页码顺序调用（在事件循环线程中）；
+    on_progress(done, total, pages_per_second) 在每页识别完成时调用。
+    """
+
+    def __init__(self, ocr_client, max_inflight=4, dpi=200):
+        self.ocr_client = ocr_client
+        self.max_inflight = max_inflight
+        self.dpi = dpi
+
+    async def arecognize(self, path, on_page=None, on_progress=None):
+        """识别整个文档，返回各页文本列表"""
+        engine = self.ocr_client.engine
+        source = await engine.to_thread(PageSource, path, self.dpi)
+        total = len(source)
+        texts = [None] * total
+        emitted = 0
+        completed = 0
+        start = time.perf_counter()
+        slots = asyncio.Semaphore(self.max_inflight)
+        tasks = []
+
+        async def recognize_page(index, page):
+            nonlocal emitted, completed
+            try:
+                words = await self.ocr_client.arecognize(page, release=True)
+            finally:
+                slots.release()
+            texts[index] = self.ocr_client.join_words(words)
+            completed += 1
+            metrics.incr('document.pages')
+            if on_progress:
+                on_progress(completed, total, completed / max(time.perf_counter() - start, 1e-6))
+            # 按顺序交付已连续完成的页
+            while emitted < total and texts[emitted] is not None:
+                if on_page:
+                    on_page(emitted, total, texts[emitted])
+                emitted += 1
+
+        try:
+            for index in range(total):
+                # 先占名额再渲染，保证内存中最多 max_inflight 页
+                await slots.acquire()
+                try:
+                    page = await engine.to_thread(source.next_page)
+                except Exception:
+                    slots.release()
+                    raise
+                tasks.append(asyncio.ensure_future(recognize_page(index, page)))
+                del page
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        finally:
+            await engine.to_thread(source.close)
+
+        elapsed = time.perf_counter() - start
+        metrics.observe('document.total', elapsed)
+        logger.info(f"文档识别完成: {os.path.basename(path)}, {total} 页, 耗时 {elapsed:.1f}s")
+        return texts
+
+    def recognize(self, path, on_page=None, on_progress=None):
+        return self.ocr_client.engine.run(self.arecognize(path, on_page, on_progress))
+
+    def submit(self, path, on_page=None, on_progress=None):
+        """在后台开始识别，返回可取消的 Future"""
+        return self.ocr_client.engine.submit(self.arecognize(path, on_page, on_progress))
+
+
+@register_summary
+def _document_summary(m):
+    total = m.timing('document.total')
+    if not total:
+        return []
+    pages = m.counter('document.pages')
+    seconds = total['avg'] * total['count']
+    return [f"文档识别: {total['count']} 个文档, {pages} 页, 平均 {pages / max(seconds, 1e-6):.1f} 页/秒"]
@@ -0,0 +1,288 @@
+"""监视文件夹：自动识别新放入的截图，并把结果写到旁边的 .ocr.txt / .ocr.json 文件
+
+- 轮询目录（不依赖额外的库），文件大小和修改时间连续 settle 秒不变才认为写入完成；
+- 已处理的文件记录在追加写入的 JSONL 清单中（路径、大小、修改时间、内容哈希），
+  重启后只比较大小和修改时间即可跳过，不需要重新读取内容；
+  内容相同的文件（复制、改名）直接复用已有结果；
+- 结果写到 output_dir 时保留图片相对监视目录的路径（监视多个目录时再按目录分开），
+  不同子目录中的同名图片不会互相覆盖；
+- 网络错误不记入清单，按指数退避稍后重试；其他错误记为失败，文件再次被修改后重试；
+- 识别在固定大小的线程池中进行，同时排队的文件数有上限。
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+from async_engine import NetworkError
+from diagnostics import metrics, register_summary
+from workers import WorkerPool
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.webp', '.tif', '.tiff')
+SIDECAR_SUFFIXES = ('.ocr.txt', '.ocr.json')
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """已处理文件清单（JSONL，每行一条记录，同一路径以最后一条为准）"""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}  # 路径 -> 记录
+        self.by_hash = {}  # 内容哈希 -> 成功记录
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        lines = 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                lines += 1
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # 上次退出时写了一半的行
+                self._index(entry)
+        # 重复记录过多时压缩
+        if lines > 2 * len(self.entries) + 100:
+            self._compact()
+
+    def _index(self, entry):
+        self.entries[entry['path']] = entry
+        if entry.get('status') == 'done' and entry.get('sha256'):
+            self.by_hash[entry['sha256']] = entry
+
+    def _compact(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, self.path)
+        logger.info(f"清单已压缩: {len(self.entries)} 条记录")
+
+    def is_processed(self, path, size, mtime):
+        """路径、大小和修改时间都与清单一致时视为已处理（不读取文件内容）"""
+        entry = self.entries.get(path)
+        return entry is not None and entry['size'] == size and entry['mtime'] == mtime
+
+    def record(self, entry):
+        with self._lock:
+            self._index(entry)
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+
+class FolderWatcher:
+    """轮询若干目录，把写入完成的新图片交给 process(path) 处理
+
+    process 返回要写入 .ocr.json 的字典，其中 'text' 同时写入 .ocr.txt；抛出 NetworkError 时
+    等待 retry_delay 秒（每次加倍，最长 max_retry_delay 秒）后重试，抛出其他异常时记录为失败，
+    文件再次被修改后会重试。output_dir 为空时结果写在图片旁边。
+    """
+
+    def __init__(self, directories, process, manifest_path, interval=2, settle=2, workers=2,
+                 extensions=IMAGE_EXTENSIONS, output_dir='', recursive=False, retry_delay=5, max_retry_delay=300):
+        self.directories = [os.path.abspath(d) for d in directories]
+        self.process = process
+        self.manifest = Manifest(manifest_path)
+        self.interval = interval
+        self.settle = settle
+        self.extensions = tuple(e.lower() for e in extensions)
+        self.output_dir = output_dir
+        self.recursive = recursive
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.pool = WorkerPool('watch', workers)
+        self.max_queued = workers * 2
+        self.on_processed = None  # 每处理完一个文件回调 on_processed(path, entry)
+        self._pending = {}  # 路径 -> (大小, 修改时间, 首次看到该状态的时间)
+        self._inflight = set()
+        self._retry = {}  # 路径 -> (下次重试时间, 当前间隔)，网络错误后等待重试
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name='folder-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self.pool.shutdown()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def run(self):
+        """轮询直到 stop()（也可在前台直接调用）"""
+        logger.info(f"开始监视: {', '.join(self.directories)}")
+        while not self._stop.is_set():
+            start = time.perf_counter()
+            try:
+                self.scan()
+            except Exception:
+                logger.exception("扫描目录出错")
+            metrics.observe('watch.scan', time.perf_counter() - start)
+            self._stop.wait(self.interval)
+
+    def _iter_files(self):
+        for directory in self.directories:
+            if not os.path.isdir(directory):
+                continue
+            stack = [directory]
+            while stack:
+                with os.scandir(stack.pop()) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            if self.recursive:
+                                stack.append(entry.path)
+                        elif entry.name.lower().endswith(self.extensions):
+                            yield entry
+
+    def scan(self):
+        """扫描一次，提交写入已稳定的新文件"""
+        now = time.monotonic()
+        seen = set()
+        for entry in self._iter_files():
+            path = entry.path
+            seen.add(path)
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            size, mtime = stat.st_size, stat.st_mtime
+            if self.manifest.is_processed(path, size, mtime):
+                continue
+            with self._lock:
+                if path in self._inflight or now < self._retry.get(path, (0, 0))[0]:
+                    continue
+                state = self._pending.get(path)
+                if state is None or state[:2] != (size, mtime):
+                    # 新文件或仍在写入：重新计时
+                    self._pending[path] = (size, mtime, now)
+                    continue
+                if size == 0 or now - state[2] < self.settle or len(self._inflight) >= self.max_queued:
+                    continue
+                del self._pending[path]
+                self._inflight.add(path)
+            metrics.set_gauge('watch.inflight', len(self._inflight))
+            self.pool.submit(self._handle, path, size, mtime)
+        with self._lock:
+            for path in list(self._pending):
+                if path not in seen:
+                    del self._pending[path]
+            for path in list(self._retry):
+                if path not in seen:
+                    del self._retry[path]
+
+    def _outputs(self, path):
+        base = path
+        if self.output_dir:
+            root = next((d for d in self.directories if path.startswith(d + os.sep)), os.path.dirname(path))
+            relative = os.path.relpath(path, root)
+            if len(self.directories) > 1 or root not in self.directories:
+                # 不同监视目录可能有相同的相对路径：按目录名加目录路径的哈希分开
+                digest = hashlib.sha1(root.encode('utf-8')).hexdigest()[:8]
+                relative = os.path.join(f"{os.path.basename(root) or 'root'}-{digest}", relative)
+            base = os.path.join(self.output_dir, relative)
+        return [base + suffix for suffix in SIDECAR_SUFFIXES]
+
+    def _handle(self, path, size, mtime):
+        start = time.perf_counter()
+        entry = {'path': path, 'size': size, 'mtime': mtime, 'sha256': None,
+                 'processed_at': time.time()}
+        try:
+            entry['sha256'] = file_sha256(path)
+            outputs = self._outputs(path)
+            previous = self.manifest.by_hash.get(entry['sha256'])
+            os.makedirs(os.path.dirname(outputs[0]), exist_ok=True)
+            if (previous and previous['path'] != path
+                    and all(os.path.exists(p) for p in previous['outputs'])):
+                # 内容相同的文件已经处理过：复用已有结果
+                shutil.copyfile(previous['outputs'][0], outputs[0])
+                with open(previous['outputs'][1], 'r', encoding='utf-8') as f:
+                    result = dict(json.load(f), source=os.path.basename(path))
+                with open(outputs[1], 'w', encoding='utf-8') as f:
+                    json.dump(result, f, ensure_ascii=False, indent=2)
+                metrics.incr('watch.reused')
+            else:
+                result = self.process(path)
+                result = dict(result, source=os.path.basename(path))
+                with open(outputs[0], 'w', encoding='utf-8') as f:
+                    f.write(result.get('text', ''))
+                with open(outputs[1], 'w', encoding='utf-8') as f:
+                    json.dump(result, f, ensure_ascii=False, indent=2)
+                metrics.incr('watch.processed')
+            entry.update(status='done', outputs=outputs)
+            logger.info(f"已处理: {path}")
+        except NetworkError as e:
+            # 网络问题与文件无关：不记入清单，稍后重试
+            with self._lock:
+                delay = min(self.max_retry_delay, self._retry.get(path, (0, self.retry_delay / 2))[1] * 2)
+                self._retry[path] = (time.monotonic() + delay, delay)
+            metrics.incr('watch.retries')
+            logger.warning(f"处理 {path} 时网络错误，{delay:.0f} 秒后重试: {str(e)}")
+            entry = None
+        except Exception as e:
+            entry.update(status='error', error=str(e), outputs=[])
+            metrics.incr('watch.errors')
+            logger.warning(f"处理 {path} 失败: {str(e)}")
+        finally:
+            with self._lock:
+                self._inflight.discard(path)
+                if entry is not None:
+                    self._retry.pop(path, None)
+            metrics.set_gauge('watch.inflight', len(self._inflight))
+            metrics.observe('watch.file', time.perf_counter() - start)
+        if entry is None:
+            return None
+        self.manifest.record(entry)
+        if self.on_processed:
+            self.on_processed(path, entry)
+        return entry
+
+
+def make_processor(ocr_client, gpt_client=None, summary_prompt=''):
+    """构造 process(path)：识别图片文字，配置了 GPT 时再生成摘要"""
+    from PIL import Image
+
+    def process(path):
+        with Image.open(path) as image:
+            image.load()
+            words = ocr_client.recognize(image.convert('RGB'), release=True)
+        text = ocr_client.join_words(words)
+        result = {'text': text, 'words_result': words}
+        if gpt_client is not None and text.strip():
+            result['summary'] = gpt_client.ask(f"{summary_prompt}\n\n{text}" if summary_prompt else text)
+        return result
+
+    return process
+
+
+@register_summary
+def _watch_summary(m):
+    per_file = m.timing('watch.file')
+    if not per_file:
+        return []
+    return [f"文件夹监视: 已处理 {m.counter('watch.processed')} 个, 复用 {m.counter('watch.reused')} 个, "
+            f"失败 {m.counter('watch.errors')} 个, 网络错误重试 {m.counter('watch.retries')} 次, "
+            f"平均每个 {per_file['avg']:.2f}s"]
@@ -0,0 +1,286 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from async_engine import network_errors
+from diagnostics import metrics, register_summary
+from gpt_router import Endpoint, EndpointRouter
+
+logger = logging.getLogger(__name__)
+
+
+class GPTError(Exception):
+    """GPT 接口返回错误"""
+
+
+class GPTClient:
+    """兼容 OpenAI 格式的对话接口客户端，支持流式输出
+
+    请求在 AsyncEngine 的事件循环中执行；ask() 供后台线程同步调用。
+    配置了多个接口时由 EndpointRouter 按延迟和错误率选择。
+    设置 usage（UsageStore）后每次请求的 token 用量、上传字节数和耗时都会被记录。
+    http2=True 时并发请求和流式响应共用一个 HTTP/2 连接（服务器不支持时自动回退到 HTTP/1.1）。
+    """
+
+    def __init__(self, engine, api_url='', api_key='', model='', system_prompt='', endpoints=None,
+                 hedge_after=0, http2=False):
+        self.engine = engine
+        self.usage = None
+        self.http2 = http2
+        self.router = EndpointRouter([], hedge_after=hedge_after)
+        self._extra_endpoints = list(endpoints or [])
+        register_summary(self.router.summary)
+        self.configure(api_url, api_key, model, system_prompt)
+
+    def configure(self, api_url, api_key, model, system_prompt, endpoints=None):
+        """更新主接口配置；endpoints 为额外接口的配置列表（None 表示保持不变）"""
+        self.api_url = api_url
+        self.api_key = api_key
+        self.model = model
+        self.system_prompt = system_prompt
+        if endpoints is not None:
+            self._extra_endpoints = list(endpoints)
+        defaults = {'api_url': api_url, 'api_key': api_key, 'model': model}
+        configured = [Endpoint(api_url, api_key, model, name='默认')]
+        configured += [Endpoint.from_config(item, defaults) for item in self._extra_endpoints]
+        # 保留已有接口的统计数据
+        previous = {(e.api_url, e.api_key, e.model): e for e in self.router.endpoints}
+        self.router.endpoints = [previous.get((e.api_url, e.api_key, e.model), e) for e in configured]
+
+    def build_payload(self, text, stream=False, model=None):
+        data = {
+            "model": model or self.model,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": self.system_prompt
+                },
+                {
+                    "role": "user",
+                    "content": text
+                }
+            ],
+            "temperature": 0.7
+        }
+        if stream:
+            data["stream"] = True
+            # 让流式响应在最后一个分块中附带 token 用量
+            data["stream_options"] = {"include_usage": True}
+        return data
+
+    async def aask(self, text, on_delta=None):
+        """提问并返回完整回答
+
+        传入 on_delta 时以流式方式请求，每收到一段内容就（在事件循环线程中）回调一次；
+        取消协程即可中断请求。接口错误抛出 GPTError，网络错误抛出 NetworkError。
+        流式请求不做对冲和失败切换，以免重复输出。
+        """
+        start = time.perf_counter()
+        stream = on_delta is not None
+        answer = await self.router.run(lambda endpoint: self._aask_endpoint(endpoint, text, on_delta),
+                                       hedge=not stream, failover=not stream)
+        metrics.observe('gpt.request', time.perf_counter() - start)
+        return answer
+
+    def ask(self, text):
+        return self.engine.run(self.aask(text))
+
+    async def aask_model(self, endpoint, text, on_delta=None, usage=None):
+        """不经过路由，直接向指定接口（gpt_router.Endpoint）提问（用于多模型对比）
+
+        usage 字典（若提供）会被填入本次请求的 token 用量。
+        """
+        return await self._aask_endpoint(endpoint, text, on_delta, usage)
+
+    async def _aask_endpoint(self, endpoint, text, on_delta=None, usage=None):
+        """向指定接口发送一次请求"""
+        stream = on_delta is not None
+        http = self.engine.client(verify=True, http2=self.http2)
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {endpoint.api_key}"
+        }
+        body = json.dumps(self.build_payload(text, stream, endpoint.model)).encode('utf-8')
+        start = time.perf_counter()
+        usage = {} if usage is None else usage
+        try:
+            with network_errors():
+                async with http.stream('POST', endpoint.api_url, headers=headers,
+                                       content=body, timeout=30) as response:
+                    metrics.incr(f'gpt.protocol.{response.http_version}')
+                    if response.status_code != 200:
+                        await response.aread()
+                        raise self._error_from(response)
+                    if stream and 'text/event-stream' in response.headers.get('Content-Type', ''):
+                        answer = await self._read_stream(response, on_delta, usage)
+                    else:
+                        await response.aread()
+                        answer = self._parse_answer(response, usage)
+                        if on_delta:
+                            on_delta(answer)
+        except Exception:
+            # 被取消（对冲落选、预取作废）的请求不会走到这里，不计入用量
+            self._record_usage(endpoint, text, usage, len(body), start, False)
+            raise
+        self._record_usage(endpoint, text, usage, len(body), start, True)
+        return answer
+
+    def _record_usage(self, endpoint, text, usage, bytes_sent, start, ok):
+        if self.usage is not None:
+            self.usage.record('gpt', endpoint.model, text,
+                              prompt_tokens=usage.get('prompt_tokens', 0),
+                              completion_tokens=usage.get('completion_tokens', 0),
+                              bytes_sent=bytes_sent, latency=time.perf_counter() - start, ok=ok)
+
+    @staticmethod
+    def _error_from(response):
+        """根据错误响应构造 GPTError"""
+        try:
+            error_result = response.json()
+            error_msg = error_result.get('error', {}).get('message', str(error_result))
+            return GPTError(f"API请求失败 (状态码: {response.status_code}): {error_msg}")
+        except json.JSONDecodeError:
+            return GPTError(f"API请求失败 (状态码: {response.status_code}): {response.text[:200]}...")
+
+    @staticmethod
+    def _parse_answer(response, usage=None):
+        """解析非流式响应，usage 字典（若提供）会被填入响应中的 token 用量"""
+        try:
+            result = response.json()
+        except json.JSONDecodeError as json_err:
+            raise GPTError(f"响应JSON解析错误: {str(json_err)}\n响应内容: {response.text[:200]}...")
+        if usage is not None and isinstance(result.get('usage'), dict):
+            usage.update(result['usage'])
+        if 'choices' in result and len(result['choices']) > 0:
+            answer = result['choices'][0]['message']['content']
+            if answer:
+                return answer
+            raise GPTError(f"API返回内容为空: {response.text}")
+        raise GPTError(f"API响应格式错误，缺少choices字段: {response.text}")
+
+    @staticmethod
+    async def _read_stream(response, on_delta, usage=None):
+        """读取 SSE 流式响应"""
+        chunks = []
+        async for line in response.aiter_lines():
+            if not line or not line.startswith('data:'):
+                continue
+            payload = line[5:].strip()
+            if payload == '[DONE]':
+                break
+            try:
+                chunk = json.loads(payload)
+            except json.JSONDecodeError:
+                continue
+            if usage is not None and isinstance(chunk.get('usage'), dict):
+                usage.update(chunk['usage'])
+            choices = chunk.get('choices') or []
+            delta = choices[0].get('delta', {}).get('content') if choices else None
+            if delta:
+                chunks.append(delta)
+                on_delta(delta)
+        return ''.join(chunks)
+
+
+class SpeculativeAnswer:
+    """在用户提问前预先发起的流式请求，回答先写入隐藏缓冲区
+
+    用户未修改文本直接提问时通过 attach() 取出已缓冲的内容并继续接收后续输出；
+    文本被修改时调用 cancel() 取消请求协程。
+    """
+
+    def __init__(self, client, text):
+        self.client = client
+        self.text = text
+        self.started = time.perf_counter()
+        self.finished = None
+        self.error = None
+        self.cancelled = False
+        self._future = None
+        self._chunks = []
+        self._lock = threading.Lock()
+        self._on_delta = None
+        self._on_done = None
+
+    @property
+    def done(self):
+        return self.finished is not None
+
+    @property
+    def answer(self):
+        """目前已收到的回答"""
+        with self._lock:
+            return ''.join(self._chunks)
+
+    def start(self):
+        metrics.incr('gpt.speculation.started')
+        self._future = self.client.engine.submit(self._run())
+
+    def cancel(self):
+        if not self.cancelled:
+            self.cancelled = True
+            if not self.done:
+                metrics.incr('gpt.speculation.cancelled')
+            if self._future is not None:
+                self._future.cancel()
+
+    async def _run(self):
+        try:
+            await self.client.aask(self.text, on_delta=self._receive)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.error = e
+        with self._lock:
+            self.finished = time.perf_counter()
+            on_done = self._on_done
+        if on_done and not self.cancelled:
+            on_done(self.error)
+
+    def _receive(self, delta):
+        with self._lock:
+            self._chunks.append(delta)
+            if self._on_delta:
+                self._on_delta(delta)
+
+    def attach(self, on_delta, on_done):
+        """接管预取结果：返回已缓冲的文本，之后的输出通过回调送达
+
+        返回 (已缓冲文本, 是否已完成)。
+        """
+        with self._lock:
+            self._on_delta = on_delta
+            self._on_done = on_done
+            buffered = ''.join(self._chunks)
+            done = self.done
+        # 预取节省的等待时间：提问时已经过去（或完整回答所需）的时间
+        saved = (self.finished if done else time.perf_counter()) - self.started
+        metrics.incr('gpt.speculation.hits')
+        metrics.observe('gpt.speculation.saved', saved)
+        logger.info(f"预取命中，节省约 {saved:.2f}s")
+        return buffered, done
+
+
+@register_summary
+def _speculation_summary(m):
+    started = m.counter('gpt.speculation.started')
+    if not started:
+        return []
+    hits = m.counter('gpt.speculation.hits')
+    saved = m.timing('gpt.speculation.saved')
+    lines = [f"预取命中率: {hits}/{started} ({hits / started:.0%})"]
+    if saved:
+        lines.append(f"预取节省等待: 平均 {saved['avg']:.2f}s, 累计 {saved['avg'] * saved['count']:.1f}s")
+    return lines
+
+
+@register_summary
+def _protocol_summary(m):
+    counters = m.snapshot()['counters']
+    protocols = {name[len('gpt.protocol.'):]: count for name, count in counters.items()
+                 if name.startswith('gpt.protocol.')}
+    if not protocols:
+        return []
+    return ["GPT 连接协议: " + ", ".join(f"{name} {count} 次" for name, count in sorted(protocols.items()))]
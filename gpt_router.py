@@ -0,0 +1,198 @@
+"""多个 OpenAI 兼容接口之间按延迟路由，可选对冲请求"""
+import asyncio
+import logging
+import time
+from urllib.parse import urlsplit
+
+from diagnostics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Endpoint:
+    """一个对话接口及其运行统计"""
+
+    def __init__(self, api_url, api_key, model, weight=1.0, name=None):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.model = model
+        self.weight = max(float(weight or 1.0), 0.01)
+        self.name = name or f"{urlsplit(api_url).netloc or api_url}/{model}"
+        self.ewma_latency = None
+        self.ewma_error = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.last_used = 0.0
+        self.last_failure = 0.0
+
+    @classmethod
+    def from_config(cls, item, defaults):
+        """从配置项创建，缺省字段取自主接口配置"""
+        return cls(item.get('api_url') or defaults['api_url'],
+                   item.get('api_key') or defaults['api_key'],
+                   item.get('model') or defaults['model'],
+                   item.get('weight', 1.0),
+                   item.get('name'))
+
+
+class EndpointRouter:
+    """按 EWMA 延迟和错误率选择接口
+
+    - 得分 = EWMA 延迟 / 权重，越小越优先；从未使用或 probe_interval 秒内未使用的接口优先试探一次，
+      试探过但从未成功（没有延迟数据）的接口排在有实测数据的接口之后；
+    - EWMA 错误率超过 error_threshold 且最近 cooldown 秒内失败过的接口视为不健康，排在最后；
+    - hedge_after > 0 时，首选接口超过该时间仍未返回，就向第二个接口发送同样的请求，
+      先成功的结果胜出，另一个请求被取消（取消的请求不计成功或失败，已耗时只作为延迟的下限）；
+    - 请求失败时依次尝试其余接口。
+    """
+
+    def __init__(self, endpoints, alpha=0.3, error_threshold=0.5, cooldown=60, probe_interval=300,
+                 hedge_after=0):
+        self.endpoints = endpoints
+        self.alpha = alpha
+        self.error_threshold = error_threshold
+        self.cooldown = cooldown
+        self.probe_interval = probe_interval
+        self.hedge_after = hedge_after
+        self.last_decision = ''
+
+    def healthy(self, endpoint, now=None):
+        now = time.monotonic() if now is None else now
+        return not (endpoint.ewma_error > self.error_threshold
+                    and now - endpoint.last_failure < self.cooldown)
+
+    def ranked(self):
+        """按优先级排序的接口列表"""
+        now = time.monotonic()
+
+        def score(endpoint):
+            unhealthy = not self.healthy(endpoint, now)
+            if not endpoint.requests or now - endpoint.last_used > self.probe_interval:
+                return (unhealthy, 0, 0.0)
+            if endpoint.ewma_latency is None:
+                return (unhealthy, 1, 0.0)
+            return (unhealthy, 0, endpoint.ewma_latency / endpoint.weight)
+
+        return sorted(self.endpoints, key=score)
+
+    def record(self, endpoint, latency, ok):
+        """记录一次请求结果"""
+        endpoint.requests += 1
+        endpoint.last_used = time.monotonic()
+        endpoint.ewma_error = (1 - self.alpha) * endpoint.ewma_error + self.alpha * (0.0 if ok else 1.0)
+        if ok:
+            if endpoint.ewma_latency is None:
+                endpoint.ewma_latency = latency
+            else:
+                endpoint.ewma_latency = (1 - self.alpha) * endpoint.ewma_latency + self.alpha * latency
+        else:
+            endpoint.errors += 1
+            endpoint.last_failure = endpoint.last_used
+
+    def record_cancelled(self, endpoint, elapsed):
+        """记录被取消的请求：不计成功或失败，已耗时是延迟的下限，超过 EWMA 延迟时才把它调高"""
+        endpoint.requests += 1
+        endpoint.last_used = time.monotonic()
+        if endpoint.ewma_latency is not None and elapsed > endpoint.ewma_latency:
+            endpoint.ewma_latency = (1 - self.alpha) * endpoint.ewma_latency + self.alpha * elapsed
+        metrics.incr('gpt.hedge.cancelled')
+
+    async def _attempt(self, endpoint, request):
+        start = time.perf_counter()
+        metrics.incr(f'gpt.route.{endpoint.name}')
+        try:
+            result = await request(endpoint)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.record(endpoint, time.perf_counter() - start, False)
+            raise
+        self.record(endpoint, time.perf_counter() - start, True)
+        return result
+
+    async def run(self, request, hedge=True, failover=True):
+        """执行 request(endpoint) 协程，按路由策略选择接口"""
+        ranked = self.ranked()
+        if not ranked:
+            raise ValueError("没有可用的 GPT 接口")
+        primary, backups = ranked[0], ranked[1:] if failover or hedge else []
+        self.last_decision = primary.name
+        logger.info(f"GPT 路由: {primary.name}")
+
+        if hedge and self.hedge_after > 0 and backups:
+            return await self._hedged(primary, backups, request, failover)
+
+        try:
+            return await self._attempt(primary, request)
+        except Exception as e:
+            last_error = e
+        for endpoint in backups if failover else []:
+            metrics.incr('gpt.route.failover')
+            logger.info(f"GPT 接口 {self.last_decision} 失败，切换到 {endpoint.name}")
+            self.last_decision = endpoint.name
+            try:
+                return await self._attempt(endpoint, request)
+            except Exception as e:
+                last_error = e
+        raise last_error
+
+    async def _hedged(self, primary, backups, request, failover):
+        """首选接口超过 hedge_after 秒未返回时，向下一个接口发送对冲请求
+
+        任一请求成功即返回并取消其余请求；请求失败时（允许切换的情况下）立即启动下一个接口。
+        """
+        backups = list(backups)
+        running = {}  # task -> (endpoint, 开始时间)
+
+        def launch(endpoint):
+            task = asyncio.ensure_future(self._attempt(endpoint, request))
+            running[task] = (endpoint, time.perf_counter())
+
+        launch(primary)
+        hedged = False
+        last_error = None
+        try:
+            while running:
+                timeout = None if hedged or not backups else self.hedge_after
+                done, _ = await asyncio.wait(set(running), timeout=timeout,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # 超时未返回：发起对冲
+                    hedged = True
+                    backup = backups.pop(0)
+                    metrics.incr('gpt.hedge.started')
+                    logger.info(f"GPT 请求超过 {self.hedge_after}s 未返回，对冲到 {backup.name}")
+                    launch(backup)
+                    continue
+                for task in done:
+                    endpoint, _ = running.pop(task)
+                    if task.exception() is None:
+                        if hedged and endpoint is not primary:
+                            metrics.incr('gpt.hedge.won')
+                            self.last_decision = endpoint.name
+                        return task.result()
+                    last_error = task.exception()
+                    if failover and backups:
+                        metrics.incr('gpt.route.failover')
+                        launch(backups.pop(0))
+            raise last_error
+        finally:
+            for task, (endpoint, started) in running.items():
+                task.cancel()
+                self.record_cancelled(endpoint, time.perf_counter() - started)
+
+    def summary(self, m=None):
+        """诊断信息：每个接口的延迟、错误率和请求数"""
+        if len(self.endpoints) < 2 and not any(e.requests for e in self.endpoints):
+            return []
+        lines = [f"GPT 路由（最近选择: {self.last_decision or '-'}）"]
+        for endpoint in self.ranked():
+            latency = f"{endpoint.ewma_latency:.2f}s" if endpoint.ewma_latency is not None else '-'
+            state = '' if self.healthy(endpoint) else ' [不健康]'
+            lines.append(f"  {endpoint.name}: 延迟 {latency}, 错误率 {endpoint.ewma_error:.0%}, "
+                         f"请求 {endpoint.requests} / 失败 {endpoint.errors}, 权重 {endpoint.weight}{state}")
+        hedges = metrics.counter('gpt.hedge.started')
+        if hedges:
+            lines.append(f"  对冲请求: {hedges} 次, 备用接口胜出 {metrics.counter('gpt.hedge.won')} 次, "
+                         f"取消 {metrics.counter('gpt.hedge.cancelled')} 个请求")
+        return lines
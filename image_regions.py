@@ -0,0 +1,226 @@
+"""截图区域相关的几何工具：区域规整、合并外接框、阅读顺序排序、小区域拼接、大图分块"""
+import math
+
+from PIL import Image
+
+
+def normalize_region(x1, y1, x2, y2):
+    """将两点坐标规整为 (left, top, right, bottom)"""
+    return min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)
+
+
+def union_bbox(regions):
+    """计算多个区域的外接矩形"""
+    lefts, tops, rights, bottoms = zip(*regions)
+    return min(lefts), min(tops), max(rights), max(bottoms)
+
+
+def _vertical_overlap(a, b):
+    """两个区域在垂直方向上的重叠比例（相对较矮的区域）"""
+    overlap = min(a[3], b[3]) - max(a[1], b[1])
+    shorter = min(a[3] - a[1], b[3] - b[1])
+    if shorter <= 0:
+        return 0.0
+    return max(0, overlap) / shorter
+
+
+def group_rows(regions, row_overlap=0.5):
+    """把区域按行分组，返回 [[下标, ...], ...]，行从上到下、行内从左到右
+
+    垂直方向重叠超过 row_overlap 的区域视为同一行。
+    """
+    indexed = sorted(range(len(regions)), key=lambda i: (regions[i][1], regions[i][0]))
+    rows = []
+    for i in indexed:
+        for row in rows:
+            if _vertical_overlap(regions[row[0]], regions[i]) >= row_overlap:
+                row.append(i)
+                break
+        else:
+            rows.append([i])
+    return [sorted(row, key=lambda i: regions[i][0]) for row in rows]
+
+
+def reading_order(regions, row_overlap=0.5):
+    """按阅读顺序（先行后列）返回区域下标"""
+    order = []
+    for row in group_rows(regions, row_overlap):
+        order.extend(row)
+    return order
+
+
+def merge_texts(regions, texts, separator='\n'):
+    """按阅读顺序合并各区域识别出的文本，忽略空结果"""
+    return separator.join(texts[i] for i in reading_order(regions) if texts[i])
+
+
+class PackedImage:
+    """拼接后的图片及各原始区域在其中的位置"""
+
+    def __init__(self, image, placements):
+        self.image = image
+        # [(原始下标, (left, top, right, bottom)), ...]
+        self.placements = placements
+
+    def split_words(self, words_result):
+        """按文字框中心点把 words_result 分回各原始区域
+
+        区域纵向排列，因此取垂直方向上距离中心点最近的区域。
+        返回 {原始下标: [word, ...]}，坐标换算回原始区域。
+        """
+        split = {index: [] for index, _ in self.placements}
+        for word in words_result:
+            location = word.get('location')
+            if not location:
+                continue
+            cy = location['top'] + location['height'] / 2
+            index, (left, top, _, _) = min(
+                self.placements,
+                key=lambda p: max(p[1][1] - cy, cy - p[1][3], 0)
+            )
+            local = dict(word)
+            local['location'] = dict(location, left=location['left'] - left,
+                                     top=location['top'] - top)
+            split[index].append(local)
+        return split
+
+
+class RegionPacker:
+    """把多个小截图纵向拼接成少量大图，以减少 OCR 请求次数
+
+    每个区域独占一行，行与行之间用空白带分隔，避免相邻区域的文字被识别成同一行。
+    """
+
+    def __init__(self, max_width=2048, max_height=4096, gap=32, padding=8, background='white'):
+        self.max_width = max_width
+        self.max_height = max_height
+        self.gap = gap
+        self.padding = padding
+        self.background = background
+
+    def can_pack(self, image):
+        """区域是否足够小，适合拼接"""
+        return self.fits(*image.size)
+
+    def fits(self, width, height):
+        return (width + 2 * self.padding <= self.max_width
+                and height + 2 * self.padding <= self.max_height // 2)
+
+    def pack(self, images, indices=None):
+        """拼接图片，返回 PackedImage 列表（超过最大高度时拆成多张）"""
+        if indices is None:
+            indices = list(range(len(images)))
+        batches = []
+        current, height = [], self.padding
+        for index in indices:
+            row_height = images[index].size[1] + self.gap
+            if current and height + row_height > self.max_height:
+                batches.append(current)
+                current, height = [], self.padding
+            current.append(index)
+            height += row_height
+
+        packed = []
+        for batch in batches + ([current] if current else []):
+            width = max(images[i].size[0] for i in batch) + 2 * self.padding
+            height = sum(images[i].size[1] for i in batch) + self.gap * (len(batch) - 1) + 2 * self.padding
+            composite = Image.new('RGB', (width, height), self.background)
+            placements = []
+            top = self.padding
+            for index in batch:
+                w, h = images[index].size
+                composite.paste(images[index].convert('RGB'), (self.padding, top))
+                placements.append((index, (self.padding, top, self.padding + w, top + h)))
+                top += h + self.gap
+            packed.append(PackedImage(composite, placements))
+        return packed
+
+
+def _join_overlapping(left_text, right_text, max_overlap=64):
+    """拼接被分块边界切开的同一行文字，去掉重叠带中重复识别的部分"""
+    for k in range(min(len(left_text), len(right_text), max_overlap), 1, -1):
+        if left_text.endswith(right_text[:k]):
+            return left_text + right_text[k:]
+    return left_text + ' ' + right_text
+
+
+class ImageTiler:
+    """把超出 OCR 接口尺寸限制的大图切成相互重叠的分块
+
+    每个分块有一个“核心区”，各分块的核心区恰好铺满整张图；
+    文字框中心落在哪个核心区就归哪个分块，从而去掉重叠带中的重复文字。
+    """
+
+    def __init__(self, max_side=4096, max_pixels=4000000, overlap=96):
+        self.max_side = max_side
+        self.max_pixels = max_pixels
+        self.overlap = overlap
+
+    def needs_tiling(self, image):
+        width, height = image.size
+        return max(width, height) > self.max_side or width * height > self.max_pixels
+
+    @staticmethod
+    def _spans(length, tile, overlap):
+        """一维方向上的分块区间 [(start, end), ...]"""
+        if length <= tile:
+            return [(0, length)]
+        count = math.ceil((length - overlap) / (tile - overlap))
+        step = (length - overlap) / count
+        spans = []
+        for i in range(count):
+            start = int(round(i * step))
+            end = length if i == count - 1 else int(round(i * step + step + overlap))
+            spans.append((start, end))
+        return spans
+
+    def tile_boxes(self, width, height):
+        """计算分块，返回 [(分块框, 核心区框), ...]"""
+        tile_w = min(width, self.max_side)
+        tile_h = min(height, self.max_side, max(self.overlap * 2, self.max_pixels // tile_w))
+        half = self.overlap / 2
+        tiles = []
+        for top, bottom in self._spans(height, tile_h, self.overlap):
+            for left, right in self._spans(width, tile_w, self.overlap):
+                core = (left + half if left > 0 else left,
+                        top + half if top > 0 else top,
+                        right - half if right < width else right,
+                        bottom - half if bottom < height else bottom)
+                tiles.append(((left, top, right, bottom), core))
+        return tiles
+
+    @staticmethod
+    def merge_words(tile_results):
+        """合并各分块的 words_result（需带 location），按行输出
+
+        tile_results: [(分块框, 核心区框, words_result), ...]
+        返回按阅读顺序排列的行列表，格式与 words_result 相同（坐标为整图坐标）。
+        """
+        boxes, texts = [], []
+        for (left, top, _, _), (cl, ct, cr, cb), words in tile_results:
+            for word in words:
+                location = word.get('location')
+                if not location:
+                    continue
+                x1, y1 = location['left'] + left, location['top'] + top
+                x2, y2 = x1 + location['width'], y1 + location['height']
+                cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+                if cl <= cx < cr and ct <= cy < cb:
+                    boxes.append((x1, y1, x2, y2))
+                    texts.append(word['words'])
+
+        lines = []
+        for row in group_rows(boxes):
+            text = texts[row[0]]
+            right = boxes[row[0]][2]
+            for i in row[1:]:
+                # 只有在水平方向确实重叠（来自重叠带）时才去重拼接
+                if boxes[i][0] < right:
+                    text = _join_overlapping(text, texts[i])
+                else:
+                    text = text + ' ' + texts[i]
+                right = max(right, boxes[i][2])
+            x1, y1, x2, y2 = union_bbox([boxes[i] for i in row])
+            lines.append({'words': text,
+                          'location': {'left': x1, 'top': y1, 'width': x2 - x1, 'height': y2 - y1}})
+        return lines
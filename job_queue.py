@@ -0,0 +1,262 @@
+"""离线任务队列：网络不可用时保存截图识别和提问请求，恢复后按顺序自动重试
+
+每个任务一个文件 <序号>.job：第一行是 JSON 头（类型、参数、各数据块长度），
+后面紧接原始数据块（截图 PNG 等），不做 base64 等膨胀编码。
+写入先落到 .tmp 文件并 fsync，再用 os.replace 原子替换，程序崩溃时不会留下写了一半的任务；
+启动时按序号加载，残留的 .tmp 和损坏的文件被丢弃。
+
+后台线程按序号逐个执行任务：网络错误时队首任务按指数退避重试，后面的任务保持等待，
+因此结果总按提交顺序交付；其他错误视为永久失败，交付错误后继续下一个。
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+from async_engine import NetworkError
+from diagnostics import metrics, register_summary
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFull(Exception):
+    """队列已达到任务数或容量上限"""
+
+
+class Job:
+    """队列中的任务（数据块按需从磁盘读取）"""
+
+    def __init__(self, seq, kind, params, sizes, created, path):
+        self.seq = seq
+        self.kind = kind
+        self.params = params
+        self.sizes = sizes
+        self.created = created
+        self.path = path
+        self.attempts = 0
+        self.next_attempt = 0.0  # time.monotonic() 时刻
+        self.last_error = ''
+
+    @property
+    def size(self):
+        return sum(self.sizes)
+
+    def read_blobs(self):
+        with open(self.path, 'rb') as f:
+            f.readline()
+            return [f.read(size) for size in self.sizes]
+
+
+class JobQueue:
+    """持久化的先进先出任务队列
+
+    handlers 为 {类型: fn(params, blobs)}，返回任务结果；抛出 NetworkError 时稍后重试。
+    on_done(job, result, error) 在任务完成或永久失败时（在队列线程中）调用。
+    """
+
+    def __init__(self, directory, handlers, on_done=None, max_jobs=100, max_bytes=50 * 1024 * 1024,
+                 base_delay=2, max_delay=300):
+        self.directory = directory
+        self.handlers = handlers
+        self.on_done = on_done
+        self.max_jobs = max_jobs
+        self.max_bytes = max_bytes
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._jobs = []
+        self._next_seq = 1
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._load()
+
+    def _load(self):
+        if not os.path.isdir(self.directory):
+            return
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if name.endswith('.tmp'):
+                os.remove(path)  # 上次写入未完成
+                continue
+            if not name.endswith('.job'):
+                continue
+            try:
+                with open(path, 'rb') as f:
+                    line = f.readline()
+                    header = json.loads(line)
+                    data_size = os.fstat(f.fileno()).st_size - len(line)
+                if not line.endswith(b'\n') or data_size != sum(header['sizes']):
+                    raise ValueError("数据长度不符")
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"丢弃损坏的离线任务 {name}: {str(e)}")
+                os.remove(path)
+                continue
+            self._jobs.append(Job(header['seq'], header['kind'], header['params'], header['sizes'],
+                                  header['created'], path))
+            self._next_seq = max(self._next_seq, header['seq'] + 1)
+        self._jobs.sort(key=lambda job: job.seq)
+        if self._jobs:
+            logger.info(f"加载了 {len(self._jobs)} 个未完成的离线任务")
+        self._update_gauges()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._jobs)
+
+    def pending(self):
+        """未完成任务的副本列表（按执行顺序）"""
+        with self._lock:
+            return list(self._jobs)
+
+    @property
+    def total_bytes(self):
+        with self._lock:
+            return sum(job.size for job in self._jobs)
+
+    def enqueue(self, kind, params, blobs=()):
+        """持久化一个任务并返回 Job；超出上限时抛出 JobQueueFull"""
+        if kind not in self.handlers:
+            raise ValueError(f"未知的任务类型: {kind}")
+        blobs = [bytes(blob) for blob in blobs]
+        sizes = [len(blob) for blob in blobs]
+        with self._lock:
+            if len(self._jobs) >= self.max_jobs:
+                raise JobQueueFull(f"离线队列已满（{self.max_jobs} 个任务）")
+            if sum(job.size for job in self._jobs) + sum(sizes) > self.max_bytes:
+                raise JobQueueFull(f"离线队列已满（{self.max_bytes // (1024 * 1024)}MB）")
+            seq = self._next_seq
+            self._next_seq += 1
+        header = {'seq': seq, 'kind': kind, 'params': params, 'sizes': sizes, 'created': time.time()}
+        path = os.path.join(self.directory, f'{seq:010d}.job')
+        self._write(path, header, blobs)
+        job = Job(seq, kind, params, sizes, header['created'], path)
+        with self._lock:
+            # 并发提交时按序号插入，保证执行顺序与提交顺序一致
+            index = len(self._jobs)
+            while index and self._jobs[index - 1].seq > seq:
+                index -= 1
+            self._jobs.insert(index, job)
+        metrics.incr('jobs.enqueued')
+        self._update_gauges()
+        self._wake.set()
+        return job
+
+    def _write(self, path, header, blobs):
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(json.dumps(header, ensure_ascii=False).encode('utf-8') + b'\n')
+            for blob in blobs:
+                f.write(blob)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def remove(self, seq):
+        """删除一个未执行的任务"""
+        with self._lock:
+            job = next((job for job in self._jobs if job.seq == seq), None)
+            if job is None:
+                return False
+            self._jobs.remove(job)
+        self._delete_file(job)
+        self._update_gauges()
+        return True
+
+    def retry_now(self):
+        """立即重试队首任务（例如用户确认网络已恢复）"""
+        with self._lock:
+            for job in self._jobs:
+                job.next_attempt = 0.0
+        self._wake.set()
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='job-queue', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._lock:
+                job = self._jobs[0] if self._jobs else None
+            if job is None:
+                self._wait(None)
+                continue
+            delay = job.next_attempt - time.monotonic()
+            if delay > 0:
+                self._wait(delay)
+                continue
+            self._execute(job)
+
+    def _wait(self, timeout):
+        self._wake.wait(timeout)
+        self._wake.clear()
+
+    def _execute(self, job):
+        job.attempts += 1
+        try:
+            result = self.handlers[job.kind](job.params, job.read_blobs())
+        except NetworkError as e:
+            # 网络仍不可用：队首任务退避后重试，后面的任务继续等待以保证顺序
+            job.last_error = str(e)
+            delay = min(self.max_delay, self.base_delay * 2 ** (job.attempts - 1)) * random.uniform(0.8, 1.2)
+            job.next_attempt = time.monotonic() + delay
+            metrics.incr('jobs.retries')
+            logger.info(f"离线任务 {job.seq} 第 {job.attempts} 次执行失败，{delay:.0f}s 后重试: {str(e)}")
+            return
+        except Exception as e:
+            self._finish(job, None, e)
+            metrics.incr('jobs.failed')
+            logger.warning(f"离线任务 {job.seq} 失败: {str(e)}")
+            return
+        self._finish(job, result, None)
+        metrics.incr('jobs.done')
+        logger.info(f"离线任务 {job.seq} 完成（第 {job.attempts} 次执行）")
+
+    def _finish(self, job, result, error):
+        with self._lock:
+            if job in self._jobs:
+                self._jobs.remove(job)
+        self._delete_file(job)
+        self._update_gauges()
+        metrics.observe('jobs.wait', time.time() - job.created)
+        if self.on_done:
+            try:
+                self.on_done(job, result, error)
+            except Exception:
+                logger.exception("交付离线任务结果出错")
+
+    def _delete_file(self, job):
+        try:
+            os.remove(job.path)
+        except OSError:
+            pass
+
+    def _update_gauges(self):
+        with self._lock:
+            count = len(self._jobs)
+            size = sum(job.size for job in self._jobs)
+        metrics.set_gauge('jobs.pending', count)
+        metrics.set_gauge('jobs.bytes', size)
+
+
+@register_summary
+def _job_queue_summary(m):
+    enqueued = m.counter('jobs.enqueued')
+    pending = m.snapshot()['gauges'].get('jobs.pending', (0, 0))[0]
+    if not enqueued and not pending:
+        return []
+    wait = m.timing('jobs.wait')
+    line = (f"离线队列: 入队 {enqueued} 个, 完成 {m.counter('jobs.done')} 个, 失败 {m.counter('jobs.failed')} 个, "
+            f"重试 {m.counter('jobs.retries')} 次, 待处理 {pending} 个")
+    if wait:
+        line += f", 平均等待 {wait['avg']:.0f}s"
+    return [line]
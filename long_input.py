@@ -0,0 +1,199 @@
+"""长文本问答：超过模型上下文的文本分段并发处理，再合并各段回答
+
+- 按段落、句子边界切分为不超过 chunk_tokens 的片段（token 数按字符粗略估算，不依赖分词器）；
+- 各片段使用相同的系统提示词并发请求（map），同时进行的请求不超过 concurrency；
+- reduce 策略：
+  'merge'  把各段回答交给模型合并为一个回答（流式输出）；各段回答合计仍然过长时分组逐级合并；
+  'concat' 不再请求模型，按原文顺序拼接各段回答，前面的片段完成后即可流式输出（适合翻译）。
+"""
+import asyncio
+import logging
+import re
+import time
+
+from diagnostics import metrics, register_summary
+
+logger = logging.getLogger(__name__)
+
+REDUCE_STRATEGIES = ('merge', 'concat')
+
+_CJK = re.compile(r'[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]')
+# 句末标点（中文标点后直接断开，英文标点后需跟空白）
+_SENTENCE_END = re.compile(r'(?<=[。！？；…])|(?<=[.!?;])(?=\s)')
+
+
+def estimate_tokens(text):
+    """粗略估算 token 数：中日韩字符约 1 字 1 token，其他字符约 4 个 1 token"""
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _split_sentences(paragraph):
+    return [s for s in _SENTENCE_END.split(paragraph) if s.strip()]
+
+
+def _hard_split(sentence, max_tokens):
+    """没有标点的超长句子按估算长度硬切"""
+    pieces = []
+    start, size = 0, 0.0
+    for i, ch in enumerate(sentence):
+        weight = 1.0 if _CJK.match(ch) else 0.25
+        if size + weight > max_tokens and i > start:
+            pieces.append(sentence[start:i])
+            start, size = i, 0.0
+        size += weight
+    pieces.append(sentence[start:])
+    return pieces
+
+
+def split_text(text, max_tokens):
+    """在段落和句子边界把文本切成不超过 max_tokens 的片段（尽量装满，保留原有换行）"""
+    units = []  # (文本, token 数)，段落之间用换行连接
+    for paragraph in text.split('\n'):
+        if not paragraph.strip():
+            continue
+        if estimate_tokens(paragraph) <= max_tokens:
+            units.append((paragraph + '\n', estimate_tokens(paragraph) + 1))
+            continue
+        for sentence in _split_sentences(paragraph):
+            for piece in (_hard_split(sentence, max_tokens) if estimate_tokens(sentence) > max_tokens
+                          else [sentence]):
+                units.append((piece, estimate_tokens(piece)))
+        units[-1] = (units[-1][0] + '\n', units[-1][1] + 1)
+
+    chunks = []
+    current, size = [], 0
+    for unit, tokens in units:
+        if current and size + tokens > max_tokens:
+            chunks.append(''.join(current).strip())
+            current, size = [], 0
+        current.append(unit)
+        size += tokens
+    if current:
+        chunks.append(''.join(current).strip())
+    return [chunk for chunk in chunks if chunk]
+
+
+def _fill(template, index, total):
+    return template.replace('{index}', str(index)).replace('{total}', str(total))
+
+
+class LongInputAnswerer:
+    """对长文本做 map-reduce 问答
+
+    gpt_client 为 GPTClient；map_prompt / reduce_prompt 可包含 {index}、{total} 占位符，
+    map_prompt 为空时直接发送片段原文。
+    """
+
+    def __init__(self, gpt_client, chunk_tokens=3000, concurrency=4, reduce='merge',
+                 map_prompt='', reduce_prompt=''):
+        self.gpt_client = gpt_client
+        self.configure(chunk_tokens, concurrency, reduce, map_prompt, reduce_prompt)
+
+    def configure(self, chunk_tokens=3000, concurrency=4, reduce='merge', map_prompt='', reduce_prompt=''):
+        self.chunk_tokens = max(200, int(chunk_tokens))
+        self.concurrency = max(1, int(concurrency))
+        self.reduce = reduce if reduce in REDUCE_STRATEGIES else 'merge'
+        self.map_prompt = map_prompt
+        self.reduce_prompt = reduce_prompt or '下面是一段长文本各部分的回答，请把它们合并为一个完整连贯的回答，去掉重复内容：'
+
+    async def aanswer(self, text, on_delta=None, on_progress=None):
+        """返回最终回答；on_delta 接收流式输出，on_progress(done, total) 在每段完成时调用"""
+        start = time.perf_counter()
+        chunks = split_text(text, self.chunk_tokens)
+        total = len(chunks)
+        metrics.incr('longinput.requests')
+        metrics.incr('longinput.chunks', total)
+        logger.info(f"长文本约 {estimate_tokens(text)} token，分为 {total} 段，并发 {self.concurrency}")
+
+        answers = [None] * total
+        emitted = 0
+        completed = 0
+        slots = asyncio.Semaphore(self.concurrency)
+        stream_parts = self.reduce == 'concat' and on_delta is not None
+
+        async def map_chunk(index, chunk):
+            nonlocal emitted, completed
+            prompt = _fill(self.map_prompt, index + 1, total)
+            async with slots:
+                with metrics.timer('longinput.map'):
+                    answers[index] = await self.gpt_client.aask(f"{prompt}\n\n{chunk}" if prompt else chunk)
+            completed += 1
+            if on_progress:
+                on_progress(completed, total)
+            # concat 策略按顺序输出已连续完成的片段
+            while stream_parts and emitted < total and answers[emitted] is not None:
+                on_delta(('\n\n' if emitted else '') + answers[emitted])
+                emitted += 1
+
+        tasks = [asyncio.ensure_future(map_chunk(i, chunk)) for i, chunk in enumerate(chunks)]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        if self.reduce == 'concat' or total == 1:
+            answer = '\n\n'.join(answers)
+            if on_delta is not None and not stream_parts:
+                on_delta(answer)
+        else:
+            with metrics.timer('longinput.reduce'):
+                answer = await self._amerge(answers, on_delta)
+        metrics.observe('longinput.total', time.perf_counter() - start)
+        return answer
+
+    async def _amerge(self, answers, on_delta):
+        """逐级合并：每组合计不超过 chunk_tokens，最后一次合并流式输出"""
+        level = 0
+        while True:
+            groups = self._group(answers)
+            if len(groups) == 1:
+                return await self.gpt_client.aask(self._reduce_text(groups[0]), on_delta=on_delta)
+            level += 1
+            logger.info(f"各段回答过长，第 {level} 轮合并为 {len(groups)} 组")
+            slots = asyncio.Semaphore(self.concurrency)
+
+            async def merge_group(group):
+                async with slots:
+                    return await self.gpt_client.aask(self._reduce_text(group))
+
+            answers = await asyncio.gather(*(merge_group(group) for group in groups))
+
+    def _group(self, answers):
+        groups, current, size = [], [], 0
+        for answer in answers:
+            tokens = estimate_tokens(answer)
+            if current and size + tokens > self.chunk_tokens:
+                groups.append(current)
+                current, size = [], 0
+            current.append(answer)
+            size += tokens
+        groups.append(current)
+        # 单个回答本身超长时也至少两两合并，保证逐级减少
+        if len(groups) == len(answers) > 1:
+            groups = [answers[i:i + 2] for i in range(0, len(answers), 2)]
+        return groups
+
+    def _reduce_text(self, answers):
+        total = len(answers)
+        parts = '\n\n'.join(f"【第 {i + 1} 部分】\n{answer}" for i, answer in enumerate(answers))
+        return f"{_fill(self.reduce_prompt, total, total)}\n\n{parts}"
+
+    def answer(self, text, on_delta=None, on_progress=None):
+        """供后台线程同步调用"""
+        return self.gpt_client.engine.run(self.aanswer(text, on_delta, on_progress))
+
+
+@register_summary
+def _long_input_summary(m):
+    total = m.timing('longinput.total')
+    if not total:
+        return []
+    map_timing = m.timing('longinput.map')
+    line = (f"长文本问答: {total['count']} 次, 共 {m.counter('longinput.chunks')} 段, "
+            f"平均耗时 {total['avg']:.1f}s")
+    if map_timing:
+        line += f"（每段平均 {map_timing['avg']:.1f}s）"
+    return [line]
@@ -0,0 +1,130 @@
+"""多模型对比：同一问题同时发给多个模型，分别流式输出
+
+每个模型记录首字延迟（TTFT）、总耗时和 token 用量，累计数据计入诊断信息；
+token 用量同时由 GPTClient 按模型名称写入用量统计。
+"""
+import asyncio
+import logging
+import time
+
+from diagnostics import metrics, register_summary
+from gpt_router import Endpoint
+
+logger = logging.getLogger(__name__)
+
+
+def build_endpoints(items, defaults):
+    """把 gpt.compare_models 配置项转为 Endpoint 列表
+
+    每项为模型名称（使用主接口地址和密钥）或 {name, api_url, api_key, model}（缺省字段取自主接口）。
+    """
+    endpoints = []
+    for item in items:
+        if not isinstance(item, dict):
+            item = {'model': str(item), 'name': str(item)}
+        endpoints.append(Endpoint.from_config(item, defaults))
+    return endpoints
+
+
+def item_label(item, defaults):
+    """配置项在界面上显示的名称，与对应 Endpoint 的名称一致（未命名的接口为 "域名/模型"）"""
+    return build_endpoints([item], defaults)[0].name
+
+
+class ModelResult:
+    """一个模型的回答和耗时"""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.name = endpoint.name
+        self.answer = ''
+        self.error = None
+        self.ttft = None
+        self.latency = None
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    @property
+    def ok(self):
+        return self.error is None and self.latency is not None
+
+    def describe(self):
+        """一行统计信息"""
+        if self.error is not None:
+            return f"失败: {str(self.error)[:80]}"
+        if self.latency is None:
+            return f"首字 {self.ttft:.2f}s，生成中..." if self.ttft is not None else "等待响应..."
+        line = f"首字 {self.ttft or self.latency:.2f}s · 总计 {self.latency:.2f}s"
+        if self.prompt_tokens or self.completion_tokens:
+            line += f" · {self.prompt_tokens}+{self.completion_tokens} tokens"
+        return line
+
+
+class ModelComparison:
+    """把同一问题并发发给多个接口（不经过路由、不做对冲）"""
+
+    def __init__(self, gpt_client, endpoints):
+        self.gpt_client = gpt_client
+        self.endpoints = list(endpoints)
+        self.results = [ModelResult(endpoint) for endpoint in self.endpoints]
+
+    async def acompare(self, text, on_delta=None, on_done=None):
+        """返回各模型的 ModelResult 列表（即 self.results，执行过程中可随时读取进度）
+
+        on_delta(序号, 片段) 接收流式输出，on_done(序号, ModelResult) 在每个模型结束时调用，
+        均在事件循环线程中回调；取消协程会中断所有请求。
+        """
+        results = self.results
+        metrics.incr('compare.runs')
+
+        async def run(index):
+            result = results[index]
+            start = time.perf_counter()
+            usage = {}
+
+            def receive(delta):
+                if result.ttft is None:
+                    result.ttft = time.perf_counter() - start
+                if on_delta:
+                    on_delta(index, delta)
+
+            try:
+                result.answer = await self.gpt_client.aask_model(result.endpoint, text, receive, usage)
+            except Exception as e:
+                result.error = e
+                metrics.incr(f'compare.errors.{result.name}')
+                logger.info(f"模型 {result.name} 对比请求失败: {str(e)}")
+            else:
+                result.latency = time.perf_counter() - start
+                result.prompt_tokens = usage.get('prompt_tokens', 0)
+                result.completion_tokens = usage.get('completion_tokens', 0)
+                metrics.observe(f'compare.ttft.{result.name}', result.ttft or result.latency)
+                metrics.observe(f'compare.latency.{result.name}', result.latency)
+                metrics.incr(f'compare.tokens.{result.name}', result.prompt_tokens + result.completion_tokens)
+            if on_done:
+                on_done(index, result)
+
+        await asyncio.gather(*(run(index) for index in range(len(results))))
+        return results
+
+
+@register_summary
+def _compare_summary(m):
+    if not m.counter('compare.runs'):
+        return []
+    lines = [f"多模型对比: {m.counter('compare.runs')} 次"]
+    snapshot = m.snapshot()
+    names = sorted({key[len('compare.latency.'):] for key in snapshot['timings'] if key.startswith('compare.latency.')}
+                   | {key[len('compare.errors.'):] for key in snapshot['counters'] if key.startswith('compare.errors.')})
+    for name in names:
+        latency = snapshot['timings'].get(f'compare.latency.{name}')
+        ttft = snapshot['timings'].get(f'compare.ttft.{name}')
+        errors = m.counter(f'compare.errors.{name}')
+        parts = []
+        if latency:
+            parts.append(f"首字平均 {ttft['avg']:.2f}s, 总耗时平均 {latency['avg']:.2f}s, "
+                         f"平均 {m.counter(f'compare.tokens.{name}') // latency['count']} tokens")
+        if errors:
+            parts.append(f"失败 {errors} 次")
+        lines.append(f"  {name}: " + ", ".join(parts))
+    return lines
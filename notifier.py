@@ -0,0 +1,105 @@
+"""非阻塞通知：主窗口底部的单一状态栏，合并重复消息并限制刷新频率"""
+import time
+import tkinter as tk
+from collections import OrderedDict
+
+LEVEL_COLORS = {
+    'info': ('#e8f4e8', '#1d5e1d'),
+    'warning': ('#fff4d6', '#7a5600'),
+    'error': ('#fde2e1', '#9b1c1c'),
+}
+
+
+class Notifier:
+    """状态栏通知
+
+    - 不创建新窗口、不抢占焦点，也不会进入嵌套事件循环；
+    - 相同内容的消息在 coalesce_window 秒内合并显示为 "3 × 消息"；
+    - 状态栏最多每 min_interval 秒刷新一次，突发的大量消息只会触发一次刷新；
+    - 只保留最近 max_entries 条不同的消息。
+    须在 Tk 主线程中调用。
+    """
+
+    def __init__(self, coalesce_window=10, min_interval=0.2, display_time=6, max_entries=20):
+        self.coalesce_window = coalesce_window
+        self.min_interval = min_interval
+        self.display_time = display_time
+        self.max_entries = max_entries
+        self.label = None
+        self._entries = OrderedDict()  # message -> [count, level, last_time]
+        self._pending = []  # 状态栏创建前收到的消息
+        self._refresh_id = None
+        self._hide_id = None
+        self._last_refresh = 0.0
+
+    def attach(self, parent):
+        """在 parent 底部创建状态栏，并显示此前积压的消息"""
+        self.label = tk.Label(parent, text="", anchor="w", font=('Arial', 9),
+                              padx=10, pady=3, cursor='hand2')
+        self.label.bind('<Button-1>', lambda event: self.clear())
+        pending, self._pending = self._pending, []
+        for message, level in pending:
+            self.notify(message, level)
+        return self.label
+
+    def notify(self, message, level='warning'):
+        """显示一条消息"""
+        message = str(message)
+        if self.label is None:
+            self._pending.append((message, level))
+            return
+
+        now = time.monotonic()
+        entry = self._entries.pop(message, None)
+        if entry and now - entry[2] <= self.coalesce_window:
+            entry[0] += 1
+            entry[1] = level
+            entry[2] = now
+        else:
+            entry = [1, level, now]
+        self._entries[message] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+        self._schedule_refresh(now)
+
+    def _schedule_refresh(self, now):
+        if self._refresh_id is not None:
+            return
+        delay = max(0.0, self.min_interval - (now - self._last_refresh))
+        self._refresh_id = self.label.after(int(delay * 1000), self._refresh)
+
+    def _refresh(self):
+        self._refresh_id = None
+        self._last_refresh = time.monotonic()
+        if not self._entries or not self.label.winfo_exists():
+            return
+        message, (count, level, _) = next(reversed(self._entries.items()))
+        text = f"{count} × {message}" if count > 1 else message
+        others = len(self._entries) - 1
+        if others:
+            text += f"    （另有 {others} 条消息）"
+        background, foreground = LEVEL_COLORS.get(level, LEVEL_COLORS['warning'])
+        self.label.configure(text=text.replace('\n', ' '), bg=background, fg=foreground)
+        slaves = self.label.master.pack_slaves()
+        if self.label not in slaves:
+            # 排在最前，保证窗口缩小时状态栏仍有空间显示
+            options = {'before': slaves[0]} if slaves else {}
+            self.label.pack(side="bottom", fill="x", **options)
+
+        if self._hide_id is not None:
+            self.label.after_cancel(self._hide_id)
+        delay = self.display_time * (2 if level == 'error' else 1)
+        self._hide_id = self.label.after(int(delay * 1000), self.clear)
+
+    def clear(self):
+        """隐藏状态栏并清空消息"""
+        self._entries.clear()
+        self._hide_id = None
+        if self.label is not None and self.label.winfo_exists():
+            self.label.pack_forget()
+
+    @property
+    def history(self):
+        """最近的消息 [(消息, 次数, 级别), ...]"""
+        return [(message, entry[0], entry[1]) for message, entry in self._entries.items()]
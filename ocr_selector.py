@@ -0,0 +1,186 @@
+"""百度 OCR 接口自适应选择：按区域大小、延迟预算、近期延迟和配额情况为每次识别挑选接口
+
+- 每个接口维护按图片大小归一化的 EWMA 延迟（没有数据时用经验值），
+  预估延迟 = 归一化延迟 × (0.5 + 百万像素数)，因此小区域的预估远低于整屏截图；
+- 在预估延迟不超过 latency_budget 的接口中选精度最高的，精度相同时选更快的；
+  都超出预算时选最快的。其余可用接口按预估延迟排在后面，作为失败时的备选；
+- 错误码 17 / 19（每日 / 总量配额用尽）的接口停用到北京时间次日零点，
+  18（QPS 超限）暂停几秒，6（应用未开通该接口）本次运行内不再使用；
+- 拼接 / 分块识别需要文字位置，配置的接口都不返回位置时使用 general（通用含位置）接口，
+  不会把这类请求发给不返回位置的接口。
+"""
+import datetime
+import logging
+import time
+
+from diagnostics import metrics
+
+logger = logging.getLogger(__name__)
+
+OCR_API_BASE = "https://aip.baidubce.com/rest/2.0/ocr/v1/"
+
+DAILY_LIMIT_ERROR_CODES = (17, 19)
+QPS_LIMIT_ERROR_CODE = 18
+NO_PERMISSION_ERROR_CODE = 6
+
+
+class OCREndpoint:
+    """一个百度 OCR 接口及其运行统计"""
+
+    def __init__(self, name, label, quality, prior_latency, location=False):
+        self.name = name
+        self.label = label
+        self.url = OCR_API_BASE + name
+        self.quality = quality
+        self.location = location  # 是否返回文字位置
+        self.prior_latency = prior_latency  # 1 百万像素图片的经验延迟（秒）
+        self.ewma_latency = None  # 归一化到 size_factor == 1 的延迟
+        self.requests = 0
+        self.errors = 0
+        self.unavailable_until = 0.0  # time.time()
+        self.unavailable_reason = ''
+
+    def available(self, now=None):
+        return (time.time() if now is None else now) >= self.unavailable_until
+
+
+# 可选接口（经验延迟仅作为没有实测数据时的初值）
+ENDPOINT_CATALOG = {
+    'general_basic': ('通用（标准版）', 1, 0.5, False),
+    'general': ('通用（含位置）', 1, 0.6, True),
+    'accurate_basic': ('高精度（标准版）', 2, 1.0, False),
+    'accurate': ('高精度（含位置）', 2, 1.3, True),
+}
+
+
+def size_factor(pixels):
+    return 0.5 + pixels / 1e6
+
+
+def _next_beijing_midnight():
+    """百度配额按北京时间每日重置"""
+    beijing = datetime.timezone(datetime.timedelta(hours=8))
+    now = datetime.datetime.now(beijing)
+    return (now + datetime.timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+
+
+class OCRSelector:
+    """按预估延迟和精度为每次识别排列候选接口
+
+    mode 为 'auto' 时自适应选择，为接口名称时固定使用该接口（不可用时仍会回退到其他接口）。
+    """
+
+    def __init__(self, names=tuple(ENDPOINT_CATALOG), mode='auto', latency_budget=1.5, alpha=0.3,
+                 throttle_seconds=5):
+        self.alpha = alpha
+        self.throttle_seconds = throttle_seconds
+        self.endpoints = []
+        self.location_fallback = None  # 配置中没有返回位置的接口时使用的 general 接口
+        self.last_decision = ''
+        self.configure(names, mode, latency_budget)
+
+    @classmethod
+    def from_config(cls, config):
+        """从 baidu_ocr 配置节创建"""
+        selector = cls()
+        selector.configure_from(config)
+        return selector
+
+    def configure_from(self, config):
+        self.configure(config.get('endpoints') or tuple(ENDPOINT_CATALOG), config.get('endpoint_mode', 'auto'),
+                       config.get('latency_budget', 1.5))
+
+    def configure(self, names=tuple(ENDPOINT_CATALOG), mode='auto', latency_budget=1.5):
+        """更新可用接口列表和策略（保留已有接口的统计数据）"""
+        previous = {e.name: e for e in self.endpoints}
+        self.endpoints = [previous.get(name) or OCREndpoint(name, *ENDPOINT_CATALOG[name])
+                          for name in names if name in ENDPOINT_CATALOG]
+        if not self.endpoints:
+            self.endpoints = [OCREndpoint('general_basic', *ENDPOINT_CATALOG['general_basic'])]
+        self.mode = mode
+        self.latency_budget = float(latency_budget)
+
+    def estimate(self, endpoint, pixels):
+        """预估识别 pixels 像素图片的延迟（秒）"""
+        normalized = endpoint.ewma_latency
+        if normalized is None:
+            normalized = endpoint.prior_latency / size_factor(1e6)
+        return normalized * size_factor(pixels)
+
+    def candidates(self, width, height, location=False):
+        """按优先级排列的候选接口；location 为 True 时只包含返回文字位置的接口"""
+        pixels = width * height
+        now = time.time()
+        pool = [e for e in self.endpoints if e.location] if location else list(self.endpoints)
+        if not pool:
+            pool = [self._location_endpoint()]
+        usable = [e for e in pool if e.available(now)]
+        if not usable:
+            # 全部不可用时仍按原顺序尝试（配额可能已提前恢复）
+            usable = pool
+        by_latency = sorted(usable, key=lambda e: self.estimate(e, pixels))
+        fixed = [e for e in usable if e.name == self.mode]
+        if fixed:
+            first = fixed[0]
+        else:
+            within = [e for e in by_latency if self.estimate(e, pixels) <= self.latency_budget]
+            first = max(within, key=lambda e: e.quality) if within else by_latency[0]
+        ordered = [first] + [e for e in by_latency if e is not first]
+        self.last_decision = (f"{first.name}（{width}x{height}, 预估 {self.estimate(first, pixels):.2f}s）")
+        return ordered
+
+    def _location_endpoint(self):
+        """返回文字位置的备用接口（保留统计数据，应用未开通时按错误码 6 停用并报错）"""
+        if self.location_fallback is None:
+            self.location_fallback = OCREndpoint('general', *ENDPOINT_CATALOG['general'])
+            logger.info("配置的 OCR 接口都不返回文字位置，拼接 / 分块识别使用 general 接口")
+        return self.location_fallback
+
+    def record(self, endpoint, latency, pixels, ok, error_code=None):
+        """记录一次请求结果；配额类错误会让接口暂时停用"""
+        endpoint.requests += 1
+        metrics.incr(f'ocr.endpoint.{endpoint.name}')
+        if ok:
+            normalized = latency / size_factor(pixels)
+            if endpoint.ewma_latency is None:
+                endpoint.ewma_latency = normalized
+            else:
+                endpoint.ewma_latency = (1 - self.alpha) * endpoint.ewma_latency + self.alpha * normalized
+            metrics.observe(f'ocr.endpoint.{endpoint.name}', latency)
+            return
+        endpoint.errors += 1
+        if error_code in DAILY_LIMIT_ERROR_CODES:
+            self._disable(endpoint, _next_beijing_midnight(), f"配额已用完（错误码 {error_code}）")
+        elif error_code == QPS_LIMIT_ERROR_CODE:
+            self._disable(endpoint, time.time() + self.throttle_seconds, "QPS 超限")
+        elif error_code == NO_PERMISSION_ERROR_CODE:
+            self._disable(endpoint, float('inf'), "应用未开通该接口")
+
+    def _disable(self, endpoint, until, reason):
+        endpoint.unavailable_until = until
+        endpoint.unavailable_reason = reason
+        logger.warning(f"OCR 接口 {endpoint.name} 暂停使用: {reason}")
+
+    @staticmethod
+    def should_fallback(error_code):
+        """该错误是否应换用其他接口重试（图片本身的问题换接口也无济于事）"""
+        return error_code in DAILY_LIMIT_ERROR_CODES + (QPS_LIMIT_ERROR_CODE, NO_PERMISSION_ERROR_CODE)
+
+    def summary(self, m=None):
+        """诊断信息：每个接口的实测延迟、请求数和状态"""
+        endpoints = self.endpoints + ([self.location_fallback] if self.location_fallback else [])
+        if not any(e.requests for e in endpoints):
+            return []
+        lines = [f"OCR 接口（策略: {self.mode}, 延迟预算 {self.latency_budget:.1f}s, "
+                 f"最近选择: {self.last_decision or '-'}）"]
+        now = time.time()
+        for endpoint in endpoints:
+            latency = (f"{endpoint.ewma_latency * size_factor(1e6):.2f}s/百万像素"
+                       if endpoint.ewma_latency is not None else '-')
+            state = '' if endpoint.available(now) else f" [{endpoint.unavailable_reason}]"
+            lines.append(f"  {endpoint.name} {endpoint.label}: 延迟 {latency}, "
+                         f"请求 {endpoint.requests} / 失败 {endpoint.errors}{state}")
+        fallbacks = metrics.counter('ocr.fallback')
+        if fallbacks:
+            lines.append(f"  回退到备选接口: {fallbacks} 次")
+        return lines
@@ -0,0 +1,247 @@
+"""按需性能分析：接下来 N 次截图 / 提问时在热点路径上运行 cProfile 和 tracemalloc
+
+arm() 把目标方法替换为同名的实例属性（包装函数），次数用完或 disarm() 后删除这些实例属性，
+调用重新落到类上的原方法——未开启时调用路径上没有任何额外开销。
+每次被包装的调用：
+- 在调用线程中运行 cProfile（同一线程内嵌套的目标调用并入外层）；给出 AsyncEngine 时
+  同时在事件循环线程中运行一个 cProfile，覆盖网络请求和响应解析；
+- 前后各取一次 tracemalloc 快照，比较得出新增内存最多的代码行（tracemalloc 统计所有线程）。
+结果写到 directory/<时间戳>/：每次调用一个 .prof（可用 pstats / snakeviz 打开），汇总写入 report.txt。
+只依赖标准库，打包版本中同样可用。
+"""
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+from diagnostics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class HotPathProfiler:
+    """为接下来若干次调用开启分析
+
+    on_finish(目录) 在一轮分析结束（次数用完或手动停止）时调用，可能在任意线程中。
+    """
+
+    def __init__(self, directory, engine=None, on_finish=None, top=30, frames=10):
+        self.directory = directory
+        self.engine = engine
+        self.on_finish = on_finish
+        self.top = top
+        self.frames = frames
+        self.session_dir = None
+        self._patched = []  # [(对象, 方法名), ...]
+        self._finishers = set()
+        self._remaining = 0
+        self._inflight = 0
+        self._seq = 0
+        self._loop_busy = False
+        self._started_tracemalloc = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def armed(self):
+        return bool(self._patched)
+
+    @property
+    def remaining(self):
+        return self._remaining
+
+    def arm(self, runs, targets, finishers=()):
+        """为 targets（[(对象, 方法名), ...]）开启分析，返回输出目录
+
+        finishers 中的方法每完成一次计为一轮（为空时每个目标方法的调用都计数），共 runs 轮。
+        """
+        if self.armed:
+            self.disarm()
+        self.session_dir = os.path.join(self.directory, time.strftime('%Y%m%d-%H%M%S'))
+        os.makedirs(self.session_dir, exist_ok=True)
+        with open(os.path.join(self.session_dir, 'report.txt'), 'w', encoding='utf-8') as f:
+            f.write(f"热点路径分析  {time.strftime('%Y-%m-%d %H:%M:%S')}\n"
+                    f"Python {sys.version.split()[0]}, {'打包版本' if getattr(sys, 'frozen', False) else '源码运行'}, "
+                    f"{sys.platform}\n"
+                    f"目标: {', '.join(name for _, name in targets)}，共 {runs} 轮\n")
+        self._seq = 0
+        self._remaining = max(1, int(runs))
+        self._finishers = set(finishers) or {name for _, name in targets}
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started_tracemalloc = True
+        with self._lock:
+            for obj, name in targets:
+                setattr(obj, name, self._wrap(getattr(obj, name), name))
+                self._patched.append((obj, name))
+        metrics.incr('profiling.sessions')
+        logger.info(f"已开启性能分析（{runs} 轮），结果写入 {self.session_dir}")
+        return self.session_dir
+
+    def disarm(self):
+        """停止分析并恢复原方法（正在执行的调用仍会写出结果）"""
+        with self._lock:
+            patched, self._patched = self._patched, []
+            self._remaining = 0
+        if not patched:
+            return
+        for obj, name in patched:
+            vars(obj).pop(name, None)
+        self._release_tracemalloc()
+        logger.info(f"性能分析结束，共记录 {self._seq} 次调用: {self.session_dir}")
+        if self.on_finish:
+            self.on_finish(self.session_dir)
+
+    def _wrap(self, original, name):
+        @functools.wraps(original)
+        def wrapper(*args, **kwargs):
+            if getattr(self._local, 'active', False):
+                return original(*args, **kwargs)
+            with self._lock:
+                seq = None
+                if self._remaining > 0:
+                    self._inflight += 1
+                    self._seq += 1
+                    seq = self._seq
+            if seq is None:
+                return original(*args, **kwargs)
+            self._local.active = True
+            try:
+                return self._profile_call(seq, name, original, args, kwargs)
+            finally:
+                self._local.active = False
+                with self._lock:
+                    self._inflight -= 1
+                    if name in self._finishers:
+                        self._remaining -= 1
+                    done = self._remaining <= 0 and not self._inflight
+                if done:
+                    self.disarm()
+                elif not self.armed:
+                    self._release_tracemalloc()
+        return wrapper
+
+    def _release_tracemalloc(self):
+        """没有正在分析的调用时关闭本对象开启的 tracemalloc"""
+        with self._lock:
+            if not self._started_tracemalloc or self._inflight:
+                return
+            self._started_tracemalloc = False
+        tracemalloc.stop()
+
+    def _profile_call(self, seq, name, original, args, kwargs):
+        before = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+        loop_profile = self._start_loop_profile()
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ 同一时刻只能有一个 cProfile（其他线程正在分析）
+            profile = None
+        error = None
+        start = time.perf_counter()
+        try:
+            return original(*args, **kwargs)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            if profile is not None:
+                profile.disable()
+            self._stop_loop_profile(loop_profile)
+            after = tracemalloc.take_snapshot() if before is not None and tracemalloc.is_tracing() else None
+            metrics.observe(f'profiling.{name}', elapsed)
+            try:
+                self._write(seq, name, elapsed, error, profile, loop_profile, before, after)
+            except Exception:
+                logger.exception("写入性能分析结果失败")
+
+    def _start_loop_profile(self):
+        """在事件循环线程中开启 cProfile（同一时刻只开一个）"""
+        engine = self.engine
+        if engine is None or engine.loop is None or not engine.loop.is_running():
+            return None
+        if threading.current_thread().ident == getattr(engine.loop, '_thread_id', None):
+            return None
+        with self._lock:
+            if self._loop_busy:
+                return None
+            self._loop_busy = True
+        profile = cProfile.Profile()
+        ready = threading.Event()
+
+        def enable():
+            try:
+                profile.enable()
+            except ValueError:
+                profile.failed = True
+            ready.set()
+
+        profile.failed = False
+        engine.loop.call_soon_threadsafe(enable)
+        ready.wait(1)
+        return profile
+
+    def _stop_loop_profile(self, profile):
+        if profile is None:
+            return
+        stopped = threading.Event()
+
+        def disable():
+            if not profile.failed:
+                profile.disable()
+            stopped.set()
+
+        self.engine.loop.call_soon_threadsafe(disable)
+        stopped.wait(1)
+        with self._lock:
+            self._loop_busy = False
+
+    def _write(self, seq, name, elapsed, error, profile, loop_profile, before, after):
+        prefix = os.path.join(self.session_dir, f'{seq:02d}_{name}')
+        lines = ["", "=" * 100,
+                 f"#{seq} {name}  {elapsed * 1000:.1f}ms  线程 {threading.current_thread().name}"
+                 + (f"  出错: {type(error).__name__}: {error}" if error is not None else "")]
+        if profile is not None:
+            profile.dump_stats(prefix + '.prof')
+            lines += ["", f"cProfile 调用线程（按累计耗时前 {self.top} 项，完整数据见 {os.path.basename(prefix)}.prof）",
+                      self._format_stats(profile)]
+        else:
+            lines += ["", "cProfile 调用线程: 未运行（已有其他分析器）"]
+        if loop_profile is not None and not loop_profile.failed and loop_profile.getstats():
+            loop_profile.dump_stats(prefix + '_loop.prof')
+            lines += ["", f"cProfile 事件循环线程（前 {self.top} 项，完整数据见 {os.path.basename(prefix)}_loop.prof）",
+                      self._format_stats(loop_profile)]
+        if after is not None:
+            filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+            diff = after.filter_traces(filters).compare_to(before.filter_traces(filters), 'lineno')
+            growth = sum(stat.size_diff for stat in diff)
+            lines += ["", f"tracemalloc 新增内存最多的代码行（前 {self.top} 项，合计 {growth / 1024:+.1f}KB）"]
+            lines += [str(stat) for stat in diff[:self.top] if stat.size_diff]
+        with open(os.path.join(self.session_dir, 'report.txt'), 'a', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+
+    def _format_stats(self, profile):
+        stream = io.StringIO()
+        pstats.Stats(profile, stream=stream).sort_stats('cumulative').print_stats(self.top)
+        return stream.getvalue()
+
+    def summary(self, m=None):
+        """诊断信息：分析状态和各目标的耗时"""
+        if not self.armed and not metrics.counter('profiling.sessions'):
+            return []
+        state = (f"进行中，剩余 {self._remaining} 轮" if self.armed else "未开启")
+        lines = [f"性能分析: {state}，输出目录 {self.session_dir}"]
+        timings = metrics.snapshot()['timings']
+        for key in sorted(timings):
+            if key.startswith('profiling.'):
+                timing = timings[key]
+                lines.append(f"  {key[len('profiling.'):]}: {timing['count']} 次, 平均 {timing['avg'] * 1000:.0f}ms")
+        return lines
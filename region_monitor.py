@@ -0,0 +1,151 @@
+"""区域监视：定时截取固定区域，只有画面变化时才重新识别
+
+每帧缩小为灰度缩略图（最长边 thumb_size 像素）后与上一次识别时的缩略图比较，
+差异超过 diff_threshold 的像素比例达到 change_ratio 才认为内容变化；
+画面仍在变化（与上一帧不同）时等它稳定下来再识别，避免识别到字幕淡入淡出的中间帧；
+持续变化超过 max_settle 秒（滚动的日志、播放中的视频）时不再等待，照常识别。
+识别失败时不更新比较基准，下一帧仍视为有变化，会重新识别；连续失败时检查间隔按 2 的幂增长
+（不超过 max_backoff 秒），只在连续失败的第一次调用 on_error；should_stop(error) 为真时停止监视。
+比较由 PIL 的 C 实现完成，每帧只需零点几毫秒。
+"""
+import logging
+import threading
+import time
+
+from PIL import ImageChops
+
+from diagnostics import metrics, register_summary
+
+logger = logging.getLogger(__name__)
+
+
+def thumbnail(image, size=64):
+    """灰度缩略图（保持宽高比）"""
+    gray = image.convert('L')
+    gray.thumbnail((size, size))
+    return gray
+
+
+def changed_fraction(a, b, diff_threshold=24):
+    """两张同尺寸灰度缩略图中差异超过 diff_threshold 的像素比例"""
+    if a.size != b.size:
+        return 1.0
+    histogram = ImageChops.difference(a, b).histogram()
+    return sum(histogram[diff_threshold:]) / (a.size[0] * a.size[1])
+
+
+def new_lines(previous, current):
+    """current 中不在 previous 里的行（字幕整体替换时即整段新文字，日志追加时即新增的行）"""
+    seen = set(previous.splitlines())
+    return '\n'.join(line for line in current.splitlines() if line.strip() and line not in seen)
+
+
+class RegionMonitor:
+    """后台线程定时检查区域内容
+
+    grab() 返回当前区域截图；recognize(image) 返回识别文本；
+    内容变化并识别出新文字时调用 on_change(text, new_text)（在监视线程中）。
+    """
+
+    def __init__(self, grab, recognize, on_change, interval=1.0, change_ratio=0.005, diff_threshold=24,
+                 thumb_size=64, max_settle=3.0, max_backoff=60.0):
+        self.grab = grab
+        self.recognize = recognize
+        self.on_change = on_change
+        self.interval = interval
+        self.change_ratio = change_ratio
+        self.diff_threshold = diff_threshold
+        self.thumb_size = thumb_size
+        self.max_settle = max_settle
+        self.max_backoff = max_backoff
+        self.on_error = None
+        self.should_stop = None  # should_stop(error) 为真时不再重试（如配额用尽、密钥无效）
+        self.failures = 0  # 连续失败次数
+        self.text = ''
+        self.frames = 0
+        self.skipped = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='region-monitor', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive() and not self._stop.is_set()
+
+    @property
+    def skip_ratio(self):
+        return self.skipped / self.frames if self.frames else 0.0
+
+    def _run(self):
+        last_recognized = None  # 上一次识别时的缩略图
+        previous = None  # 上一帧缩略图
+        settle_since = None  # 开始等待画面稳定的时间
+        while not self._stop.is_set():
+            started = time.perf_counter()
+            try:
+                image = self.grab()
+                thumb = thumbnail(image, self.thumb_size)
+                self.frames += 1
+                metrics.incr('monitor.frames')
+                changed = (last_recognized is None
+                           or changed_fraction(thumb, last_recognized, self.diff_threshold) >= self.change_ratio)
+                settling = (previous is not None
+                            and changed_fraction(thumb, previous, self.diff_threshold) >= self.change_ratio)
+                previous = thumb
+                waiting = changed and settling and last_recognized is not None
+                if waiting and settle_since is None:
+                    settle_since = time.monotonic()
+                if waiting and time.monotonic() - settle_since >= self.max_settle:
+                    waiting = False
+                    metrics.incr('monitor.unsettled')
+                if not changed or waiting:
+                    if not changed:
+                        settle_since = None
+                    self.skipped += 1
+                    metrics.incr('monitor.skipped')
+                    image.close()
+                else:
+                    settle_since = None
+                    metrics.incr('monitor.ocr')
+                    text = self.recognize(image)
+                    last_recognized = thumb
+                    added = new_lines(self.text, text)
+                    if text != self.text:
+                        self.text = text
+                        if added:
+                            self.on_change(text, added)
+                self.failures = 0
+            except Exception as e:
+                self.failures += 1
+                metrics.incr('monitor.errors')
+                logger.warning(f"区域监视出错（连续 {self.failures} 次）: {str(e)}")
+                if self.should_stop and self.should_stop(e):
+                    self.stop()
+                if self.on_error and (self.failures == 1 or self._stop.is_set()):
+                    self.on_error(e)
+            metrics.observe('monitor.frame', time.perf_counter() - started)
+            interval = self.interval
+            if self.failures:
+                interval = min(self.interval * 2 ** min(self.failures, 16), max(self.max_backoff, self.interval))
+            self._stop.wait(max(0.0, interval - (time.perf_counter() - started)))
+
+
+@register_summary
+def _monitor_summary(m):
+    frames = m.counter('monitor.frames')
+    if not frames:
+        return []
+    skipped = m.counter('monitor.skipped')
+    line = f"区域监视: {frames} 帧, 跳过 {skipped} 帧（{skipped / frames:.0%}）, 识别 {m.counter('monitor.ocr')} 次"
+    if m.counter('monitor.unsettled'):
+        line += f"（其中画面持续变化、未等稳定 {m.counter('monitor.unsettled')} 次）"
+    if m.counter('monitor.errors'):
+        line += f", 出错 {m.counter('monitor.errors')} 次"
+    return [line]
@@ -0,0 +1,153 @@
+"""近似重复文本检测：SimHash 指纹 + 分段索引
+
+同一段屏幕文字多次识别时，结果常常只差一个字符或空白，精确匹配的缓存无法命中。
+这里对规范化后的文本取字符 3-gram 计算 64 位 SimHash，两段文本指纹的汉明距离
+越小越相似（相似度 = 1 - 距离 / 64）。
+规范化只统一全半角和空白，保留标点和运算符；数字和符号（x > 0 与 x < 0、x * 2 与 x ** 2）
+还必须完全相同才算命中——对数学和代码问题，差一个符号就是另一个问题。
+记录可以带 scope（例如模型和系统提示词），只在相同 scope 的记录中查找。
+
+索引把指纹切成 max_distance + 1 段（最多 MAX_BANDS 段），每段建一个哈希表：
+距离不超过段数 - 1 的两个指纹至少有一段完全相同（抽屉原理），因此查询只需比较
+与某一段相同的少量候选。每段至少 16 位，几万条记录时每个桶只有零星几条，
+查询仍在亚毫秒级；阈值放宽到需要更多段时，超出部分按概率召回。
+"""
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from diagnostics import metrics, register_summary
+
+BITS = 64
+MASK = (1 << BITS) - 1
+MAX_BANDS = 4
+
+
+def normalize(text):
+    """规范化：全半角统一，连续空白合并为一个空格（保留大小写、标点和运算符）"""
+    return ' '.join(unicodedata.normalize('NFKC', text).split())
+
+
+def symbols(normalized):
+    """文本中的数字和符号序列（不含文字和空白），命中时必须完全相同"""
+    return ''.join(ch for ch in normalized if not ch.isalpha() and not ch.isspace())
+
+
+def simhash(normalized, ngram=3):
+    """规范化文本的 64 位 SimHash（使用进程内的 hash()，指纹只在本次运行中有效）"""
+    if len(normalized) <= ngram:
+        grams = [normalized]
+    else:
+        grams = [normalized[i:i + ngram] for i in range(len(normalized) - ngram + 1)]
+    # 把所有特征的哈希写成等长二进制串，按列切片计数，避免逐位的 Python 循环
+    bits = ''.join(format(hash(gram) & MASK, '064b') for gram in grams)
+    half = len(grams) / 2
+    fingerprint = 0
+    for position in range(BITS):
+        if bits[position::BITS].count('1') > half:
+            fingerprint |= 1 << (BITS - 1 - position)
+    return fingerprint
+
+
+class SimHashIndex:
+    """最近问题的近似重复索引（线程安全，超过 max_entries 时淘汰最久未命中的记录）"""
+
+    def __init__(self, threshold=0.95, max_entries=20000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (fingerprint, normalized, answer, 时间, scope)
+        self._next_key = 0
+        self.set_threshold(threshold)
+
+    def set_threshold(self, threshold):
+        """设置相似度阈值（0~1），并按新的分段数重建索引"""
+        with self._lock:
+            self.threshold = min(max(float(threshold), 0.5), 1.0)
+            self.max_distance = int(round((1 - self.threshold) * BITS))
+            count = min(self.max_distance + 1, MAX_BANDS)
+            self._bands = [(BITS * i // count, BITS * (i + 1) // count) for i in range(count)]
+            self._tables = [{} for _ in self._bands]
+            for key, (fingerprint, *_) in self._entries.items():
+                self._add_to_tables(key, fingerprint)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _band_keys(self, fingerprint):
+        return [(fingerprint >> start) & ((1 << (end - start)) - 1) for start, end in self._bands]
+
+    def _add_to_tables(self, key, fingerprint):
+        for table, band in zip(self._tables, self._band_keys(fingerprint)):
+            table.setdefault(band, []).append(key)
+
+    def _remove_from_tables(self, key, fingerprint):
+        for table, band in zip(self._tables, self._band_keys(fingerprint)):
+            bucket = table.get(band)
+            if bucket:
+                bucket.remove(key)
+                if not bucket:
+                    del table[band]
+
+    def add(self, text, answer, scope=None):
+        """记录一个问题及其回答（与同一 scope 中已有记录完全相同时覆盖）"""
+        normalized = normalize(text)
+        if not normalized:
+            return
+        fingerprint = simhash(normalized)
+        with self._lock:
+            for key in self._candidates(fingerprint):
+                if self._entries[key][1] == normalized and self._entries[key][4] == scope:
+                    self._remove_from_tables(key, fingerprint)
+                    del self._entries[key]
+            key = self._next_key
+            self._next_key += 1
+            self._entries[key] = (fingerprint, normalized, answer, time.time(), scope)
+            self._add_to_tables(key, fingerprint)
+            while len(self._entries) > self.max_entries:
+                old_key, (old_fingerprint, *_) = self._entries.popitem(last=False)
+                self._remove_from_tables(old_key, old_fingerprint)
+            metrics.set_gauge('dedupe.entries', len(self._entries))
+
+    def _candidates(self, fingerprint):
+        keys = set()
+        for table, band in zip(self._tables, self._band_keys(fingerprint)):
+            keys.update(table.get(band, ()))
+        return keys
+
+    def lookup(self, text, scope=None):
+        """在同一 scope 的记录中查找最相似的已有问题，返回 (回答, 相似度, 记录时间)，
+        没有达到阈值且数字和符号完全相同的记录时返回 None"""
+        start = time.perf_counter()
+        normalized = normalize(text)
+        if not normalized:
+            return None
+        fingerprint = simhash(normalized)
+        marks = symbols(normalized)
+        best = None
+        with self._lock:
+            for key in self._candidates(fingerprint):
+                entry = self._entries[key]
+                if entry[4] != scope or symbols(entry[1]) != marks:
+                    continue
+                distance = 0 if entry[1] == normalized else bin(entry[0] ^ fingerprint).count('1')
+                if distance <= self.max_distance and (best is None or distance < best[0]):
+                    best = (distance, key)
+            if best is not None:
+                self._entries.move_to_end(best[1])
+                _, _, answer, recorded, _ = self._entries[best[1]]
+        metrics.observe('dedupe.lookup', time.perf_counter() - start)
+        if best is None:
+            return None
+        metrics.incr('dedupe.hits')
+        return answer, 1 - best[0] / BITS, recorded
+
+
+@register_summary
+def _dedupe_summary(m):
+    lookup = m.timing('dedupe.lookup')
+    if not lookup:
+        return []
+    hits = m.counter('dedupe.hits')
+    return [f"相似问题复用: {hits}/{lookup['count']} 次命中, 查询平均 {lookup['avg'] * 1e6:.0f}µs"
+            f"（最大 {lookup['max'] * 1e6:.0f}µs）, 复用后仍提问 {m.counter('dedupe.ask_anyway')} 次"]
@@ -0,0 +1,165 @@
+"""启动耗时分析
+
+主程序最先导入本模块，此后各启动阶段调用 startup.mark(阶段名) 记录完成时刻，
+主窗口首次绘制后调用 startup.finish()。
+以 --profile-startup 参数启动（或设置环境变量 OCR_GPT_PROFILE_STARTUP=1）时，
+整个启动过程同时在 cProfile 下运行，并在 config.json 同目录写出
+startup_profile.txt（阶段时间线 + 热点函数）和 startup_profile.prof。
+只依赖标准库（进程创建时间优先用 psutil 获取，没有安装时用系统接口），以免本身拖慢启动。
+"""
+import logging
+import os
+import sys
+import time
+
+from diagnostics import register_summary
+
+PROFILE_FLAG = '--profile-startup'
+
+# 模块导入时刻：同时记录墙上时间和单调时钟，用于换算进程创建时间
+_IMPORTED_WALL = time.time()
+_IMPORTED = time.perf_counter()
+
+
+def _process_create_time(pid):
+    """返回进程创建时刻（time.time() 时基），无法获取时返回 None"""
+    if sys.platform.startswith('linux'):
+        # 直接按开机以来的时钟换算，比 psutil（基于整秒的 btime）更精确
+        try:
+            with open(f'/proc/{pid}/stat') as f:
+                start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+            since_start = time.clock_gettime(time.CLOCK_BOOTTIME) - start_ticks / os.sysconf('SC_CLK_TCK')
+            return time.time() - since_start
+        except Exception:
+            return None
+    try:
+        import psutil
+        return psutil.Process(pid).create_time()
+    except ImportError:
+        pass
+    except Exception:
+        return None
+    if not sys.platform.startswith('win'):
+        return None
+    try:
+        import ctypes
+        from ctypes import wintypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return None
+        try:
+            times = [wintypes.FILETIME() for _ in range(4)]
+            if not kernel32.GetProcessTimes(handle, *[ctypes.byref(t) for t in times]):
+                return None
+            created = (times[0].dwHighDateTime << 32) | times[0].dwLowDateTime
+            # FILETIME 以 1601-01-01 为起点，单位 100ns
+            return created / 1e7 - 11644473600
+        finally:
+            kernel32.CloseHandle(handle)
+    except Exception:
+        return None
+
+
+class StartupProfiler:
+    """启动阶段时间线"""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.marks = []  # [(刚完成的阶段, 完成时刻), ...]
+        self.finished = None
+        self.report_path = None
+        self._profile = None
+        self._created = None
+        if enabled:
+            import cProfile
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def _to_perf(self, wall):
+        return _IMPORTED - (_IMPORTED_WALL - wall)
+
+    def mark(self, phase):
+        """记录某个阶段完成"""
+        if self.finished is None:
+            self.marks.append((phase, time.perf_counter()))
+
+    def timeline(self):
+        """[(阶段名, 开始偏移, 耗时), ...]，偏移从进程创建算起（无法获取时从本模块导入算起）"""
+        if self._created is None:
+            # 进程创建之前的阶段：onefile 打包时父进程（引导程序）解压后才启动当前进程
+            self._created = []
+            created = _process_create_time(os.getpid())
+            if created is not None:
+                if getattr(sys, 'frozen', False) and hasattr(sys, '_MEIPASS'):
+                    parent_created = _process_create_time(os.getppid())
+                    if parent_created is not None and parent_created <= created:
+                        self._created.append(('', self._to_perf(parent_created)))
+                        self._created.append(('bootloader_unpack', self._to_perf(created)))
+                if not self._created:
+                    self._created.append(('', self._to_perf(created)))
+                self._created.append(('interpreter_start', _IMPORTED))
+            else:
+                self._created.append(('', _IMPORTED))
+        events = self._created + self.marks
+        origin = events[0][1]
+        return [(phase, start - origin, end - start)
+                for (_, start), (phase, end) in zip(events, events[1:])]
+
+    def finish(self, directory):
+        """主窗口首次绘制后调用：停止分析，开启分析模式时写出报告并返回报告路径"""
+        if self.finished is not None:
+            return self.report_path
+        self.mark('first_frame')
+        self.finished = time.perf_counter()
+        if self._profile is not None:
+            self._profile.disable()
+        if not self.enabled:
+            return None
+        try:
+            self.report_path = self._write_report(directory)
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"写入启动分析报告失败: {str(e)}")
+        return self.report_path
+
+    def _write_report(self, directory):
+        import io
+        import pstats
+        timeline = self.timeline()
+        total = timeline[-1][1] + timeline[-1][2] if timeline else 0.0
+        lines = [f"启动耗时分析  {time.strftime('%Y-%m-%d %H:%M:%S')}",
+                 f"Python {sys.version.split()[0]}, {'打包版本' if getattr(sys, 'frozen', False) else '源码运行'}, "
+                 f"{sys.platform}",
+                 f"进程创建到首帧绘制: {total * 1000:.0f}ms",
+                 "",
+                 f"{'阶段':<24}{'开始(ms)':>10}{'耗时(ms)':>10}"]
+        for phase, offset, duration in timeline:
+            lines.append(f"{phase:<26}{offset * 1000:>12.1f}{duration * 1000:>12.1f}")
+
+        prof_path = os.path.join(directory, 'startup_profile.prof')
+        if self._profile is not None:
+            self._profile.dump_stats(prof_path)
+            stream = io.StringIO()
+            stats = pstats.Stats(self._profile, stream=stream)
+            stats.sort_stats('cumulative').print_stats(40)
+            lines += ["", f"cProfile（按累计耗时前 40 项，完整数据见 {os.path.basename(prof_path)}）",
+                      stream.getvalue()]
+
+        report_path = os.path.join(directory, 'startup_profile.txt')
+        with open(report_path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines))
+        return report_path
+
+
+startup = StartupProfiler(PROFILE_FLAG in sys.argv[1:] or os.environ.get('OCR_GPT_PROFILE_STARTUP') == '1')
+
+
+@register_summary
+def _startup_summary(m):
+    if startup.finished is None:
+        return []
+    timeline = startup.timeline()
+    total = timeline[-1][1] + timeline[-1][2] if timeline else 0.0
+    slowest = sorted(timeline, key=lambda item: item[2], reverse=True)[:3]
+    return [f"启动耗时: {total * 1000:.0f}ms（最慢: "
+            + ", ".join(f"{phase} {duration * 1000:.0f}ms" for phase, _, duration in slowest) + "）"]
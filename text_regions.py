@@ -0,0 +1,266 @@
+"""本地文字区域检测：上传 OCR 前把截图裁剪到文字所在的区域
+
+框选的区域常常大部分是空白或图片，整张上传既增加上传字节也增加接口处理时间。
+检测只用 PIL 的内置操作（逐像素运算都在 C 中完成，不依赖 numpy）：
+- 灰度图缩小到 max_side 的两倍以内，FIND_EDGES 求边缘后按查找表二值化，再缩小一半——
+  深色文字、浅色文字都会产生密集边缘，纯色背景和平滑渐变不会；先求边缘再缩小，
+  高分屏上几个像素宽的行间空白不会被缩放抹掉；
+- 用 BOX 缩放得到行 / 列投影（每行 / 每列的边缘像素比例），递归 XY 切分：
+  先按空白行切成横条，再按较宽的空白列切开，直到不能再切，得到文字行；
+- 切分到底后仍高于行高上限（max_line_height 和截图高度的 line_height_ratio 中较大者）的块
+  中间没有空白行：可能是图片、图表，也可能是大标题或行距为零的段落。
+  文字块的灰度集中在背景色和文字色两处，图片的灰度分散，据此区分：
+  像图片的块连同与它紧贴的碎块（图片边缘被切下的部分）一起丢弃；
+  像文字的块，以及有局部像文字（文字紧贴在图片旁，被切进同一块）的块不敢丢弃，上传原图；
+  图片占截图一半以上时（多半是有意框选图片中的文字）也不裁剪；
+  其余相邻的文字行合并为文字块。
+plan() 比较整图、文字块外接框、拼接文字块三种上传方式的像素数，选最小的一种。
+"""
+import logging
+import math
+import time
+
+from PIL import Image, ImageDraw, ImageFilter
+
+from diagnostics import metrics, register_summary
+from image_regions import union_bbox
+
+logger = logging.getLogger(__name__)
+
+
+def _area(box):
+    return (box[2] - box[0]) * (box[3] - box[1])
+
+
+def _runs(profile, max_gap):
+    """投影中非零的连续区间 [(start, end), ...]，间隔不超过 max_gap 的区间合并"""
+    runs = []
+    start = last = None
+    for i, value in enumerate(profile):
+        if not value:
+            continue
+        if start is None:
+            start = i
+        elif i - last - 1 > max_gap:
+            runs.append((start, last + 1))
+            start = i
+        last = i
+    if start is not None:
+        runs.append((start, last + 1))
+    return runs
+
+
+class TextRegionDetector:
+    """检测截图中的文字块（坐标为原图像素）
+
+    参数均以原图像素为单位：row_gap 以内的空白行不切开（同一行文字的上下结构），
+    col_gap 以上的空白列才切开（分栏、文字与图片之间），pad 为文字块四周保留的边距。
+    高块的判断：灰度最集中的两档（各 8 级）占块内像素的比例达到 text_peak_share 且边缘比例
+    不低于 min_text_density，或边缘比例达到 text_density（小字号、行距很小）时视为文字；
+    否则再按方格检查，任一方格的比例达到 tile_peak_share 且边缘比例达到 tile_density 时视为含有文字。
+    """
+
+    def __init__(self, threshold=48, max_side=1200, row_gap=1, col_gap=24, pad=6,
+                 max_line_height=96, line_height_ratio=0.15, text_peak_share=0.6, min_text_density=0.01,
+                 text_density=0.3, tile_peak_share=0.75, tile_density=0.1,
+                 max_picture_ratio=0.5, min_saving=0.2, max_blocks=24):
+        self.threshold = threshold
+        self.max_side = max_side
+        self.row_gap = row_gap
+        self.col_gap = col_gap
+        self.pad = pad
+        self.max_line_height = max_line_height
+        self.line_height_ratio = line_height_ratio
+        self.text_peak_share = text_peak_share
+        self.min_text_density = min_text_density
+        self.text_density = text_density
+        self.tile_peak_share = tile_peak_share
+        self.tile_density = tile_density
+        self.max_picture_ratio = max_picture_ratio
+        self.min_saving = min_saving
+        self.max_blocks = max_blocks
+        self._lut = [0] * threshold + [255] * (256 - threshold)
+
+    def _ink(self, image):
+        """返回 (缩小后的二值边缘图, 求边缘用的灰度图, 边缘图缩放倍数, 灰度图缩放倍数)"""
+        scale = max(1, math.ceil(max(image.size) / self.max_side))
+        edge_scale = math.ceil(scale / 2)
+        gray = image.convert('L')
+        if edge_scale > 1:
+            gray = gray.reduce(edge_scale)
+        ink = gray.filter(ImageFilter.FIND_EDGES).point(self._lut)
+        # 卷积在图像边缘一像素内的结果不可靠
+        ImageDraw.Draw(ink).rectangle((0, 0, ink.size[0] - 1, ink.size[1] - 1), outline=0)
+        if scale > 1:
+            ink = ink.reduce(2)
+            return ink, gray, edge_scale * 2, edge_scale
+        return ink, gray, 1, 1
+
+    @staticmethod
+    def _rows(ink, box):
+        left, top, right, bottom = box
+        return ink.crop(box).resize((1, bottom - top), Image.BOX).tobytes()
+
+    @staticmethod
+    def _cols(ink, box):
+        left, top, right, bottom = box
+        return ink.crop(box).resize((right - left, 1), Image.BOX).tobytes()
+
+    def _cut(self, ink, box, row_gap, col_gap, depth=0):
+        """递归 XY 切分，返回不能再切分的文字行"""
+        left, top, right, bottom = box
+        rows = _runs(self._rows(ink, box), row_gap)
+        if not rows:
+            return []
+        top, bottom = top + rows[0][0], top + rows[-1][1]
+        if len(rows) > 1 and depth < 32:
+            leaves = []
+            for start, end in rows:
+                leaves += self._cut(ink, (left, box[1] + start, right, box[1] + end), row_gap, col_gap, depth + 1)
+            return leaves
+        cols = _runs(self._cols(ink, (left, top, right, bottom)), col_gap)
+        if len(cols) > 1 and depth < 32:
+            leaves = []
+            for start, end in cols:
+                leaves += self._cut(ink, (left + start, top, left + end, bottom), row_gap, col_gap, depth + 1)
+            return leaves
+        return [(left + cols[0][0], top, left + cols[0][1], bottom)] if cols else []
+
+    @staticmethod
+    def _peak_share(gray, box):
+        """块内灰度最集中的两档（每档 8 级）所占的像素比例"""
+        histogram = gray.crop(box).histogram()
+        bins = sorted((sum(histogram[i:i + 8]) for i in range(0, 256, 8)), reverse=True)
+        return (bins[0] + bins[1]) / max(1, sum(bins))
+
+    @staticmethod
+    def _density(ink, box):
+        """块内边缘像素的比例"""
+        return ink.crop(box).resize((1, 1), Image.BOX).getpixel((0, 0)) / 255
+
+    def _has_text(self, ink, gray, box, ratio, tile):
+        """高块是否像文字或含有文字（ratio 为边缘图到灰度图的坐标倍数）
+
+        文字可能紧贴在图片旁边被切进同一块，整块统计会被图片冲淡，所以再按 tile 大小的方格检查。
+        """
+        density = self._density(ink, box)
+        if density >= self.text_density or (
+                density >= self.min_text_density
+                and self._peak_share(gray, tuple(v * ratio for v in box)) >= self.text_peak_share):
+            return True
+        left, top, right, bottom = box
+        for y in range(top, bottom, tile):
+            for x in range(left, right, tile):
+                cell = (x, y, min(right, x + tile), min(bottom, y + tile))
+                if (_area(cell) * 4 >= tile * tile and self._density(ink, cell) >= self.tile_density
+                        and self._peak_share(gray, tuple(v * ratio for v in cell)) >= self.tile_peak_share):
+                    return True
+        return False
+
+    @staticmethod
+    def _drop_pictures(lines, pictures, touch=2):
+        """去掉图片块，以及与之紧贴的碎块（图片边缘被切下的部分），返回剩下的文字行"""
+        kept = [box for box in lines if box not in pictures]
+        while pictures:
+            touching = [box for box in kept if any(
+                box[0] - touch <= p[2] and p[0] <= box[2] + touch and box[1] - touch <= p[3] and p[1] <= box[3] + touch
+                for p in pictures)]
+            kept = [box for box in kept if box not in touching]
+            pictures = touching
+        return kept
+
+    @staticmethod
+    def _merge_blocks(lines, gap_ratio=1.2):
+        """把上下相邻、水平方向重叠的文字行合并为文字块"""
+        blocks = sorted(lines, key=lambda b: (b[1], b[0]))
+        merged = True
+        while merged:
+            merged = False
+            result = []
+            for box in blocks:
+                for i, block in enumerate(result):
+                    height = min(box[3] - box[1], block[3] - block[1])
+                    gap_y = max(box[1] - block[3], block[1] - box[3])
+                    gap_x = max(box[0] - block[2], block[0] - box[2])
+                    if gap_y <= height * gap_ratio and gap_x <= height:
+                        result[i] = union_bbox([block, box])
+                        merged = True
+                        break
+                else:
+                    result.append(box)
+            blocks = result
+        return blocks
+
+    def detect(self, image):
+        """返回文字块列表 [(left, top, right, bottom), ...]（按从上到下排列）"""
+        return self._detect(image)[0]
+
+    def _detect(self, image):
+        """返回 (文字块, 丢弃的图片面积, 是否有不能确定的高块)，坐标和面积均为原图像素"""
+        start = time.perf_counter()
+        ink, gray, scale, gray_scale = self._ink(image)
+        width, height = ink.size
+        full_width, full_height = image.size
+        lines = [box for box in self._cut(ink, (0, 0, width, height), max(1, self.row_gap // scale),
+                                          max(2, self.col_gap // scale)) if _area(box) > 4]
+        max_height = max(self.max_line_height, full_height * self.line_height_ratio) / scale
+        ratio = scale // gray_scale
+        pictures, uncertain = [], False
+        for box in lines:
+            if box[3] - box[1] <= max_height:
+                continue
+            if self._has_text(ink, gray, box, ratio, max(8, int(max_height / 2))):
+                uncertain = True
+            else:
+                pictures.append(box)
+        picture_area = sum(_area(box) for box in pictures)
+        lines = self._drop_pictures(lines, pictures)
+        pad = self.pad
+        lines = [(max(0, l * scale - pad), max(0, t * scale - pad),
+                  min(full_width, r * scale + pad), min(full_height, b * scale + pad)) for l, t, r, b in lines]
+        blocks = self._merge_blocks(lines)
+        metrics.observe('ocr.text_detect', time.perf_counter() - start)
+        return sorted(blocks, key=lambda b: (b[1], b[0])), picture_area * scale * scale, uncertain
+
+    def plan(self, image, packer=None):
+        """选择上传方式，返回要上传的区域列表；返回 None 表示上传原图
+
+        只有一个区域时为文字块外接框；多个区域时为各文字块，由 packer（RegionPacker）拼接上传。
+        节省的像素不足 min_saving、没有检测到文字（可能是对比度很低的文字）、
+        有不能确定是文字还是图片的高块，或图片占截图的比例超过 max_picture_ratio 时上传原图。
+        """
+        full = image.size[0] * image.size[1]
+        blocks, picture_area, uncertain = self._detect(image)
+        metrics.incr('ocr.crop.pixels_before', full)
+        if uncertain:
+            metrics.incr('ocr.crop.uncertain')
+        if not blocks or uncertain or picture_area > full * self.max_picture_ratio:
+            metrics.incr('ocr.crop.pixels_after', full)
+            metrics.incr('ocr.crop.full')
+            return None
+        union = union_bbox(blocks)
+        options = [(full, None), (_area(union), [union])]
+        if packer is not None and 1 < len(blocks) <= self.max_blocks and all(
+                packer.fits(b[2] - b[0], b[3] - b[1]) for b in blocks):
+            width = max(b[2] - b[0] for b in blocks) + 2 * packer.padding
+            height = sum(b[3] - b[1] for b in blocks) + packer.gap * (len(blocks) - 1) + 2 * packer.padding
+            options.append((width * height, blocks))
+        pixels, boxes = min(options, key=lambda option: option[0])
+        if boxes is not None and pixels > full * (1 - self.min_saving):
+            pixels, boxes = full, None
+        metrics.incr('ocr.crop.pixels_after', pixels)
+        metrics.incr('ocr.crop.' + ('full' if boxes is None else 'union' if len(boxes) == 1 else 'packed'))
+        return boxes
+
+
+@register_summary
+def _crop_summary(m):
+    before = m.counter('ocr.crop.pixels_before')
+    if not before:
+        return []
+    after = m.counter('ocr.crop.pixels_after')
+    detect = m.timing('ocr.text_detect')
+    return [f"文字区域裁剪: 上传像素减少 {1 - after / before:.0%}（裁剪到外接框 {m.counter('ocr.crop.union')} 次, "
+            f"拼接文字块 {m.counter('ocr.crop.packed')} 次, 原图 {m.counter('ocr.crop.full')} 次，"
+            f"其中不能确定文字还是图片 {m.counter('ocr.crop.uncertain')} 次）, "
+            f"检测平均 {detect['avg'] * 1000:.0f}ms"]
@@ -1,26 +1,53 @@
+from startup_profiler import startup
 import tkinter as tk
-from tkinter import ttk, scrolledtext, messagebox
+from tkinter import ttk, scrolledtext, messagebox, filedialog
 import pyautogui
 from PIL import Image, ImageTk
 import sys
 import io
-import base64
-import requests
 import keyboard
 import json
 import os
 from config_manager import ConfigManager
-import threading
+from baidu_ocr import BaiduOCRClient, OCRError
+from image_regions import normalize_region, union_bbox, merge_texts
+from gpt_client import GPTClient, GPTError, SpeculativeAnswer
+from diagnostics import metrics, format_report, register_summary
+from connection_warmer import ConnectionWarmer
+from async_engine import (AsyncEngine, NetworkError, NetworkTimeout, NetworkConnectionError, NetworkSSLError,
+                          http2_available)
+from notifier import Notifier
+from workers import WorkerPool, UIDispatcher
+from usage_store import UsageStore
+from capture_overlay import CaptureOverlay
+from simhash_index import SimHashIndex
+from folder_watcher import FolderWatcher, IMAGE_EXTENSIONS, make_processor
+from document_ocr import DocumentOCR, DocumentError
+from region_monitor import RegionMonitor
+from long_input import LongInputAnswerer, estimate_tokens
+from job_queue import JobQueue, JobQueueFull
+from ocr_selector import OCRSelector, ENDPOINT_CATALOG
+from profiling_hooks import HotPathProfiler
+from model_compare import ModelComparison, build_endpoints, item_label
+from text_regions import TextRegionDetector
+from collections import deque
 import urllib3
 import warnings
-from typing import Optional, Tuple
 import tempfile
+import time
 import atexit
+import logging
+import app_logging
 
 # 禁用 SSL 警告
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+logger = logging.getLogger(__name__)
+startup.mark('imports')
 
 class TextRecognizer:
+    # 后台任务线程数
+    WORKER_THREADS = 4
+    
     def _check_another_instance(self):
         """检查是否已有程序实例在运行"""
         try:
@@ -82,36 +109,134 @@ class TextRecognizer:
             sys.exit(1)
         else:
             self._create_lock_file()
+        startup.mark('single_instance')
         
-        self.capture_start: Optional[Tuple[int, int]] = None
-        self.is_capturing = False
-        self.capture_window = None
+        self.capture_overlay = None
         self.main_window = None
         self.settings_window = None
-        self.message_windows = []
+        self.diagnostics_window = None
+        self.usage_window = None
+        self.log_window = None
+        self.jobs_window = None
+        self.compare_window = None
+        self.folder_watcher = None
+        self.document_job = None
+        self.region_monitor = None
+        self.monitor_translation = None  # 正在进行的监视文字翻译（Future）
+        self.monitor_backlog = []  # 翻译进行中时新出现的文字，上一段完成后合并翻译
+        self.notifier = Notifier()
+        self.speculation = None
         
         # 加载配置
         self.config_manager = ConfigManager()
         config = self.config_manager.config
+        startup.mark('config')
+        
+        # 共享线程池执行后台任务；所有网络请求在异步引擎的单个事件循环线程中并发执行
+        self.workers = WorkerPool('workers', self.WORKER_THREADS)
+        self.ui = None
+        network = config['network']
+        self.engine = AsyncEngine(max_idle=network.get('max_idle_connections', 8),
+                                  keepalive_expiry=network.get('keepalive_expiry', 90))
+        self.engine.start()
+        
+        # 用量统计（后台线程写入 config.json 同目录的 usage.db）
+        usage = config['usage']
+        self.usage = UsageStore(os.path.join(os.path.dirname(self.config_manager.config_file), 'usage.db'),
+                                token_quota=usage.get('daily_token_quota', 0),
+                                ocr_quota=usage.get('daily_ocr_quota', 0),
+                                warn_ratio=usage.get('warn_ratio', 0.8),
+                                retention_days=usage.get('retention_days', 30),
+                                on_warning=lambda message: self.ui and self.ui.call(self.show_message, message))
+        self.usage.start()
+        startup.mark('engine')
         
         # 百度OCR配置
         self.API_KEY = config['baidu_ocr']['api_key']
         self.SECRET_KEY = config['baidu_ocr']['secret_key']
         self.OCR_URL = "https://aip.baidubce.com/rest/2.0/ocr/v1/general_basic"
+        self.ocr_client = BaiduOCRClient(self.engine, self.API_KEY, self.SECRET_KEY, self.OCR_URL,
+                                         qps=config['baidu_ocr'].get('qps', 10),
+                                         stitch=config['baidu_ocr'].get('stitch_regions', True))
+        self.ocr_client.usage = self.usage
+        # 按区域大小和延迟预算为每次识别选择接口（配额用尽时自动回退）
+        self.ocr_client.selector = OCRSelector.from_config(config['baidu_ocr'])
+        register_summary(self.ocr_client.selector.summary)
+        # 截图中的空白和图片不上传，只识别文字所在的区域
+        self.text_detector = TextRegionDetector()
+        self.document_ocr = DocumentOCR(self.ocr_client)
         self.access_token = self.get_access_token() if self.API_KEY and self.SECRET_KEY else None
+        startup.mark('ocr_token')
         
         # GPT配置
         self.GPT_API_URL = config['gpt']['api_url']
         self.GPT_API_KEY = config['gpt']['api_key']
         self.GPT_MODEL = config['gpt']['model']
         self.SYSTEM_PROMPT = config['gpt']['system_prompt']
+        self.gpt_client = GPTClient(self.engine, self.GPT_API_URL, self.GPT_API_KEY, self.GPT_MODEL, self.SYSTEM_PROMPT,
+                                    endpoints=config['gpt'].get('endpoints', []),
+                                    hedge_after=config['gpt'].get('hedge_after', 0),
+                                    http2=config['gpt'].get('http2', False))
+        self.gpt_client.usage = self.usage
+        # 超过模型上下文的长文本分段并发处理后合并回答
+        self.long_input = LongInputAnswerer(self.gpt_client)
+        self._configure_long_input()
+        # 离线任务队列：网络不可用时保存截图和问题，恢复后按顺序自动重试（config.json 同目录的 jobs 文件夹）
+        offline = config['offline_queue']
+        self.job_queue = JobQueue(os.path.join(os.path.dirname(self.config_manager.config_file), 'jobs'),
+                                  {'ocr': self._run_ocr_job, 'gpt': self._run_gpt_job},
+                                  on_done=lambda job, result, error: self.ui and self.ui.call(
+                                      self._deliver_job, job, result, error),
+                                  max_jobs=offline.get('max_jobs', 100),
+                                  max_bytes=int(offline.get('max_mb', 50) * 1024 * 1024),
+                                  max_delay=offline.get('max_retry_delay', 300))
+        self.job_results = deque(maxlen=50)  # 最近完成的离线任务 (时间, 类型, 说明, 结果或错误, 是否成功)
+        # 按需性能分析（工具 > 性能分析 或热键开启），结果写到 config.json 同目录的 profiles 文件夹
+        self.profiler = HotPathProfiler(os.path.join(os.path.dirname(self.config_manager.config_file), 'profiles'),
+                                        self.engine,
+                                        on_finish=lambda directory: self.ui and self.ui.call(
+                                            self._on_profiling_finished, directory))
+        register_summary(self.profiler.summary)
+        # 最近问题的近似重复索引：几乎相同的问题直接给出之前的回答
+        self.similar_questions = SimHashIndex(config['gpt'].get('similarity_threshold', 0.9))
+        
+        # 连接预热
+        self.connection_warmer = ConnectionWarmer(self.engine, [
+            lambda: (self.OCR_URL if self.API_KEY else None, False, False),
+            lambda: (self.GPT_API_URL if self.GPT_API_KEY else None, True, self.gpt_client.http2)
+        ], max_idle=network.get('keepalive_max_idle', 600))
+        startup.mark('clients')
         
         # 初始化SSL环境
         self._init_ssl_environment()
+        startup.mark('ssl')
         
         # 创建主窗口
         self.create_main_window()
+        startup.mark('main_window')
+        
+        # 主窗口创建后再开始执行离线任务（结果需要交给界面）
+        self.job_queue.start()
+        
+        # 启动时预热连接，并在窗口获得焦点期间定期刷新
+        if network.get('prewarm', True):
+            self.connection_warmer.warm_async('startup')
+            self._schedule_prewarm()
+        
+    def _schedule_prewarm(self):
+        """周期性刷新连接（仅在主窗口有焦点且近期有使用时）"""
+        interval = self.config_manager.config['network'].get('prewarm_interval', 45)
+        
+        def tick():
+            try:
+                if self.main_window.focus_displayof() is not None and not self.connection_warmer.idle_expired:
+                    self.connection_warmer.warm_async('periodic')
+            except Exception:
+                pass
+            self.main_window.after(int(interval * 1000), tick)
         
+        self.main_window.after(int(interval * 1000), tick)
+    
     def _init_ssl_environment(self):
         """初始化SSL环境以确保HTTPS请求正常工作"""
         try:
@@ -129,27 +254,30 @@ class TextRecognizer:
                 os.environ['SSL_CERT_FILE'] = certifi.where()
             
         except Exception as e:
-            print(f"SSL环境初始化警告: {str(e)}")
+            logger.warning(f"SSL环境初始化警告: {str(e)}")
             # 即使初始化失败也不影响程序运行
     
+    @property
+    def access_token(self):
+        """百度 OCR access token（由 OCR 客户端持有）"""
+        return self.ocr_client.access_token
+    
+    @access_token.setter
+    def access_token(self, value):
+        self.ocr_client.access_token = value
+    
     def get_access_token(self):
         """获取百度 API access token"""
         try:
-            url = f"https://aip.baidubce.com/oauth/2.0/token?grant_type=client_credentials&client_id={self.API_KEY}&client_secret={self.SECRET_KEY}"
-            import ssl
-            import urllib3
-            # 禁用 SSL 警告
-            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-            response = requests.get(url, verify=False, timeout=10)  # 禁用 SSL 验证
-            if response.status_code == 200:
-                return response.json().get("access_token")
-            else:
-                self.show_message(f"获取 access_token 失败: {response.text}")
-                return None
-        except requests.exceptions.SSLError as e:
+            self.ocr_client.configure(self.API_KEY, self.SECRET_KEY)
+            return self.ocr_client.fetch_access_token()
+        except OCRError as e:
+            self.show_message(str(e))
+            return None
+        except NetworkSSLError as e:
             self.show_message("SSL 证书验证失败，已禁用证书验证")
             return None
-        except requests.exceptions.RequestException as e:
+        except NetworkError as e:
             self.show_message(f"网络请求错误: {str(e)}")
             return None
         except Exception as e:
@@ -165,6 +293,7 @@ class TextRecognizer:
         # 从配置中读取置顶状态
         is_topmost = self.config_manager.config['window']['topmost']
         self.main_window.attributes('-topmost', is_topmost)
+        startup.mark('tk_root')
         
         # 设置图标
         try:
@@ -202,11 +331,46 @@ class TextRecognizer:
                         pass
         except Exception as e:
             # 图标加载失败不影响程序正常运行，仅记录日志
-            print(f"图标加载失败（不影响功能）: {str(e)}")
+            logger.info(f"图标加载失败（不影响功能）: {str(e)}")
+        startup.mark('icon')
+        
+        # 界面回调中未捕获的异常写入日志（默认只打印到 stderr，窗口程序中会丢失）
+        self.main_window.report_callback_exception = lambda *exc_info: logger.error(
+            "界面回调出错", exc_info=exc_info)
+        
+        # 主线程调度器：后台线程通过它更新界面
+        self.ui = UIDispatcher(self.main_window)
+        self.ui.start()
+        
+        # 状态栏通知（替代弹窗）
+        self.notifier.attach(self.main_window)
+        
+        # 截图遮罩只创建一次，热键触发时直接显示
+        self.capture_overlay = CaptureOverlay(self.main_window, self._on_capture_finished)
+        
+        # 创建菜单栏
+        menubar = tk.Menu(self.main_window)
+        self.tools_menu = tk.Menu(menubar, tearoff=0)
+        self.tools_menu.add_command(label="识别文档（PDF/TIFF）...", command=self.open_document)
+        self.tools_menu.add_command(label="多模型对比...", command=self.show_compare)
+        self.monitor_var = tk.BooleanVar(value=False)
+        self.tools_menu.add_checkbutton(label="监视区域（内容变化时识别）", variable=self.monitor_var,
+                                        command=self.toggle_region_monitor)
+        self.tools_menu.add_separator()
+        self.tools_menu.add_command(label="诊断信息", command=self.show_diagnostics)
+        self.profiling_var = tk.BooleanVar(value=False)
+        self.tools_menu.add_checkbutton(label="性能分析（接下来几次截图/提问）", variable=self.profiling_var,
+                                        command=self.toggle_profiling)
+        self.tools_menu.add_command(label="用量统计", command=self.show_usage)
+        self.tools_menu.add_command(label="离线队列", command=self.show_job_queue)
+        self.watch_var = tk.BooleanVar(value=False)
+        self.tools_menu.add_checkbutton(label="监视文件夹", variable=self.watch_var, command=self.toggle_folder_watch)
+        menubar.add_cascade(label="工具", menu=self.tools_menu)
+        self.main_window.config(menu=menubar)
         
         # 创建文本区域
-        text_label = tk.Label(self.main_window, text="识别文本:", anchor="w", font=('Arial', 10))
-        text_label.pack(fill="x", padx=10, pady=(10,0))
+        self.text_label = tk.Label(self.main_window, text="识别文本:", anchor="w", font=('Arial', 10))
+        self.text_label.pack(fill="x", padx=10, pady=(10,0))
         
         # 创建文本输入框（使用 ScrolledText）
         self.text_input = scrolledtext.ScrolledText(self.main_window, height=6, 
@@ -232,7 +396,7 @@ class TextRecognizer:
         clear_button.pack(side="left", padx=5)
         
         # 添加截图按钮
-        capture_button = tk.Button(self.left_buttons, text="截图-Alt+1", command=self.start_capture, **button_style)
+        capture_button = tk.Button(self.left_buttons, text="截图-Alt+1", command=lambda: self.start_capture(), **button_style)
         capture_button.pack(side="left", padx=5)
         
         settings_button = tk.Button(self.left_buttons, text="设置", command=self.show_settings, **button_style)
@@ -244,6 +408,9 @@ class TextRecognizer:
                                      command=lambda: self.main_window.attributes('-topmost', self.top_var.get()) if self.main_window else None)
         top_checkbox.pack(side="left", padx=10)
         
+        # 复用相似问题的回答后显示，点击后忽略缓存重新提问
+        self.ask_anyway_button = tk.Button(button_frame, text="仍然提问", command=self.ask_anyway, **button_style)
+        
         # 创建回答区域
         answer_label = tk.Label(self.main_window, text="AI回答:", anchor="w", font=('Arial', 10))
         answer_label.pack(fill="x", padx=10, pady=(10,0))
@@ -260,6 +427,23 @@ class TextRecognizer:
         
         self.text_input.bind("<Return>", handle_return)
         
+        # 文本被编辑时取消预取
+        def handle_modified(event):
+            if not self.text_input.edit_modified():
+                return
+            self.text_input.edit_modified(False)
+            if self.speculation and self.text_input.get("1.0", "end").strip() != self.speculation.text:
+                self._cancel_speculation()
+        
+        self.text_input.bind("<<Modified>>", handle_modified)
+        
+        # 首次绘制完成后结束启动分析
+        def on_first_expose(event):
+            if event.widget is self.main_window and startup.finished is None:
+                self.main_window.after_idle(self._finish_startup_profile)
+        
+        self.main_window.bind('<Expose>', on_first_expose, add='+')
+        
         # 设置窗口样式
         self.main_window.configure(bg="#f0f0f0")
         if sys.platform.startswith('win'):
@@ -269,6 +453,12 @@ class TextRecognizer:
             # Linux/Mac 平台
             self.main_window.wm_attributes('-type', 'splash')
 
+    def _finish_startup_profile(self):
+        """记录首帧时间；以 --profile-startup 启动时写出报告"""
+        report_path = startup.finish(os.path.dirname(self.config_manager.config_file))
+        if report_path:
+            self.show_message(f"启动分析报告已保存: {report_path}", 'info')
+    
     def show_settings(self):
         """显示设置窗口"""
         # 如果已有设置窗口，先关闭它
@@ -284,7 +474,7 @@ class TextRecognizer:
             self.settings_window = tk.Toplevel(self.main_window)
             settings = self.settings_window
             settings.title("设置")
-            settings.geometry("500x600")
+            settings.geometry("500x765")
             settings.grab_set()
             settings.attributes('-topmost', True)
             settings.focus_force()
@@ -325,6 +515,18 @@ class TextRecognizer:
             ocr_secret.pack(fill="x", padx=10, pady=(0,5))
             ocr_secret.insert(0, self.SECRET_KEY)
             
+            endpoint_row = tk.Frame(ocr_frame)
+            endpoint_row.pack(fill="x", padx=10, pady=(0,5))
+            tk.Label(endpoint_row, text="识别接口:", font=('Arial', 9)).pack(side="left")
+            endpoint_mode = ttk.Combobox(endpoint_row, values=['auto'] + list(ENDPOINT_CATALOG), state="readonly",
+                                         width=14)
+            endpoint_mode.pack(side="left", padx=5)
+            endpoint_mode.set(self.config_manager.config['baidu_ocr'].get('endpoint_mode', 'auto'))
+            tk.Label(endpoint_row, text="延迟预算（秒）:", font=('Arial', 9)).pack(side="left", padx=(10,0))
+            latency_budget = tk.Entry(endpoint_row, font=('Arial', 9), width=6)
+            latency_budget.pack(side="left", padx=5)
+            latency_budget.insert(0, str(self.config_manager.config['baidu_ocr'].get('latency_budget', 1.5)))
+            
             # GPT设置
             gpt_frame = tk.LabelFrame(settings, text="GPT设置", font=('Arial', 10))
             gpt_frame.pack(fill="x", padx=10, pady=5)
@@ -349,6 +551,37 @@ class TextRecognizer:
             system_prompt.pack(fill="x", padx=10, pady=(0,5))
             system_prompt.insert(0, self.SYSTEM_PROMPT)
             
+            speculative_var = tk.BooleanVar(value=self.config_manager.config['gpt'].get('speculative', False))
+            tk.Checkbutton(gpt_frame, text="识别完成后预先请求回答（回车时立即显示）", variable=speculative_var,
+                           font=('Arial', 9)).pack(anchor="w", padx=10, pady=(0,5))
+            
+            reuse_var = tk.BooleanVar(value=self.config_manager.config['gpt'].get('reuse_similar', True))
+            tk.Checkbutton(gpt_frame, text="问题与最近问过的几乎相同时直接显示之前的回答", variable=reuse_var,
+                           font=('Arial', 9)).pack(anchor="w", padx=10, pady=(0,5))
+            
+            # 没有安装 h2 时无法启用，选项置灰而不是勾选后静默回退到 HTTP/1.1
+            has_h2 = http2_available()
+            http2_var = tk.BooleanVar(value=has_h2 and self.config_manager.config['gpt'].get('http2', False))
+            tk.Checkbutton(gpt_frame, text="使用 HTTP/2（并发请求共用一个连接，服务器不支持时自动回退）" if has_h2
+                           else "使用 HTTP/2（需要安装 h2: pip install httpx[http2]）",
+                           variable=http2_var, state="normal" if has_h2 else "disabled",
+                           font=('Arial', 9)).pack(anchor="w", padx=10, pady=(0,5))
+            
+            # 每日用量配额
+            usage_frame = tk.LabelFrame(settings, text="每日用量配额（0 表示不限，超出时仅提醒）", font=('Arial', 10))
+            usage_frame.pack(fill="x", padx=10, pady=5)
+            usage_config = self.config_manager.config['usage']
+            
+            tk.Label(usage_frame, text="Token:", font=('Arial', 9)).pack(side="left", padx=(10,0), pady=5)
+            token_quota = tk.Entry(usage_frame, font=('Arial', 9), width=10)
+            token_quota.pack(side="left", padx=5, pady=5)
+            token_quota.insert(0, str(usage_config.get('daily_token_quota', 0)))
+            
+            tk.Label(usage_frame, text="OCR 次数:", font=('Arial', 9)).pack(side="left", padx=(10,0), pady=5)
+            ocr_quota = tk.Entry(usage_frame, font=('Arial', 9), width=10)
+            ocr_quota.pack(side="left", padx=5, pady=5)
+            ocr_quota.insert(0, str(usage_config.get('daily_ocr_quota', 0)))
+            
             def save_settings():
                 try:
                     # 保存设置前先验证 API 是否可用
@@ -358,36 +591,60 @@ class TextRecognizer:
                     new_gpt_key = gpt_key.get()
                     new_gpt_model = gpt_model.get()
                     new_system_prompt = system_prompt.get()
+                    try:
+                        new_token_quota = max(0, int(token_quota.get() or 0))
+                        new_ocr_quota = max(0, int(ocr_quota.get() or 0))
+                    except ValueError:
+                        self.show_message("配额必须是整数")
+                        return False
+                    try:
+                        new_latency_budget = max(0.1, float(latency_budget.get() or 1.5))
+                    except ValueError:
+                        self.show_message("延迟预算必须是数字")
+                        return False
                     
                     # 获取当前窗口的置顶状态
                     current_topmost = self.main_window.attributes('-topmost') if self.main_window else False
                     
-                    # 准备新的配置
-                    config = {
-                        'baidu_ocr': {
-                            'api_key': new_api_key,
-                            'secret_key': new_secret_key
-                        },
-                        'gpt': {
-                            'api_url': new_gpt_url,
-                            'api_key': new_gpt_key,
-                            'model': new_gpt_model,
-                            'system_prompt': new_system_prompt
-                        },
-                        'window': {
-                            'topmost': current_topmost
-                        }
-                    }
+                    # 准备新的配置（保留界面上未展示的其他配置项）
+                    config = json.loads(json.dumps(self.config_manager.config))
+                    config['baidu_ocr'].update({
+                        'api_key': new_api_key,
+                        'secret_key': new_secret_key,
+                        'endpoint_mode': endpoint_mode.get() or 'auto',
+                        'latency_budget': new_latency_budget
+                    })
+                    config['gpt'].update({
+                        'api_url': new_gpt_url,
+                        'api_key': new_gpt_key,
+                        'model': new_gpt_model,
+                        'system_prompt': new_system_prompt,
+                        'speculative': speculative_var.get(),
+                        'reuse_similar': reuse_var.get(),
+                        'http2': http2_var.get()
+                    })
+                    config['window'].update({
+                        'topmost': current_topmost
+                    })
+                    config['usage'].update({
+                        'daily_token_quota': new_token_quota,
+                        'daily_ocr_quota': new_ocr_quota
+                    })
                     
                     # 先保存配置
                     if self.config_manager.save_config(config):
                         # 保存成功后再更新内存中的值
+                        self.config_manager.config = config
                         self.API_KEY = new_api_key
                         self.SECRET_KEY = new_secret_key
                         self.GPT_API_URL = new_gpt_url
                         self.GPT_API_KEY = new_gpt_key
                         self.GPT_MODEL = new_gpt_model
                         self.SYSTEM_PROMPT = new_system_prompt
+                        self.gpt_client.configure(new_gpt_url, new_gpt_key, new_gpt_model, new_system_prompt)
+                        self.gpt_client.http2 = http2_var.get()
+                        self.usage.set_quotas(new_token_quota, new_ocr_quota)
+                        self.ocr_client.selector.configure_from(config['baidu_ocr'])
                         
                         # 如果有百度 API，尝试获取 token
                         if new_api_key and new_secret_key:
@@ -396,7 +653,7 @@ class TextRecognizer:
                         if self.settings_window and self.settings_window.winfo_exists():
                             self.settings_window.destroy()
                             self.settings_window = None
-                        self.show_message("设置已保存")
+                        self.show_message("设置已保存", 'info')
                         return True
                     else:
                         self.show_message("保存设置失败")
@@ -406,8 +663,12 @@ class TextRecognizer:
                     self.show_message(f"保存设置失败：\n{str(e)}")
                     return False
             
-            save_btn = tk.Button(settings, text="保存", command=save_settings, font=('Arial', 9), width=10)
-            save_btn.pack(pady=10)
+            button_row = tk.Frame(settings)
+            button_row.pack(pady=10)
+            save_btn = tk.Button(button_row, text="保存", command=save_settings, font=('Arial', 9), width=10)
+            save_btn.pack(side="left", padx=5)
+            tk.Button(button_row, text="查看日志", command=self.show_logs, font=('Arial', 9),
+                      width=10).pack(side="left", padx=5)
             
             # 使窗口居中显示在屏幕上
             settings.update_idletasks()
@@ -447,150 +708,329 @@ class TextRecognizer:
                     pass
                 self.settings_window = None
     
-    def show_message(self, message):
-        """显示消息提示"""
+    def show_message(self, message, level='warning'):
+        """显示消息提示（状态栏通知，不阻塞调用方）"""
+        logger.log(logging.INFO if level == 'info' else logging.WARNING, f"提示: {message}")
         try:
-            msg = tk.Toplevel(self.main_window)
-            self.message_windows.append(msg)
-            msg.geometry("300x150")
-            msg.title("提示")
-            msg.attributes('-topmost', True)
-            msg.focus_force()
-            
-            frame = tk.Frame(msg)
-            frame.pack(expand=True, fill="both", padx=20, pady=20)
-            
-            label = tk.Label(frame, text=message, wraplength=250)
-            label.pack(pady=(0, 20))
-            
-            def close_message():
-                try:
-                    if msg.winfo_exists():
-                        msg.destroy()
-                    if msg in self.message_windows:
-                        self.message_windows.remove(msg)
-                except:
-                    pass
-            
-            ok_button = tk.Button(frame, text="确定", command=close_message, width=10)
-            ok_button.pack()
-            
-            msg.update_idletasks()
-            if self.main_window:
-                x = self.main_window.winfo_x() + (self.main_window.winfo_width() - msg.winfo_width()) // 2
-                y = self.main_window.winfo_y() + (self.main_window.winfo_height() - msg.winfo_height()) // 2
-                msg.geometry(f"+{x}+{y}")
-            
-            # 处理窗口关闭
-            msg.protocol("WM_DELETE_WINDOW", close_message)
-            
-            msg.grab_set()
-            msg.wait_window()
+            self.notifier.notify(message, level)
         except Exception as e:
-            print(f"显示消息失败: {str(e)}")
+            logger.error(f"显示消息失败: {str(e)}")
     
-    def on_ask(self):
+    def on_ask(self, reuse_similar=True):
         """处理提问"""
+        self.ask_anyway_button.pack_forget()
+        
         # 禁用按钮，显示加载状态
         if self.left_buttons:
             for widget in self.left_buttons.winfo_children():
                 if isinstance(widget, tk.Button):
                     widget.configure(state="disabled")
         
-        # 使用线程处理请求
-        thread = threading.Thread(target=self._do_api_request)
-        thread.daemon = True
-        thread.start()
+        self.connection_warmer.mark_used()
+        
+        # 文本未被修改时直接使用预取的回答
+        if self._reveal_speculation():
+            return
+        
+        # 在主线程读取文本，交给后台线程处理请求
+        current_text = self.text_input.get("1.0", "end").strip()
+        
+        # 与最近问过的问题几乎相同时直接显示之前的回答
+        if reuse_similar and self._reuse_similar_answer(current_text):
+            return
+        
+        self.workers.submit(self._do_api_request, current_text)
+    
+    def _reuse_similar_answer(self, text):
+        """查找相似的已答问题，命中时显示其回答并提供"仍然提问"按钮，返回是否命中"""
+        if not text or not self.config_manager.config['gpt'].get('reuse_similar', True):
+            return False
+        match = self.similar_questions.lookup(text, self._answer_scope())
+        if match is None:
+            return False
+        answer, similarity, recorded = match
+        self._update_answer(answer)
+        self._reset_buttons()
+        self.ask_anyway_button.pack(side="right", padx=5)
+        age = time.time() - recorded
+        when = f"{int(age // 60)} 分钟前" if age >= 60 else "刚才"
+        self.show_message(f"与{when}的问题相似度 {similarity:.0%}，已显示之前的回答", 'info')
+        return True
     
-    def _do_api_request(self):
-        """在新线程中处理API请求"""
+    def _answer_scope(self):
+        """相似问题复用的范围：接口地址、模型或系统提示词不同时不复用之前的回答"""
+        return (self.GPT_API_URL, self.GPT_MODEL, self.SYSTEM_PROMPT)
+    
+    def ask_anyway(self):
+        """忽略相似问题的回答，重新提问"""
+        metrics.incr('dedupe.ask_anyway')
+        self.on_ask(reuse_similar=False)
+    
+    def _do_api_request(self, current_text):
+        """在后台线程中处理API请求（不访问任何控件）"""
+        scope = self._answer_scope()
         try:
-            current_text = self.text_input.get("1.0", "end").strip()
-            
             # 检查API密钥是否为空
             if not self.GPT_API_KEY or self.GPT_API_KEY.strip() == "":
                 if self.main_window:
-                    self.main_window.after(0, self.show_message, "GPT API密钥未配置，请先在设置中输入API密钥")
+                    self.ui.call(self.show_message, "GPT API密钥未配置，请先在设置中输入API密钥")
                 return
             
             # 检查输入文本是否为空
             if not current_text:
                 if self.main_window:
-                    self.main_window.after(0, self.show_message, "请输入要提问的问题")
+                    self.ui.call(self.show_message, "请输入要提问的问题")
                 return
             
-            data = {
-                "model": self.GPT_MODEL,
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": self.SYSTEM_PROMPT
-                    },
-                    {
-                        "role": "user",
-                        "content": current_text
-                    }
-                ],
-                "temperature": 0.7
-            }
-            
-            import ssl
-            import urllib3
-            # 禁用 SSL 警告
-            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-            response = requests.post(
-                self.GPT_API_URL,
-                headers={
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {self.GPT_API_KEY}"
-                },
-                json=data,
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                try:
-                    result = response.json()
-                    if 'choices' in result and len(result['choices']) > 0:
-                        answer = result['choices'][0]['message']['content']
-                        if answer:
-                            # 使用 after 在主线程中更新 UI
-                            if self.main_window:
-                                self.main_window.after(0, self._update_answer, answer)
-                            return
-                        else:
-                            if self.main_window:
-                                self.main_window.after(0, self.show_message, f"API返回内容为空: {response.text}")
-                    else:
-                        if self.main_window:
-                            self.main_window.after(0, self.show_message, f"API响应格式错误，缺少choices字段: {response.text}")
-                except json.JSONDecodeError as json_err:
-                    if self.main_window:
-                        self.main_window.after(0, self.show_message, f"响应JSON解析错误: {str(json_err)}\n响应内容: {response.text[:200]}...")
+            if self._is_long_input(current_text):
+                answer = self._answer_long_input(current_text)
             else:
-                # 尝试解析错误响应
-                try:
-                    error_result = response.json()
-                    error_msg = error_result.get('error', {}).get('message', str(error_result))
-                    if self.main_window:
-                        self.main_window.after(0, self.show_message, f"API请求失败 (状态码: {response.status_code}): {error_msg}")
-                except json.JSONDecodeError:
-                    if self.main_window:
-                        self.main_window.after(0, self.show_message, f"API请求失败 (状态码: {response.status_code}): {response.text[:200]}...")
-            
-        except requests.exceptions.Timeout:
+                answer = self.gpt_client.ask(current_text)
+                # 使用 after 在主线程中更新 UI
+                if self.main_window:
+                    self.ui.call(self._update_answer, answer)
+            self.similar_questions.add(current_text, answer, scope)
+            self._network_recovered()
+            
+        except GPTError as e:
             if self.main_window:
-                self.main_window.after(0, self.show_message, "请求超时，请检查网络连接或API地址是否正确")
-        except requests.exceptions.ConnectionError:
+                self.ui.call(self.show_message, str(e))
+        except NetworkSSLError:
             if self.main_window:
-                self.main_window.after(0, self.show_message, "网络连接错误，请检查网络连接和API地址")
+                self.ui.call(self.show_message, "网络连接错误，请检查网络连接和API地址")
+        except NetworkTimeout:
+            if self._enqueue_offline('gpt', {'text': current_text}, (), "问题"):
+                return
+            if self.main_window:
+                self.ui.call(self.show_message, "请求超时，请检查网络连接或API地址是否正确")
+        except NetworkConnectionError:
+            if self._enqueue_offline('gpt', {'text': current_text}, (), "问题"):
+                return
+            if self.main_window:
+                self.ui.call(self.show_message, "网络连接错误，请检查网络连接和API地址")
         except Exception as e:
             if self.main_window:
-                self.main_window.after(0, self.show_message, f"请求错误: {str(e)}")
+                self.ui.call(self.show_message, f"请求错误: {str(e)}")
         finally:
             # 使用 after 在主线程中恢复按钮状态
             if self.main_window:
-                self.main_window.after(0, self._reset_buttons)
+                self.ui.call(self._reset_buttons)
+    
+    def _configure_long_input(self):
+        long_input = self.config_manager.config['long_input']
+        self.long_input.configure(chunk_tokens=long_input.get('chunk_tokens', 3000),
+                                  concurrency=long_input.get('concurrency', 4),
+                                  reduce=long_input.get('reduce', 'merge'),
+                                  map_prompt=long_input.get('map_prompt', ''),
+                                  reduce_prompt=long_input.get('reduce_prompt', ''))
+    
+    def _is_long_input(self, text):
+        """文本估算 token 数是否超过 long_input.max_input_tokens（0 表示关闭长文本模式）"""
+        limit = self.config_manager.config['long_input'].get('max_input_tokens', 6000)
+        return bool(limit) and estimate_tokens(text) > limit
+    
+    def _answer_long_input(self, text):
+        """分段并发请求后合并，回答流式写入回答框（在后台线程中调用）"""
+        def on_delta(delta):
+            self.ui.call(self._append_answer, delta)
+        
+        def on_progress(done, total):
+            self.ui.call(self.text_label.configure, {'text': f"识别文本: 长文本分段处理 {done}/{total}"})
+        
+        self.ui.call(self._update_answer, "")
+        try:
+            return self.long_input.answer(text, on_delta, on_progress)
+        finally:
+            self.ui.call(self.text_label.configure, {'text': "识别文本:"})
+    
+    def _start_speculation(self, text):
+        """识别完成后预先发起 GPT 请求（需在设置中开启 gpt.speculative）"""
+        self._cancel_speculation()
+        if not self.config_manager.config['gpt'].get('speculative', False):
+            return
+        if not self.GPT_API_KEY or not text or self._is_long_input(text):
+            return
+        self.speculation = SpeculativeAnswer(self.gpt_client, text)
+        self.speculation.start()
+    
+    def _cancel_speculation(self):
+        """取消尚未被使用的预取请求"""
+        if self.speculation:
+            self.speculation.cancel()
+            self.speculation = None
+    
+    def _reveal_speculation(self):
+        """提问时若文本与预取时一致，立即显示预取的回答，返回是否命中"""
+        spec = self.speculation
+        self.speculation = None
+        if not spec:
+            return False
+        current_text = self.text_input.get("1.0", "end").strip()
+        if spec.text != current_text or spec.error is not None:
+            spec.cancel()
+            return False
+        scope = self._answer_scope()
+        
+        def on_delta(delta):
+            if self.main_window:
+                self.ui.call(self._append_answer, delta)
+        
+        def on_done(error):
+            if error is None:
+                self.similar_questions.add(spec.text, spec.answer, scope)
+            if self.main_window:
+                if error is not None:
+                    self.ui.call(self.show_message, f"请求错误: {str(error)}")
+                self.ui.call(self._reset_buttons)
+        
+        buffered, done = spec.attach(on_delta, on_done)
+        self._update_answer(buffered)
+        if done:
+            self.similar_questions.add(spec.text, buffered, scope)
+            self._reset_buttons()
+        return True
+    
+    def _compare_items(self):
+        """参与对比的模型配置项：gpt.compare_models，未配置时为主模型和 gpt.endpoints 中的接口"""
+        gpt = self.config_manager.config['gpt']
+        return list(gpt.get('compare_models') or [self.GPT_MODEL] + list(gpt.get('endpoints', [])))
+    
+    def show_compare(self):
+        """多模型对比窗口：同一问题同时发给多个模型，分栏流式显示回答和耗时，可把胜出的模型设为默认"""
+        if self.compare_window is not None and self.compare_window.winfo_exists():
+            self.compare_window.lift()
+            return
+        
+        window = tk.Toplevel(self.main_window)
+        self.compare_window = window
+        window.title("多模型对比")
+        window.geometry("1100x560")
+        window.attributes('-topmost', True)
+        
+        toolbar = tk.Frame(window)
+        toolbar.pack(fill="x", padx=10, pady=(10, 0))
+        tk.Label(toolbar, text="模型（逗号分隔）:", font=('Arial', 9)).pack(side="left")
+        defaults = {'api_url': self.GPT_API_URL, 'api_key': self.GPT_API_KEY, 'model': self.GPT_MODEL}
+        models_var = tk.StringVar(value=", ".join(item_label(item, defaults) for item in self._compare_items()))
+        tk.Entry(toolbar, textvariable=models_var, font=('Arial', 9)).pack(side="left", fill="x", expand=True, padx=5)
+        compare_button = tk.Button(toolbar, text="对比当前问题", font=('Arial', 9))
+        compare_button.pack(side="left")
+        panes_frame = tk.Frame(window)
+        panes_frame.pack(fill="both", expand=True, padx=5, pady=5)
+        tk.Label(panes_frame, text="确认要对比的模型后，点击“对比当前问题”开始", fg="gray",
+                 font=('Arial', 9)).grid(row=0, column=0, pady=20)
+        state = {'future': None, 'comparison': None, 'panes': []}
+        
+        def selected_items():
+            """按输入的名称取配置项，未配置过的名称视为主接口上的模型"""
+            gpt = self.config_manager.config['gpt']
+            known = {item_label(item, defaults): item
+                     for item in list(gpt.get('endpoints', [])) + self._compare_items()}
+            names = [name.strip() for name in models_var.get().replace('，', ',').split(',') if name.strip()]
+            return [known.get(name, name) for name in dict.fromkeys(names)]
+        
+        def on_delta(comparison, index, delta):
+            if comparison is not state['comparison']:
+                return
+            text = state['panes'][index][0]
+            text.insert("end", delta)
+            text.see("end")
+        
+        def on_done(comparison, index, result):
+            if comparison is not state['comparison']:
+                return
+            _, stats, promote = state['panes'][index]
+            stats.configure(text=result.describe(), fg="black" if result.ok else "red")
+            if result.ok:
+                promote.configure(state="normal")
+        
+        def refresh_stats():
+            # 首字到达前后的状态（等待中 / 生成中）每 200ms 刷新一次
+            if not window.winfo_exists() or state['future'] is None or state['future'].done():
+                return
+            for result, (_, stats, _) in zip(state['comparison'].results, state['panes']):
+                if result.latency is None and result.error is None:
+                    stats.configure(text=result.describe())
+            window.after(200, refresh_stats)
+        
+        def start():
+            question = self.text_input.get("1.0", "end").strip()
+            if not self.GPT_API_KEY:
+                self.show_message("GPT API密钥未配置，请先在设置中输入API密钥")
+                return
+            if not question:
+                self.show_message("请输入要提问的问题")
+                return
+            if self._is_long_input(question):
+                self.show_message("文本过长，多模型对比不支持长文本模式")
+                return
+            items = selected_items()
+            if not items:
+                self.show_message("请至少输入一个模型名称")
+                return
+            if items != self._compare_items():
+                config = self.config_manager.config
+                config['gpt']['compare_models'] = items
+                self.config_manager.save_config(config)
+            if state['future'] is not None:
+                state['future'].cancel()
+        
+            endpoints = build_endpoints(items, {'api_url': self.GPT_API_URL, 'api_key': self.GPT_API_KEY,
+                                                'model': self.GPT_MODEL})
+            comparison = ModelComparison(self.gpt_client, endpoints)
+            for child in panes_frame.winfo_children():
+                child.destroy()
+            state['comparison'] = comparison
+            state['panes'] = []
+            for column, result in enumerate(comparison.results):
+                pane = tk.LabelFrame(panes_frame, text=result.name, font=('Arial', 9))
+                pane.grid(row=0, column=column, sticky="nsew", padx=5)
+                panes_frame.columnconfigure(column, weight=1, uniform="pane")
+                text = scrolledtext.ScrolledText(pane, wrap=tk.WORD, font=('Arial', 9), width=10)
+                text.pack(fill="both", expand=True, padx=5, pady=5)
+                stats = tk.Label(pane, text=result.describe(), anchor="w", font=('Arial', 9))
+                stats.pack(fill="x", padx=5)
+                promote = tk.Button(pane, text="设为默认模型", state="disabled", font=('Arial', 9),
+                                    command=lambda result=result: self._promote_model(result))
+                promote.pack(pady=(0, 5))
+                state['panes'].append((text, stats, promote))
+            panes_frame.rowconfigure(0, weight=1)
+        
+            state['future'] = self.engine.submit(comparison.acompare(
+                question,
+                on_delta=lambda index, delta: self.ui.call(on_delta, comparison, index, delta),
+                on_done=lambda index, result: self.ui.call(on_done, comparison, index, result)))
+            refresh_stats()
+        
+        compare_button.configure(command=start)
+        
+        def on_closing():
+            if state['future'] is not None:
+                state['future'].cancel()
+            window.destroy()
+            self.compare_window = None
+        
+        window.protocol("WM_DELETE_WINDOW", on_closing)
+    
+    def _promote_model(self, result):
+        """把对比中胜出的模型设为默认（同时把它的回答填入回答框）"""
+        endpoint = result.endpoint
+        config = self.config_manager.config
+        config['gpt'].update({'api_url': endpoint.api_url, 'api_key': endpoint.api_key, 'model': endpoint.model})
+        if not self.config_manager.save_config(config):
+            self.show_message("保存设置失败")
+            return
+        self.GPT_API_URL = endpoint.api_url
+        self.GPT_API_KEY = endpoint.api_key
+        self.GPT_MODEL = endpoint.model
+        self.gpt_client.configure(self.GPT_API_URL, self.GPT_API_KEY, self.GPT_MODEL, self.SYSTEM_PROMPT)
+        self._update_answer(result.answer)
+        self.show_message(f"已将 {result.name} 设为默认模型", 'info')
+    
+    def _append_answer(self, delta):
+        """追加流式输出的回答片段"""
+        self.answer_text.insert("end", delta)
+        self.answer_text.see("end")
     
     def _update_answer(self, answer):
         """更新答案"""
@@ -604,196 +1044,719 @@ class TextRecognizer:
                 if isinstance(widget, tk.Button):
                     widget.configure(state="normal")
     
-    def start_capture(self):
-        """开始截图 - 简化版本"""
+    def start_capture(self, triggered_at=None):
+        """开始截图：显示预先创建的截图遮罩"""
         try:
-            # 关闭之前的截图窗口
-            if self.capture_window:
-                try:
-                    self.capture_window.destroy()
-                except:
-                    pass
-                self.capture_window = None
-            
-            # 创建简单的截图窗口
-            self.capture_window = tk.Toplevel(self.main_window)
-            self.capture_window.title("截图")
-            
-            # 设置窗口为半透明全屏
-            self.capture_window.attributes('-alpha', 0.3)  # 30%透明度，可以看到背景
-            self.capture_window.attributes('-fullscreen', True)
-            self.capture_window.attributes('-topmost', True)
-            self.capture_window.configure(bg='gray')
-            self.capture_window.overrideredirect(True)
-            
-            # 创建画布
-            self.canvas = tk.Canvas(
-                self.capture_window,
-                bg='gray',
-                highlightthickness=0,
-                cursor='crosshair'
-            )
-            self.canvas.pack(fill='both', expand=True)
-            
-            # 显示提示信息
-            screen_width = self.capture_window.winfo_screenwidth()
-            self.canvas.create_text(
-                screen_width // 2, 30,
-                text="拖动鼠标选择区域，按ESC取消",
-                fill='red',
-                font=('Arial', 16, 'bold'),
-                tags='help'
-            )
-            
-            # 简化事件处理
-            def start_selection(event):
-                self.capture_start = (event.x, event.y)
-                self.is_capturing = True
-                self.canvas.delete('help')  # 删除提示信息
-                self.canvas.delete('rect')  # 删除之前的矩形
-                print(f"开始选择: {self.capture_start}")
-            
-            def update_selection(event):
-                if self.is_capturing and self.capture_start:
-                    self.canvas.delete('rect')  # 删除之前的矩形
-                    x1, y1 = self.capture_start
-                    x2, y2 = event.x, event.y
-                    
-                    # 确保坐标顺序正确
-                    left = min(x1, x2)
-                    top = min(y1, y2)
-                    right = max(x1, x2)
-                    bottom = max(y1, y2)
-                    
-                    # 绘制非常明亮的红色边框（无填充）
-                    self.canvas.create_rectangle(
-                        left, top, right, bottom,
-                        outline='red',
-                        width=4,  # 更粗的边框
-                        tags='rect'
-                    )
-                    
-                    # 添加高对比度的内边框
-                    self.canvas.create_rectangle(
-                        left+1, top+1, right-1, bottom-1,
-                        outline='yellow',
-                        width=1,
-                        tags='rect'
-                    )
-                    
-                    # 显示尺寸信息（添加黑色背景使文字更清晰）
-                    width = right - left
-                    height = bottom - top
-                    if width > 20 and height > 20:  # 只在区域足够大时显示
-                        # 添加背景矩形使文字更清晰
-                        self.canvas.create_rectangle(
-                            right + 5, top - 25, right + 120, top + 5,
-                            fill='black',
-                            outline='white',
-                            tags='rect'
-                        )
-                        self.canvas.create_text(
-                            right + 10, top - 10,
-                            text=f"{width} x {height}",
-                            fill='yellow',
-                            anchor='w',
-                            font=('Arial', 12, 'bold'),
-                            tags='rect'
-                        )
-            
-            def end_selection(event):
-                if self.is_capturing and self.capture_start:
-                    self.is_capturing = False
-                    x1, y1 = self.capture_start
-                    x2, y2 = event.x, event.y
-                    
-                    print(f"结束选择: ({x1}, {y1}) -> ({x2}, {y2})")
-                    
-                    # 隐藏截图窗口
-                    if self.capture_window:
-                        self.capture_window.withdraw()
-                    
-                    # 处理OCR
-                    try:
-                        self.capture_and_recognize(x1, y1, x2, y2)
-                    except Exception as e:
-                        print(f"OCR处理错误: {e}")
-                        self.show_message(f"OCR处理错误: {str(e)}")
+            # 用户框选期间预热 OCR / GPT 连接
+            if self.config_manager.config['network'].get('prewarm', True):
+                self.connection_warmer.warm_async('overlay')
             
-            def cancel_capture(event=None):
-                print("取消截图")
-                self.is_capturing = False
-                if self.capture_window:
-                    self.capture_window.withdraw()
-            
-            # 绑定事件
-            self.canvas.bind('<Button-1>', start_selection)
-            self.canvas.bind('<B1-Motion>', update_selection)
-            self.canvas.bind('<ButtonRelease-1>', end_selection)
-            self.canvas.bind('<Escape>', cancel_capture)
-            
-            # 设置焦点
-            self.canvas.focus_set()
-            
-            print("截图窗口已显示（半透明模式，可看到背景）")
+            if self.capture_overlay is None:
+                self.capture_overlay = CaptureOverlay(self.main_window, self._on_capture_finished)
+            self.capture_overlay.show(triggered_at)
             
         except Exception as e:
-            print(f"创建截图窗口失败: {e}")
+            logger.exception(f"显示截图窗口失败: {e}")
             self.show_message(f"截图功能错误: {str(e)}")
     
+    def _on_capture_finished(self, regions):
+        """截图遮罩完成选择后识别所选区域"""
+        try:
+            if len(regions) == 1:
+                self.capture_and_recognize(*regions[0])
+            else:
+                self.capture_regions_and_recognize(regions)
+        except Exception as e:
+            logger.exception(f"OCR处理错误: {e}")
+            self.show_message(f"OCR处理错误: {str(e)}")
+    
     def capture_and_recognize(self, x1, y1, x2, y2):
-        """处理文字识别"""
+        """处理文字识别（主线程截图，后台线程识别）"""
         try:
-            if not self.access_token:
+            if not self._ocr_ready():
                 self.show_message("请先配置并保存正确的百度 OCR API 密钥")
                 return
                 
+            self.connection_warmer.mark_used()
+            
             # 确保坐标正确
-            x1, x2 = min(x1, x2), max(x1, x2)
-            y1, y2 = min(y1, y2), max(y1, y2)
+            x1, y1, x2, y2 = normalize_region(x1, y1, x2, y2)
             
             # 截图
             screenshot = pyautogui.screenshot(region=(x1, y1, x2-x1, y2-y1))
-            
-            # 转换图片为base64
-            img_buffer = io.BytesIO()
-            screenshot.save(img_buffer, format='PNG')
-            img_base64 = base64.b64encode(img_buffer.getvalue()).decode()
-            
-            # 调用百度OCR API
-            params = {"access_token": self.access_token}
-            headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-            data = {"image": img_base64}
-            
-            import ssl
-            import urllib3
-            # 禁用 SSL 警告
-            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-            response = requests.post(self.OCR_URL, params=params, headers=headers, data=data, verify=False, timeout=30)
-            result = response.json()
-            
-            if 'error_code' in result:
-                self.show_message(f"识别失败: {result.get('error_msg', '未知错误')}")
-                return
-                
-            if 'words_result' in result:
-                text = ' '.join([word['words'] for word in result['words_result']])
+        except Exception as e:
+            self.show_message(f"识别错误: {str(e)}")
+            return
+        
+        def recognize(screenshot):
+            # 开启离线队列时保留截图，网络不可用时存入队列
+            keep = self._offline_enabled()
+            boxes = None
+            try:
+                self._ensure_ocr_token()
+                if self.config_manager.config['baidu_ocr'].get('crop_to_text', True):
+                    packer = self.ocr_client.packer if self.ocr_client.stitch else None
+                    boxes = self.text_detector.plan(screenshot, packer)
+                if boxes is None:
+                    # 调用百度OCR API（截图交给 OCR 客户端，编码后即释放）
+                    text = self.ocr_client.join_words(self.ocr_client.recognize(screenshot, release=not keep))
+                else:
+                    text = self._recognize_boxes(screenshot, boxes)
+                self._network_recovered()
                 if text:
-                    self.text_input.delete("1.0", "end")
-                    self.text_input.insert("1.0", text)
-                    if self.main_window:
-                        self.main_window.deiconify()
-                        self.main_window.lift()
+                    self.ui.call(self._show_ocr_text, text)
                     return
+                
+                self.ui.call(self.show_message, "识别失败：未能识别出文字")
+                
+            except OCRError as e:
+                self.ui.call(self.show_message, str(e))
+            except NetworkSSLError as e:
+                self.ui.call(self.show_message, "SSL 证书验证失败，请检查网络设置")
+            except NetworkError as e:
+                # 未开启离线队列时截图已交给 OCR 客户端释放，不能再编码
+                if not (keep and self._enqueue_offline('ocr', {}, lambda: [self._png_bytes(screenshot)], "截图")):
+                    self.ui.call(self.show_message, f"网络请求错误: {str(e)}")
+            except Exception as e:
+                self.ui.call(self.show_message, f"识别错误: {str(e)}")
+            finally:
+                if keep or boxes is not None:
+                    screenshot.close()
+        
+        self.workers.submit(recognize, screenshot)
+    
+    def _recognize_boxes(self, image, boxes):
+        """只识别截图中的文字区域，按阅读顺序合并（在后台线程中调用）"""
+        crops = [image.crop(box) for box in boxes]
+        try:
+            if len(crops) == 1:
+                return self.ocr_client.join_words(self.ocr_client.recognize(crops[0]))
+            # 多个文字块由 OCR 客户端拼接为一次请求
+            words = self.ocr_client.recognize_many(crops)
+            return merge_texts(boxes, [self.ocr_client.join_words(w) for w in words])
+        finally:
+            for crop in crops:
+                crop.close()
+    
+    def capture_regions_and_recognize(self, regions):
+        """多区域识别：一次截屏裁剪出所有区域，并发识别后按阅读顺序合并"""
+        if not self._ocr_ready():
+            self.show_message("请先配置并保存正确的百度 OCR API 密钥")
+            return
+        
+        self.connection_warmer.mark_used()
+        
+        # 只截取一次屏幕（所有区域的外接矩形），再在内存中裁剪
+        left, top, right, bottom = union_bbox(regions)
+        screenshot = pyautogui.screenshot(region=(left, top, right-left, bottom-top))
+        crops = [screenshot.crop((x1-left, y1-top, x2-left, y2-top)) for x1, y1, x2, y2 in regions]
+        screenshot.close()
+        
+        def recognize_all():
+            try:
+                self._ensure_ocr_token()
+                # 并发识别（小区域拼接后合并请求），总耗时接近最慢的单个请求
+                words = self.ocr_client.recognize_many(crops)
+                self._network_recovered()
+                texts = [self.ocr_client.join_words(w) for w in words]
+                text = merge_texts(regions, texts)
+                if text:
+                    self.ui.call(self._show_ocr_text, text)
+                else:
+                    self.ui.call(self.show_message, "识别失败：未能识别出文字")
+            except OCRError as e:
+                self.ui.call(self.show_message, str(e))
+            except NetworkSSLError as e:
+                self.ui.call(self.show_message, "SSL 证书验证失败，请检查网络设置")
+            except NetworkError as e:
+                if not self._enqueue_offline('ocr', {'regions': regions},
+                                             lambda: [self._png_bytes(crop) for crop in crops], "截图"):
+                    self.ui.call(self.show_message, f"网络请求错误: {str(e)}")
+            except Exception as e:
+                self.ui.call(self.show_message, f"识别错误: {str(e)}")
+            finally:
+                for crop in crops:
+                    crop.close()
+        
+        self.workers.submit(recognize_all)
+    
+    def _offline_enabled(self):
+        return self.config_manager.config['offline_queue'].get('enabled', True)
+    
+    def _ocr_ready(self):
+        """已有 access_token，或配置了密钥但尚未获取到（网络不可用时仍可截图，存入离线队列）"""
+        return bool(self.access_token or (self._offline_enabled() and self.API_KEY and self.SECRET_KEY))
+    
+    def _ensure_ocr_token(self):
+        """启动时没有网络导致 access_token 为空时，识别前重新获取（在后台线程中调用）"""
+        if not self.access_token and self.API_KEY and self.SECRET_KEY:
+            self.ocr_client.fetch_access_token()
+    
+    @staticmethod
+    def _png_bytes(image):
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG')
+        return buffer.getvalue()
+    
+    def _network_recovered(self):
+        """请求成功说明网络已恢复，立即开始执行积压的离线任务"""
+        if len(self.job_queue):
+            self.job_queue.retry_now()
+    
+    def _enqueue_offline(self, kind, params, blobs, label):
+        """网络不可用时把任务存入离线队列，返回是否已入队（在后台线程中调用）
+
+        blobs 可以是返回附件列表的函数，开启离线队列时才调用（截图只在需要入队时编码）。
+        """
+        if not self._offline_enabled():
+            return False
+        try:
+            if callable(blobs):
+                blobs = blobs()
+            self.job_queue.enqueue(kind, params, blobs)
+        except JobQueueFull as e:
+            self.ui.call(self.show_message, f"网络不可用，{str(e)}，{label}未能保存")
+            return False
+        except (OSError, ValueError) as e:
+            logger.error(f"写入离线队列失败: {str(e)}")
+            return False
+        self.ui.call(self.show_message, f"网络不可用，{label}已加入离线队列（{len(self.job_queue)} 个待处理），"
+                                        f"恢复后自动处理", 'info')
+        return True
+    
+    def _run_ocr_job(self, params, blobs):
+        """执行离线识别任务（在离线队列线程中调用）"""
+        self._ensure_ocr_token()
+        images = [Image.open(io.BytesIO(blob)) for blob in blobs]
+        try:
+            if len(images) == 1:
+                texts = [self.ocr_client.join_words(self.ocr_client.recognize(images[0]))]
+            else:
+                texts = [self.ocr_client.join_words(w) for w in self.ocr_client.recognize_many(images)]
+        finally:
+            for image in images:
+                image.close()
+        regions = params.get('regions')
+        return merge_texts([tuple(r) for r in regions], texts) if regions else texts[0]
+    
+    def _run_gpt_job(self, params, blobs):
+        """执行离线提问任务（在离线队列线程中调用）"""
+        text = params['text']
+        if self._is_long_input(text):
+            return self.long_input.answer(text)
+        return self.gpt_client.ask(text)
+    
+    def _deliver_job(self, job, result, error):
+        """离线任务完成：文本框空闲时直接显示结果，否则保存在离线队列窗口中"""
+        label = "截图识别" if job.kind == 'ocr' else "提问"
+        when = time.strftime('%H:%M', time.localtime(job.created))
+        if error is not None:
+            self.job_results.append((time.time(), job.kind, f"{when} 的{label}", str(error), False))
+            self.show_message(f"{when} 的离线{label}失败: {str(error)}", 'error')
+            return
+        current_text = self.text_input.get("1.0", "end").strip()
+        if job.kind == 'ocr':
+            if not result:
+                self.show_message(f"{when} 的离线截图未能识别出文字")
+                return
+            description = f"{when} 的截图"
+            if not current_text:
+                self._show_ocr_text(result)
+                self.show_message(f"{when} 的离线截图已识别", 'info')
+            else:
+                self.show_message(f"{when} 的离线截图已识别，可在 工具 > 离线队列 中查看", 'info')
+        else:
+            question = job.params['text']
+            description = f"{when} 的提问: {question[:20]}"
+            self.similar_questions.add(question, result, self._answer_scope())
+            if current_text == question:
+                self._update_answer(result)
+                self.show_message(f"{when} 的离线提问已回答", 'info')
+            else:
+                self.show_message(f"{when} 的离线提问已回答，可在 工具 > 离线队列 中查看", 'info')
+        self.job_results.append((time.time(), job.kind, description, result, True))
+    
+    def show_job_queue(self):
+        """离线队列窗口：待处理任务和最近完成的结果（每秒刷新）"""
+        if self.jobs_window is not None and self.jobs_window.winfo_exists():
+            self.jobs_window.lift()
+            return
+        
+        window = tk.Toplevel(self.main_window)
+        self.jobs_window = window
+        window.title("离线队列")
+        window.geometry("560x420")
+        window.attributes('-topmost', True)
+        
+        tk.Label(window, text="待处理（按提交顺序执行）:", anchor="w",
+                 font=('Arial', 9)).pack(fill="x", padx=10, pady=(10, 0))
+        pending_list = tk.Listbox(window, height=8, font=('Arial', 9))
+        pending_list.pack(fill="both", expand=True, padx=10, pady=5)
+        tk.Label(window, text="最近完成（双击载入）:", anchor="w", font=('Arial', 9)).pack(fill="x", padx=10)
+        done_list = tk.Listbox(window, height=8, font=('Arial', 9))
+        done_list.pack(fill="both", expand=True, padx=10, pady=5)
+        
+        shown = {'pending': None, 'done': None}
+        pending_jobs = []
+        
+        def refresh():
+            if not window.winfo_exists():
+                return
+            now = time.monotonic()
+            pending_jobs[:] = self.job_queue.pending()
+            rows = []
+            for job in pending_jobs:
+                label = f"截图（{len(job.sizes)} 个区域）" if job.kind == 'ocr' else f"提问: {job.params['text'][:24]}"
+                row = f"#{job.seq}  {time.strftime('%H:%M:%S', time.localtime(job.created))}  {label}  {job.size // 1024}KB"
+                if job.attempts:
+                    row += (f"  已尝试 {job.attempts} 次，{max(0, job.next_attempt - now):.0f}s 后重试"
+                            f"（{job.last_error[:40]}）")
+                rows.append(row)
+            if rows != shown['pending']:
+                shown['pending'] = rows
+                pending_list.delete(0, "end")
+                for row in rows:
+                    pending_list.insert("end", row)
+            results = [f"{time.strftime('%H:%M:%S', time.localtime(finished))}  {description}  "
+                       f"{'完成' if ok else '失败: ' + result[:40]}"
+                       for finished, _, description, result, ok in reversed(self.job_results)]
+            if results != shown['done']:
+                shown['done'] = results
+                done_list.delete(0, "end")
+                for row in results:
+                    done_list.insert("end", row)
+            window.after(1000, refresh)
+        
+        def load_result(event=None):
+            selection = done_list.curselection()
+            if not selection:
+                return
+            _, kind, _, result, ok = list(reversed(self.job_results))[selection[0]]
+            if not ok:
+                return
+            if kind == 'ocr':
+                self._show_ocr_text(result)
+            else:
+                self._update_answer(result)
+        
+        def remove_selected():
+            for index in pending_list.curselection():
+                if index < len(pending_jobs):
+                    self.job_queue.remove(pending_jobs[index].seq)
+            shown['pending'] = None
+        
+        done_list.bind('<Double-Button-1>', load_result)
+        buttons = tk.Frame(window)
+        buttons.pack(fill="x", padx=10, pady=(0, 10))
+        tk.Button(buttons, text="立即重试", command=self.job_queue.retry_now, font=('Arial', 9)).pack(side="left")
+        tk.Button(buttons, text="删除所选任务", command=remove_selected, font=('Arial', 9)).pack(side="left", padx=5)
+        tk.Button(buttons, text="载入所选结果", command=load_result, font=('Arial', 9)).pack(side="right")
+        
+        def on_closing():
+            window.destroy()
+            self.jobs_window = None
+        
+        window.protocol("WM_DELETE_WINDOW", on_closing)
+        refresh()
+    
+    def open_document(self):
+        """选择 PDF / 多页 TIFF，逐页识别并把文字陆续填入文本框"""
+        if not self.access_token:
+            self.show_message("请先配置并保存正确的百度 OCR API 密钥")
+            return
+        path = filedialog.askopenfilename(parent=self.main_window, title="选择要识别的文档",
+                                          filetypes=[("文档", "*.pdf *.tif *.tiff"), ("所有文件", "*.*")])
+        if not path:
+            return
+        
+        # 同一时间只识别一个文档
+        if self.document_job is not None:
+            self.document_job.cancel()
+        self.connection_warmer.mark_used()
+        self.text_input.delete("1.0", "end")
+        name = os.path.basename(path)
+        
+        def on_page(index, total, text):
+            self.ui.call(self._append_document_page, index, total, text)
+        
+        def on_progress(done, total, pages_per_second):
+            self.ui.call(self.text_label.configure,
+                         {'text': f"识别文本: {name} 已识别 {done}/{total} 页（{pages_per_second:.1f} 页/秒）"})
+        
+        job = self.document_ocr.submit(path, on_page, on_progress)
+        self.document_job = job
+        
+        def finished(future):
+            if future.cancelled():
+                return
+            self.ui.call(self.text_label.configure, {'text': "识别文本:"})
+            error = future.exception()
+            if error is None:
+                self.ui.call(self.show_message, f"{name} 识别完成，共 {len(future.result())} 页，可直接提问", 'info')
+            elif isinstance(error, (DocumentError, OCRError)):
+                self.ui.call(self.show_message, str(error))
+            elif isinstance(error, NetworkError):
+                self.ui.call(self.show_message, f"网络请求错误: {str(error)}")
+            else:
+                self.ui.call(self.show_message, f"文档识别错误: {str(error)}")
+        
+        job.add_done_callback(finished)
+    
+    def toggle_region_monitor(self):
+        """选择一个区域并定时检查，内容变化时重新识别（再次点击停止）"""
+        if self.region_monitor is not None:
+            self._stop_region_monitor()
+            return
+        self.monitor_var.set(False)
+        if not self.access_token:
+            self.show_message("请先配置并保存正确的百度 OCR API 密钥")
+            return
+        if self.capture_overlay is None:
+            self.capture_overlay = CaptureOverlay(self.main_window, self._on_capture_finished)
+        self.capture_overlay.show(on_finish=lambda regions: self._start_region_monitor(regions[0]))
+    
+    def _start_region_monitor(self, region):
+        x1, y1, x2, y2 = region
+        monitor_config = self.config_manager.config['monitor']
+        
+        def grab():
+            return pyautogui.screenshot(region=(x1, y1, x2-x1, y2-y1))
+        
+        def recognize(image):
+            words = self.ocr_client.recognize(image, release=True)
+            return '\n'.join(word['words'] for word in words)
+        
+        def on_change(text, added):
+            self.ui.call(self._show_monitor_text, text, added)
+        
+        self.region_monitor = RegionMonitor(grab, recognize, on_change,
+                                            interval=monitor_config.get('interval', 1.0),
+                                            change_ratio=monitor_config.get('change_ratio', 0.005),
+                                            max_settle=monitor_config.get('max_settle', 3.0),
+                                            max_backoff=monitor_config.get('max_backoff', 60.0))
+        self.region_monitor.should_stop = lambda error: isinstance(error, OCRError) and error.persistent
+        self.region_monitor.on_error = lambda error, monitor=self.region_monitor: self.ui.call(
+            self._on_monitor_error, monitor, error)
+        self.region_monitor.start()
+        self.monitor_var.set(True)
+        self.connection_warmer.mark_used()
+        self.show_message(f"正在监视区域 {x2-x1}x{y2-y1}，内容变化时自动识别", 'info')
+        self._refresh_monitor_label()
+    
+    def _stop_region_monitor(self):
+        monitor = self.region_monitor
+        self.region_monitor = None
+        self.monitor_var.set(False)
+        self.monitor_backlog = []
+        if self.monitor_translation is not None:
+            self.monitor_translation.cancel()
+            self.monitor_translation = None
+        if monitor is not None:
+            monitor.stop()
+            self.text_label.configure(text="识别文本:")
+            self.show_message(f"已停止监视区域（跳过 {monitor.skip_ratio:.0%} 的帧）", 'info')
+    
+    def _on_monitor_error(self, monitor, error):
+        """区域监视出错：配额用尽、密钥无效等无法恢复的错误停止监视，其余错误由监视线程退避重试"""
+        if monitor is self.region_monitor and not monitor.running:
+            self._stop_region_monitor()
+            self.show_message(f"区域监视已停止: {str(error)}")
+        else:
+            self.show_message(f"区域监视出错，稍后重试: {str(error)}")
+    
+    def _refresh_monitor_label(self):
+        """在文本框标题上显示监视状态和跳过比例"""
+        monitor = self.region_monitor
+        if monitor is None:
+            return
+        self.text_label.configure(text=f"识别文本: 监视中，{monitor.frames} 帧，"
+                                       f"跳过 {monitor.skip_ratio:.0%}（内容未变化不识别）")
+        self.main_window.after(1000, self._refresh_monitor_label)
+    
+    def _show_monitor_text(self, text, added):
+        """显示监视区域的最新文字，按配置把新增文字流式翻译到回答框"""
+        self.text_input.delete("1.0", "end")
+        self.text_input.insert("1.0", text)
+        if not self.config_manager.config['monitor'].get('translate', False) or not self.GPT_API_KEY:
+            return
+        # 同一时刻只进行一个翻译，避免多个流的输出在回答框中交错
+        self.monitor_backlog.append(added)
+        if self.monitor_translation is None:
+            self._translate_monitor_backlog()
+    
+    def _translate_monitor_backlog(self):
+        """按出现顺序翻译积压的监视文字（主线程中调用，完成后继续下一批）"""
+        if not self.monitor_backlog or self.region_monitor is None:
+            self.monitor_translation = None
+            return
+        added = "\n".join(self.monitor_backlog)
+        self.monitor_backlog = []
+        prompt = self.config_manager.config['monitor'].get('translate_prompt', '')
+        if self.answer_text.get("1.0", "end").strip():
+            self._append_answer("\n")
+        
+        def on_delta(delta):
+            self.ui.call(self._append_answer, delta)
+        
+        def finished(future):
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                self.ui.call(self.show_message, f"翻译失败: {str(future.exception())}")
+            self.ui.call(self._monitor_translation_done, future)
+        
+        future = self.gpt_client.engine.submit(
+            self.gpt_client.aask(f"{prompt}\n{added}" if prompt else added, on_delta=on_delta))
+        self.monitor_translation = future
+        future.add_done_callback(finished)
+    
+    def _monitor_translation_done(self, future):
+        if future is self.monitor_translation:
+            self.monitor_translation = None
+            self._translate_monitor_backlog()
+    
+    def _append_document_page(self, index, total, text):
+        """追加一页文档识别结果"""
+        header = f"[第 {index + 1}/{total} 页]\n" if total > 1 else ""
+        self.text_input.insert("end", f"{header}{text}\n\n")
+        self.text_input.see("end")
+        if index == 0 and self.main_window:
+            self.main_window.deiconify()
+            self.main_window.lift()
+    
+    def _show_ocr_text(self, text):
+        """将识别结果填入文本框并显示主窗口"""
+        self.text_input.delete("1.0", "end")
+        self.text_input.insert("1.0", text)
+        self._start_speculation(text.strip())
+        if self.main_window:
+            self.main_window.deiconify()
+            self.main_window.lift()
+    
+    def show_diagnostics(self):
+        """显示诊断信息窗口（每秒刷新）"""
+        if self.diagnostics_window is not None and self.diagnostics_window.winfo_exists():
+            self.diagnostics_window.lift()
+            return
+        
+        window = tk.Toplevel(self.main_window)
+        self.diagnostics_window = window
+        window.title("诊断信息")
+        window.geometry("520x420")
+        window.attributes('-topmost', True)
+        
+        report = scrolledtext.ScrolledText(window, wrap=tk.NONE, font=('Consolas', 9))
+        report.pack(fill="both", expand=True, padx=10, pady=10)
+        
+        def refresh():
+            if not window.winfo_exists():
+                return
+            position = report.yview()[0]
+            report.configure(state="normal")
+            report.delete("1.0", "end")
+            report.insert("1.0", format_report())
+            report.configure(state="disabled")
+            report.yview_moveto(position)
+            window.after(1000, refresh)
+        
+        def on_closing():
+            window.destroy()
+            self.diagnostics_window = None
+        
+        window.protocol("WM_DELETE_WINDOW", on_closing)
+        refresh()
+    
+    def toggle_profiling(self):
+        """开启 / 停止热点路径分析：接下来 N 次截图识别或提问时记录 cProfile 和内存分配"""
+        if self.profiler.armed:
+            self.profiler.disarm()
+            return
+        runs = self.config_manager.config['profiling'].get('runs', 5)
+        # 按钮命令和热键都在调用时按名称查找方法，替换为实例属性即可生效
+        targets = [(self, 'start_capture'), (self, 'capture_and_recognize'), (self, 'capture_regions_and_recognize'),
+                   (self.ocr_client, 'recognize'), (self.ocr_client, 'recognize_many'), (self, '_do_api_request')]
+        try:
+            directory = self.profiler.arm(runs, targets, finishers=('recognize', 'recognize_many', '_do_api_request'))
+        except OSError as e:
+            self.profiling_var.set(False)
+            self.show_message(f"无法开启性能分析: {str(e)}")
+            return
+        self.profiling_var.set(True)
+        self.show_message(f"已开启性能分析：接下来 {runs} 次截图识别或提问，结果保存到 {directory}", 'info')
+    
+    def _on_profiling_finished(self, directory):
+        self.profiling_var.set(False)
+        self.show_message(f"性能分析已完成，结果保存在 {directory}", 'info')
+    
+    def show_logs(self):
+        """日志查看器：浏览内存中最近的日志（可按级别和关键字过滤，每秒刷新）"""
+        if self.log_window is not None and self.log_window.winfo_exists():
+            self.log_window.lift()
+            return
+        
+        window = tk.Toplevel(self.main_window)
+        self.log_window = window
+        window.title("日志")
+        window.geometry("760x460")
+        window.attributes('-topmost', True)
+        
+        toolbar = tk.Frame(window)
+        toolbar.pack(fill="x", padx=10, pady=(10, 0))
+        tk.Label(toolbar, text="级别:", font=('Arial', 9)).pack(side="left")
+        level_var = tk.StringVar(value='INFO')
+        ttk.Combobox(toolbar, textvariable=level_var, values=app_logging.LEVELS, state="readonly",
+                     width=9).pack(side="left", padx=5)
+        tk.Label(toolbar, text="搜索:", font=('Arial', 9)).pack(side="left", padx=(10, 0))
+        search_var = tk.StringVar()
+        tk.Entry(toolbar, textvariable=search_var, font=('Arial', 9), width=24).pack(side="left", padx=5)
+        follow_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(toolbar, text="自动滚动", variable=follow_var, font=('Arial', 9)).pack(side="left", padx=5)
+        
+        def open_folder():
+            directory = app_logging.log_directory()
+            if not directory:
+                self.show_message("日志文件未开启")
+                return
+            try:
+                if sys.platform == 'win32':
+                    os.startfile(directory)
+                else:
+                    import subprocess
+                    subprocess.Popen(['open' if sys.platform == 'darwin' else 'xdg-open', directory])
+            except Exception as e:
+                self.show_message(f"无法打开日志文件夹: {str(e)}")
+        
+        tk.Button(toolbar, text="打开日志文件夹", command=open_folder, font=('Arial', 9)).pack(side="right")
+        
+        view = scrolledtext.ScrolledText(window, wrap=tk.NONE, font=('Consolas', 9))
+        view.pack(fill="both", expand=True, padx=10, pady=10)
+        shown = []  # 当前显示的最后一条记录，没有新记录时不重绘
+        
+        def refresh():
+            if not window.winfo_exists():
+                return
+            records = app_logging.recent_records(getattr(logging, level_var.get()), search_var.get().strip())
+            key = (level_var.get(), search_var.get(), len(records), records[-1] if records else None)
+            if key != (shown[0] if shown else None):
+                shown[:] = [key]
+                position = view.yview()[0]
+                view.configure(state="normal")
+                view.delete("1.0", "end")
+                view.insert("1.0", '\n'.join(app_logging.format_record(r) for r in records))
+                view.configure(state="disabled")
+                if follow_var.get():
+                    view.see("end")
+                else:
+                    view.yview_moveto(position)
+            window.after(1000, refresh)
+        
+        def on_closing():
+            window.destroy()
+            self.log_window = None
+        
+        window.protocol("WM_DELETE_WINDOW", on_closing)
+        refresh()
+    
+    def show_usage(self):
+        """显示用量统计窗口（今日用量、每日汇总和最耗 token 的请求）"""
+        if self.usage_window is not None and self.usage_window.winfo_exists():
+            self.usage_window.lift()
+            return
+        
+        window = tk.Toplevel(self.main_window)
+        self.usage_window = window
+        window.title("用量统计")
+        window.geometry("640x460")
+        window.attributes('-topmost', True)
+        
+        report = scrolledtext.ScrolledText(window, wrap=tk.NONE, font=('Consolas', 9))
+        report.pack(fill="both", expand=True, padx=10, pady=(10,5))
+        
+        def render(text):
+            if not window.winfo_exists():
+                return
+            report.configure(state="normal")
+            report.delete("1.0", "end")
+            report.insert("1.0", text)
+            report.configure(state="disabled")
+        
+        def build_report(daily, heaviest):
+            totals = self.usage.today_totals
+            usage_config = self.config_manager.config['usage']
+            token_quota = usage_config.get('daily_token_quota', 0)
+            ocr_quota = usage_config.get('daily_ocr_quota', 0)
+            lines = [f"今日 ({totals['day']}): {totals['tokens']} token"
+                     + (f" / 配额 {token_quota}" if token_quota else "")
+                     + f", OCR {totals['ocr_calls']} 次"
+                     + (f" / 配额 {ocr_quota}" if ocr_quota else ""),
+                     "",
+                     "每日汇总（最近 14 天）",
+                     f"{'日期':<11}{'类型':<5}{'模型':<22}{'请求':>6}{'失败':>6}{'输入':>9}{'输出':>9}"
+                     f"{'上传KB':>9}{'平均耗时':>9}"]
+            for day, kind, model, requests, errors, prompt, completion, calls, sent, latency in daily:
+                lines.append(f"{day:<13}{kind:<7}{model[:20]:<24}{requests:>8}{errors:>8}{prompt:>11}"
+                             f"{completion:>11}{sent / 1024:>11.1f}{latency / requests:>12.2f}s")
+            if not daily:
+                lines.append("  暂无记录")
+            lines += ["", "最耗 token 的请求（最近 7 天）"]
+            for ts, model, label, prompt, completion, latency in heaviest:
+                when = time.strftime('%m-%d %H:%M', time.localtime(ts))
+                lines.append(f"  {when}  {prompt + completion:>6} token  {latency:>5.2f}s  {model}  "
+                             f"{label.replace(chr(10), ' ')}")
+            if not heaviest:
+                lines.append("  暂无记录")
+            return "\n".join(lines)
+        
+        def refresh():
+            # 查询在用量数据库的写入线程中执行，结果回到主线程显示
+            def load():
+                try:
+                    text = build_report(self.usage.daily_rows().result(5), self.usage.heaviest().result(5))
+                except Exception as e:
+                    text = f"读取用量数据失败: {str(e)}"
+                self.ui.call(render, text)
             
-            self.show_message("识别失败：未能识别出文字")
-            
-        except requests.exceptions.SSLError as e:
-            self.show_message("SSL 证书验证失败，请检查网络设置")
-        except requests.exceptions.RequestException as e:
-            self.show_message(f"网络请求错误: {str(e)}")
-        except Exception as e:
-            self.show_message(f"识别错误: {str(e)}")
+            self.workers.submit(load)
+        
+        tk.Button(window, text="刷新", command=refresh, font=('Arial', 9), width=10).pack(pady=(0,10))
+        
+        def on_closing():
+            window.destroy()
+            self.usage_window = None
+        
+        window.protocol("WM_DELETE_WINDOW", on_closing)
+        refresh()
+    
+    def toggle_folder_watch(self):
+        """开始/停止监视配置中的文件夹"""
+        if self.folder_watcher is not None and self.folder_watcher.running:
+            self.folder_watcher.stop()
+            self.folder_watcher = None
+            self.show_message("已停止监视文件夹", 'info')
+            return
+        
+        directories = self.config_manager.config['watch'].get('directories', [])
+        if not directories:
+            self.watch_var.set(False)
+            self.show_message("请先在 config.json 的 watch.directories 中配置要监视的文件夹")
+            return
+        if not self.access_token:
+            self.watch_var.set(False)
+            self.show_message("请先配置并保存正确的百度 OCR API 密钥")
+            return
+        
+        self.folder_watcher = create_folder_watcher(self.config_manager, self.ocr_client,
+                                                    self.gpt_client if self.GPT_API_KEY else None)
+        
+        def on_processed(path, entry):
+            if entry['status'] == 'done':
+                self.ui.call(self.show_message, f"{os.path.basename(path)}: 已识别", 'info')
+            else:
+                self.ui.call(self.show_message, f"{os.path.basename(path)}: 识别失败 {entry.get('error', '')}")
+        
+        self.folder_watcher.on_processed = on_processed
+        self.folder_watcher.start()
+        self.show_message(f"正在监视 {len(directories)} 个文件夹", 'info')
     
     def quit_application(self):
         """完全退出应用程序"""
@@ -801,6 +1764,21 @@ class TextRecognizer:
             # 取消所有快捷键
             keyboard.unhook_all()
             
+            # 停止主线程调度和后台线程池
+            if self.ui:
+                self.ui.stop()
+            if self.folder_watcher is not None:
+                self.folder_watcher.stop()
+            if self.region_monitor is not None:
+                self.region_monitor.stop()
+            self.job_queue.stop()
+            self.profiler.on_finish = None
+            self.profiler.disarm()
+            self.workers.shutdown()
+            self.engine.stop()
+            self.usage.stop()
+            app_logging.shutdown()
+            
             # 取消所有定时任务
             if self.main_window and hasattr(self.main_window, 'winfo_exists') and self.main_window.winfo_exists():
                 try:
@@ -809,14 +1787,11 @@ class TextRecognizer:
                 except:
                     pass
             
-            # 关闭所有消息窗口
-            for window in self.message_windows[:]:
-                try:
-                    if window and hasattr(window, 'winfo_exists') and window.winfo_exists():
-                        window.destroy()
-                except:
-                    pass
-            self.message_windows.clear()
+            # 清空通知
+            try:
+                self.notifier.clear()
+            except:
+                pass
             
             # 关闭设置窗口
             if self.settings_window is not None:
@@ -828,13 +1803,9 @@ class TextRecognizer:
                 self.settings_window = None
             
             # 关闭截图窗口
-            if self.capture_window is not None:
-                try:
-                    if hasattr(self.capture_window, 'winfo_exists') and self.capture_window.winfo_exists():
-                        self.capture_window.destroy()
-                except:
-                    pass
-                self.capture_window = None
+            if self.capture_overlay is not None:
+                self.capture_overlay.destroy()
+                self.capture_overlay = None
             
             # 关闭主窗口
             if self.main_window is not None:
@@ -854,28 +1825,105 @@ class TextRecognizer:
             except:
                 sys.exit(0)
 
+def create_folder_watcher(config_manager, ocr_client, gpt_client=None, directories=None):
+    """按 watch 配置创建文件夹监视器；清单保存在 config.json 同目录"""
+    watch = config_manager.config['watch']
+    process = make_processor(ocr_client, gpt_client if watch.get('summarize', True) else None,
+                             watch.get('summary_prompt', ''))
+    manifest_path = os.path.join(os.path.dirname(config_manager.config_file), 'watch_manifest.jsonl')
+    return FolderWatcher(directories or watch.get('directories', []), process, manifest_path,
+                         interval=watch.get('interval', 2),
+                         settle=watch.get('settle_seconds', 2),
+                         workers=watch.get('workers', 2),
+                         extensions=watch.get('extensions') or IMAGE_EXTENSIONS,
+                         output_dir=watch.get('output_dir', ''),
+                         recursive=watch.get('recursive', False))
+
+def run_watch_mode(directories):
+    """无界面的文件夹监视模式：python text_search.py --watch [目录 ...]"""
+    config_manager = ConfigManager()
+    config = config_manager.config
+    network = config['network']
+    engine = AsyncEngine(max_idle=network.get('max_idle_connections', 8),
+                         keepalive_expiry=network.get('keepalive_expiry', 90))
+    engine.start()
+    usage = UsageStore(os.path.join(os.path.dirname(config_manager.config_file), 'usage.db'),
+                       token_quota=config['usage'].get('daily_token_quota', 0),
+                       ocr_quota=config['usage'].get('daily_ocr_quota', 0),
+                       warn_ratio=config['usage'].get('warn_ratio', 0.8),
+                       retention_days=config['usage'].get('retention_days', 30),
+                       on_warning=logger.warning)
+    usage.start()
+    
+    ocr_client = BaiduOCRClient(engine, config['baidu_ocr']['api_key'], config['baidu_ocr']['secret_key'],
+                                qps=config['baidu_ocr'].get('qps', 10),
+                                stitch=config['baidu_ocr'].get('stitch_regions', True))
+    ocr_client.usage = usage
+    ocr_client.selector = OCRSelector.from_config(config['baidu_ocr'])
+    gpt_client = None
+    if config['gpt']['api_key']:
+        gpt_client = GPTClient(engine, config['gpt']['api_url'], config['gpt']['api_key'],
+                               config['gpt']['model'], config['gpt']['system_prompt'],
+                               endpoints=config['gpt'].get('endpoints', []),
+                               hedge_after=config['gpt'].get('hedge_after', 0),
+                               http2=config['gpt'].get('http2', False))
+        gpt_client.usage = usage
+    
+    try:
+        ocr_client.fetch_access_token()
+        watcher = create_folder_watcher(config_manager, ocr_client, gpt_client, directories)
+        if not watcher.directories:
+            logger.error("没有要监视的文件夹：请在命令行指定，或在 config.json 的 watch.directories 中配置")
+            return 1
+        logger.info(f"正在监视: {', '.join(watcher.directories)}（Ctrl+C 退出）")
+        try:
+            watcher.run()
+        except KeyboardInterrupt:
+            pass
+        watcher.stop()
+        return 0
+    except (OCRError, NetworkError) as e:
+        logger.error(f"获取百度 OCR access_token 失败: {str(e)}")
+        return 1
+    finally:
+        engine.stop()
+        usage.stop()
+
 def main():
+    if '--watch' in sys.argv[1:]:
+        directories = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+        sys.exit(run_watch_mode(directories))
+    
     app = TextRecognizer()
     
     # 使用 keyboard 直接注册热键
     def on_hotkey():
         try:
-            app.start_capture()
+            # keyboard 的回调运行在其自身线程中，交给主线程打开截图窗口
+            app.ui.call(app.start_capture, time.perf_counter())
         except Exception as e:
-            print(f"热键触发错误: {str(e)}")
+            logger.error(f"热键触发错误: {str(e)}")
     
     try:
         # 注册热键 Alt+1
         keyboard.add_hotkey('alt+1', on_hotkey)
-        print("热键 Alt+1 已注册")
+        logger.info("热键 Alt+1 已注册")
+        startup.mark('hotkey')
     except Exception as e:
-        print(f"注册热键失败: {str(e)}")
+        logger.error(f"注册热键失败: {str(e)}")
+    
+    profiling_hotkey = app.config_manager.config['profiling'].get('hotkey', '')
+    if profiling_hotkey:
+        try:
+            keyboard.add_hotkey(profiling_hotkey, lambda: app.ui.call(app.toggle_profiling))
+        except Exception as e:
+            logger.error(f"注册性能分析热键失败: {str(e)}")
     
     try:
         if app.main_window:
             app.main_window.mainloop()
     except Exception as e:
-        print(f"主循环发生错误: {str(e)}")
+        logger.exception(f"主循环发生错误: {str(e)}")
     finally:
         app.quit_application()
 
@@ -0,0 +1,256 @@
+"""用量统计：记录每次 GPT / OCR 请求的 token 数、请求次数、上传字节数和耗时
+
+数据保存在 config.json 同目录的 SQLite 数据库中：
+- requests 表保存每次请求的明细（超过 retention_days 天的明细在启动时清理）；
+- daily 表按 (日期, 类型, 模型) 汇总，永久保留。
+record() 只把记录放入队列，由单独的写入线程批量写库，不增加请求路径的耗时。
+"""
+import datetime
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from diagnostics import metrics, register_summary
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS requests (
+    ts REAL NOT NULL,
+    day TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    model TEXT NOT NULL,
+    label TEXT NOT NULL,
+    prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    calls INTEGER NOT NULL,
+    bytes_sent INTEGER NOT NULL,
+    latency REAL NOT NULL,
+    ok INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS requests_day ON requests(day);
+CREATE TABLE IF NOT EXISTS daily (
+    day TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    model TEXT NOT NULL,
+    requests INTEGER NOT NULL DEFAULT 0,
+    errors INTEGER NOT NULL DEFAULT 0,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    calls INTEGER NOT NULL DEFAULT 0,
+    bytes_sent INTEGER NOT NULL DEFAULT 0,
+    latency REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, kind, model)
+);
+"""
+
+UPSERT_DAILY = """
+INSERT INTO daily (day, kind, model, requests, errors, prompt_tokens, completion_tokens, calls, bytes_sent, latency)
+VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (day, kind, model) DO UPDATE SET
+    requests = requests + 1,
+    errors = errors + excluded.errors,
+    prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+    completion_tokens = completion_tokens + excluded.completion_tokens,
+    calls = calls + excluded.calls,
+    bytes_sent = bytes_sent + excluded.bytes_sent,
+    latency = latency + excluded.latency
+"""
+
+
+def today():
+    return datetime.date.today().isoformat()
+
+
+class UsageStore:
+    """异步写入的用量数据库，附带每日软配额
+
+    token_quota / ocr_quota 为每日上限（0 表示不限），用量达到 warn_ratio 和 100% 时
+    各通过 on_warning(message) 提醒一次；超出配额不会阻止请求。
+    查询（daily_rows 等）同样在写入线程中执行，返回 concurrent.futures.Future。
+    """
+
+    def __init__(self, path, token_quota=0, ocr_quota=0, warn_ratio=0.8, retention_days=30, on_warning=None):
+        self.path = path
+        self.token_quota = token_quota
+        self.ocr_quota = ocr_quota
+        self.warn_ratio = warn_ratio
+        self.retention_days = retention_days
+        self.on_warning = on_warning
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._today = {'day': today(), 'tokens': 0, 'ocr_calls': 0}
+        self._warned = set()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='usage-writer', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2):
+        """写完队列中剩余的记录后停止"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def set_quotas(self, token_quota, ocr_quota):
+        with self._lock:
+            self.token_quota = token_quota
+            self.ocr_quota = ocr_quota
+            self._warned.clear()
+        self._check_quotas()
+
+    def record(self, kind, model='', label='', prompt_tokens=0, completion_tokens=0, calls=1,
+               bytes_sent=0, latency=0.0, ok=True):
+        """记录一次请求（可从任意线程调用，不阻塞）"""
+        now = time.time()
+        day = today()
+        row = (now, day, kind, model or '', (label or '')[:40], int(prompt_tokens or 0),
+               int(completion_tokens or 0), int(calls), int(bytes_sent), float(latency), int(bool(ok)))
+        self._queue.put(('record', row))
+        metrics.set_gauge('usage.queue_depth', self._queue.qsize())
+        with self._lock:
+            if self._today['day'] != day:
+                self._today = {'day': day, 'tokens': 0, 'ocr_calls': 0}
+                self._warned.clear()
+            self._today['tokens'] += row[5] + row[6]
+            if kind == 'ocr':
+                self._today['ocr_calls'] += row[7]
+        self._check_quotas()
+
+    @property
+    def today_totals(self):
+        """今日累计 {'day', 'tokens', 'ocr_calls'}（内存中的值，不查询数据库）"""
+        with self._lock:
+            return dict(self._today)
+
+    def _check_quotas(self):
+        messages = []
+        with self._lock:
+            for name, used, quota, unit in (('tokens', self._today['tokens'], self.token_quota, 'token'),
+                                            ('ocr', self._today['ocr_calls'], self.ocr_quota, '次 OCR 调用')):
+                if not quota:
+                    continue
+                for level, threshold in (('exceeded', 1.0), ('warn', self.warn_ratio)):
+                    if used >= quota * threshold:
+                        if (name, level) not in self._warned:
+                            self._warned.update({(name, level), (name, 'warn')})
+                            if level == 'exceeded':
+                                messages.append(f"今日用量已超出配额: {used}/{quota} {unit}")
+                            else:
+                                messages.append(f"今日用量已达配额的 {used / quota:.0%}: {used}/{quota} {unit}")
+                        break
+        for message in messages:
+            logger.warning(message)
+            if self.on_warning:
+                self.on_warning(message)
+
+    def query(self, fn):
+        """在写入线程中执行 fn(connection)，返回 Future"""
+        future = Future()
+        if self._thread is None:
+            future.set_exception(RuntimeError("用量数据库未启动"))
+        else:
+            self._queue.put(('query', fn, future))
+        return future
+
+    def daily_rows(self, days=14):
+        """最近 days 天的汇总 [(day, kind, model, requests, errors, prompt, completion, calls, bytes, latency), ...]"""
+        since = (datetime.date.today() - datetime.timedelta(days=days - 1)).isoformat()
+        return self.query(lambda db: db.execute(
+            "SELECT day, kind, model, requests, errors, prompt_tokens, completion_tokens, calls, bytes_sent, latency "
+            "FROM daily WHERE day >= ? ORDER BY day DESC, kind, model", (since,)).fetchall())
+
+    def heaviest(self, days=7, limit=10):
+        """最近 days 天 token 最多的 GPT 请求 [(ts, model, label, prompt, completion, latency), ...]"""
+        since = (datetime.date.today() - datetime.timedelta(days=days - 1)).isoformat()
+        return self.query(lambda db: db.execute(
+            "SELECT ts, model, label, prompt_tokens, completion_tokens, latency FROM requests "
+            "WHERE day >= ? AND kind = 'gpt' ORDER BY prompt_tokens + completion_tokens DESC LIMIT ?",
+            (since, limit)).fetchall())
+
+    def _connect(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        db = sqlite3.connect(self.path)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.executescript(SCHEMA)
+        return db
+
+    def _load_today(self, db):
+        day = today()
+        tokens, = db.execute("SELECT COALESCE(SUM(prompt_tokens + completion_tokens), 0) FROM daily WHERE day = ?",
+                             (day,)).fetchone()
+        ocr_calls, = db.execute("SELECT COALESCE(SUM(calls), 0) FROM daily WHERE day = ? AND kind = 'ocr'",
+                                (day,)).fetchone()
+        with self._lock:
+            if self._today['day'] == day:
+                self._today['tokens'] += tokens
+                self._today['ocr_calls'] += ocr_calls
+        self._check_quotas()
+
+    def _run(self):
+        try:
+            db = self._connect()
+            if self.retention_days:
+                cutoff = (datetime.date.today() - datetime.timedelta(days=self.retention_days)).isoformat()
+                with db:
+                    db.execute("DELETE FROM requests WHERE day < ?", (cutoff,))
+            self._load_today(db)
+        except Exception as e:
+            logger.error(f"打开用量数据库失败: {str(e)}")
+            db = None
+
+        stopping = False
+        while not stopping:
+            items = [self._queue.get()]
+            # 一次事务写入队列中积压的所有记录
+            while len(items) < 500:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            records = [item[1] for item in items if item is not None and item[0] == 'record']
+            if records and db is not None:
+                start = time.perf_counter()
+                try:
+                    with db:
+                        db.executemany("INSERT INTO requests VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", records)
+                        db.executemany(UPSERT_DAILY, [(r[1], r[2], r[3], 1 - r[10], r[5], r[6], r[7], r[8], r[9])
+                                                      for r in records])
+                    metrics.incr('usage.rows', len(records))
+                except Exception as e:
+                    logger.error(f"写入用量数据失败: {str(e)}")
+                metrics.observe('usage.write', time.perf_counter() - start)
+            for item in items:
+                if item is None:
+                    stopping = True
+                elif item[0] == 'query':
+                    _, fn, future = item
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    try:
+                        if db is None:
+                            raise RuntimeError("用量数据库不可用")
+                        future.set_result(fn(db))
+                    except Exception as e:
+                        future.set_exception(e)
+            metrics.set_gauge('usage.queue_depth', self._queue.qsize())
+        if db is not None:
+            db.close()
+
+
+@register_summary
+def _usage_summary(m):
+    write = m.timing('usage.write')
+    if not write:
+        return []
+    return [f"用量记录: 已写入 {m.counter('usage.rows')} 条, {write['count']} 次批量写入, "
+            f"平均 {write['avg'] * 1000:.1f}ms"]
@@ -0,0 +1,111 @@
+"""后台线程池与主线程调度器
+
+Tk 不是线程安全的：所有后台工作提交到固定大小的 WorkerPool，
+需要访问控件的操作通过 UIDispatcher.call() 排队，由主线程上唯一的 after 循环批量执行。
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from diagnostics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPool:
+    """固定大小的后台线程池，记录排队深度和等待时间"""
+
+    def __init__(self, name, max_workers):
+        self.name = name
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        """提交任务，返回 concurrent.futures.Future"""
+        queued = time.perf_counter()
+        with self._lock:
+            self._pending += 1
+            metrics.set_gauge(f'{self.name}.queue_depth', self._pending)
+
+        def run():
+            with self._lock:
+                self._pending -= 1
+                metrics.set_gauge(f'{self.name}.queue_depth', self._pending)
+            metrics.observe(f'{self.name}.queue_wait', time.perf_counter() - queued)
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                logger.exception(f"后台任务出错: {getattr(fn, '__name__', fn)}")
+                raise
+
+        return self._executor.submit(run)
+
+    def map(self, fn, iterable):
+        """并发执行并按顺序返回结果（只能用于不再等待其他任务的叶子任务）"""
+        futures = [self.submit(fn, item) for item in iterable]
+        return [future.result() for future in futures]
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class UIDispatcher:
+    """主线程调度队列
+
+    任何线程都可以调用 call()；队列由 Tk 主线程上的 after 循环排空，
+    每次最多执行 max_batch 个回调或 time_budget 秒，避免长时间占用事件循环。
+    """
+
+    def __init__(self, root, poll_interval=15, max_batch=50, time_budget=0.008):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.max_batch = max_batch
+        self.time_budget = time_budget
+        self._queue = queue.SimpleQueue()
+        self._after_id = None
+        self._stopped = False
+
+    def start(self):
+        self._after_id = self.root.after(self.poll_interval, self._drain)
+
+    def stop(self):
+        self._stopped = True
+        if self._after_id is not None:
+            try:
+                self.root.after_cancel(self._after_id)
+            except Exception:
+                pass
+            self._after_id = None
+
+    def call(self, fn, *args):
+        """在主线程中执行 fn(*args)"""
+        if not self._stopped:
+            self._queue.put((time.perf_counter(), fn, args))
+
+    def _drain(self):
+        self._after_id = None
+        depth = self._queue.qsize()
+        metrics.set_gauge('ui.queue_depth', depth)
+        start = time.perf_counter()
+        executed = 0
+        while executed < self.max_batch and time.perf_counter() - start < self.time_budget:
+            try:
+                queued, fn, args = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            metrics.observe('ui.dispatch_latency', time.perf_counter() - queued)
+            try:
+                fn(*args)
+            except Exception:
+                logger.exception(f"界面回调出错: {getattr(fn, '__name__', fn)}")
+            executed += 1
+        if executed:
+            metrics.incr('ui.dispatched', executed)
+            metrics.incr('ui.batches')
+        if not self._stopped:
+            # 还有积压时尽快继续处理
+            delay = 1 if not self._queue.empty() else self.poll_interval
+            self._after_id = self.root.after(delay, self._drain)